@@ -1,108 +1,254 @@
 # app.py
-import json, heapq
+import json, heapq, logging, os, threading
 import pygame
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Sequence
 from bisect import bisect_right
 from config import AppConfig
 from notes.model import Note
 from render.renderer import Renderer, STATUS_H
 from audio.synth import Synth
+from audio.latency import LatencyStore
 from input.keymap import DEFAULT_KEYMAP, serialize_keymap, deserialize_keymap
-from ui.keymap_overlay import KeymapOverlay
-from midi.parser import parse_midi_to_notes
-from utils.crashlog import log_exception
+from input.keystate import KeyState, AUTO, MANUAL, MIDI_IN
+from input.live import InputPump
+from input.recorder import PerformanceRecorder
+from input.midi_in import MIDI_NOTE_EVENT, MidiInputThread, open_midi_input
+from timeline.judge import Judge
+from notes.song import Song, load_song
+from notes.playlist import Playlist
+from notes.watch import SongWatcher
+from utils.crashlog import log_exception, start_freeze_watchdog
+from utils import flightrec
+from utils import startup
+from utils import memstats
 
 POLYPHONY_LIMIT = 24  # 限制自動播放同時活躍音數（以 token 計）
+FRAME_MS = 1000.0 / 60
+SCHED_TOL = 0.003     # 自動播放排程容許提前量（秒）
+TRACK_KEYS = {getattr(pygame, f"K_{i}"): i for i in range(10)}   # Ctrl+數字：分軌靜音 / 獨奏
 
-def pick_file_dialog(title: str, patterns: list[tuple[str, str]]) -> Optional[str]:
-    try:
-        import tkinter as tk
-        from tkinter import filedialog
-        root = tk.Tk(); root.withdraw()
-        file = filedialog.askopenfilename(title=title, filetypes=patterns)
-        root.update(); root.destroy()
-        return file or None
-    except Exception:
-        return None
-
-def save_file_dialog(title: str, default_ext: str, patterns: list[tuple[str, str]]) -> Optional[str]:
-    try:
-        import tkinter as tk
-        from tkinter import filedialog
-        root = tk.Tk(); root.withdraw()
-        file = filedialog.asksaveasfilename(title=title, defaultextension=default_ext, filetypes=patterns)
-        root.update(); root.destroy()
-        return file or None
-    except Exception:
-        return None
+# 功能鍵：即使被綁進 keymap 也不當演奏鍵
+CONTROL_KEYS = {pygame.K_SPACE, pygame.K_RETURN, pygame.K_KP_ENTER, pygame.K_KP_PLUS,
+                getattr(pygame, "K_PLUS", pygame.K_EQUALS), pygame.K_MINUS, pygame.K_KP_MINUS,
+                pygame.K_F6, pygame.K_F7, pygame.K_F8, pygame.K_F9, pygame.K_F10, pygame.K_F11, pygame.K_PAGEUP, pygame.K_PAGEDOWN}
+
+MIDI_EXTS = (".mid", ".midi")
 
 class App:
-    def __init__(self, cfg: AppConfig, notes: List[Note]):
+    def __init__(self, cfg: AppConfig, notes: List[Note], headless: bool = False):
         self.cfg = cfg
-        self.renderer = Renderer(cfg.render)
-        self.synth = Synth(cfg.audio)
+        self.renderer = Renderer(cfg.render, headless=headless)   # headless：trace 重播，不開視窗也不開音源
+        startup.mark("renderer ready")
+        start_freeze_watchdog()
+        self.synth = Synth(cfg.audio, open_device=False)   # 裝置探測移到背景
 
         self.notes: List[Note] = notes
         self.notes_sorted: List[Note] = sorted(notes, key=lambda n: n.start)
         self.note_starts: List[float] = [n.start for n in self.notes_sorted]
 
         self.time = 0.0
+        self._time_ms = 0                          # self.time 最後推進時的 get_ticks()
         self.is_playing = False
         self.auto_sound = False
+        self.practice = False                      # 練習模式：按鍵判定 perfect/good/miss
+        self.judge = Judge(self.notes_sorted)
 
-        self.playing: set[int] = set()             # 用於鍵盤高亮
-        self._playing_counts: Dict[int, int] = {}  # pitch -> 疊加次數
-        self._active_heap: list[tuple[float, int|None, int, int]] = []  # (end, token, pitch, vel)
+        self.keys = KeyState()                     # 鍵盤高亮（各來源疊加次數）
+        self.keys.set_show_auto(self.auto_sound)
+        self._active_heap: list[tuple[float, int, int|None, int]] = []  # (end, 序號, token, pitch)
         self._active_tokens: int = 0               # 現在活躍 token 數
+        self._lit_heap: list[tuple[float, int]] = []   # (end, pitch)：自動播放的鍵盤亮燈（照畫面時間）
+        # 音源輸出延遲：自動發聲比畫面提前 audio_lead 秒送出（F7 校正，依裝置存檔）
+        self.latency = LatencyStore(cfg.audio.latency_file)
+        self.audio_lead = 0.0
 
         self.current_midi: Optional[str] = None
         self.keymap: Dict[int, int] = dict(DEFAULT_KEYMAP)
-        self.highlight_pitches: set[int] = set()
         self._key_token: Dict[int, int] = {}       # keycode -> token（手動彈鍵）
-
-        self.overlay: Optional[KeymapOverlay] = None
+        self.input = InputPump(self._is_play_event, self._on_play_event)
+        self.recorder = PerformanceRecorder()      # 手動演奏錄製（F9 存檔 / F10 清除）
+        self.mem_diff = memstats.SnapshotDiff()    # F11：tracemalloc 快照差異寫到 logs/
+        self._midi_tokens: Dict[int, list[int]] = {}  # pitch -> tokens（MIDI thru）
+        self.midi_in: Optional[MidiInputThread] = None
+        self._closing = False
+        self._device_thread = threading.Thread(target=self._init_devices, name="device-init", daemon=True)
+        self._device_thread.start()
+
+        self.overlay = None                        # ui.keymap_overlay.KeymapOverlay（開啟時才 import）
+        self.calibration = None                    # ui.calibration.LatencyCalibration（F7）
+        self.browser = None                        # ui.file_browser.FileBrowser（選檔 / 存檔，畫在最上層）
+        self._browser_cb: Optional[Callable[[str], object]] = None
+        self._browse_dir: Optional[str] = None     # 上次瀏覽的資料夾
+        self._scrubbing = False                    # 在 minimap 上按住拖曳
+        self.trace = None                          # utils.trace.TraceWriter（--trace）
+        self.replay = None                         # utils.trace.TraceReplay（--replay）：輸入與 dt 取自記錄
+
+        # 播放清單：下一首在背景先 parse + reduce（PageUp / PageDown 切歌，播完自動下一首）
+        self.playlist = Playlist([], cfg.reduce, stream_cfg=cfg.stream)
+        self.song: Optional[Song] = None
+        self.song_total = 0.0
+        self._pending_idx: Optional[int] = None
+        self._pending_autoplay = False
+        self.watcher: Optional[SongWatcher] = None   # --watch / F6：外部編輯存檔後自動換上新版本
+        # 分軌靜音 / 獨奏（Ctrl+1..9 / Ctrl+Shift+1..9，Ctrl+0 全部恢復）：只重篩 notes_sorted，不重新 parse
+        # （只有一個 track 有音符時改以 channel 分，見 Song.by_channel）
+        self.muted: set[int] = set()
+        self.solo: set[int] = set()
 
         self.playback_rates = [0.5, 0.75, 1.0, 1.25, 1.5]
         self.playback_idx = 2  # 100%
 
-        self._next_on_idx = 0
+        self._next_on_idx = 0                      # 下一個要亮燈的音
+        self._next_snd_idx = 0                     # 下一個要發聲的音（提前 audio_lead）
         self._msg = ""; self._msg_time = 0.0
 
+    def _init_devices(self):
+        # pygame.midi.init 與裝置探測很慢；視窗先畫，音源/輸入在背景依序開啟
+        if self.renderer.headless: return
+        self.synth.open()
+        self.audio_lead = self.latency.get(self.synth.device_name) / 1000.0
+        startup.mark("midi out ready (bg)")
+        dev = open_midi_input(self.cfg.input.midi_in)
+        if dev is not None and not self._closing:
+            self.midi_in = MidiInputThread(dev).start()
+        startup.mark("midi in ready (bg)")
+
     def _toast(self, msg: str, secs: float = 4.0):
         self._msg = msg
         self._msg_time = max(self._msg_time, secs)
 
-    def load_midi_interactive(self):
-        path = pick_file_dialog("Select a MIDI file", [("MIDI files", "*.mid *.midi"), ("All files", "*.*")])
-        if not path: return False
-        try:
-            notes, _ = parse_midi_to_notes(path)
-            from notes.reduction import make_reduction
-            reducer = make_reduction(self.cfg.reduce.mode)
-            notes = reducer.apply(notes, self.cfg.reduce)
+    def open_browser(self, title: str, exts: Sequence[str], on_done: Callable[[str], object],
+                     save: bool = False, default_name: str = ""):
+        """開檔案瀏覽器；選好後呼叫 on_done(path)（取消則不呼叫）。不阻塞主迴圈，播放照常進行。"""
+        from ui.file_browser import FileBrowser
+        if self.browser is not None: self.browser.close()
+        start = self._browse_dir or (os.path.dirname(os.path.abspath(self.current_midi)) if self.current_midi
+                                     else os.getcwd())
+        self.browser = FileBrowser((self.renderer.cfg.window_w, self.renderer.cfg.window_h), title, start,
+                                   exts=exts, save=save, default_name=default_name)
+        self._browser_cb = on_done
+
+    def _finish_browser(self):
+        b, cb = self.browser, self._browser_cb
+        self.browser = self._browser_cb = None
+        b.close()
+        self._browse_dir = b.cwd
+        if b.finished and b.result_path and cb is not None:
+            cb(b.result_path)
 
-            self.notes = notes
-            self.notes_sorted = sorted(notes, key=lambda n: n.start)
-            self.note_starts = [n.start for n in self.notes_sorted]
+    def load_midi_interactive(self):
+        self.open_browser("Select a MIDI file", MIDI_EXTS, lambda p: self.switch_to(self.playlist.add(p)))
 
-            self.current_midi = path
-            self.time = 0.0
-            self._stop_all()
-            self.is_playing = False
-            self._next_on_idx = 0
-            self._active_heap.clear()
+    def load_midi(self, path: str) -> bool:
+        try:
+            song = load_song(path, self.cfg.reduce, self.cfg.stream)
+            self.set_song(song)
             self._toast("Loaded MIDI ✓", 2.0)
             return True
         except Exception as e:
-            log_exception("load_midi_interactive", e)
+            log_exception("load_midi", e)
             self.current_midi = None
             self._toast("Failed to load MIDI (see logs)", 6.0)
             return False
 
+    def set_song(self, song: Song):
+        flightrec.record("load", song.path, len(song.notes_sorted))
+        self.notes = song.notes_sorted
+        self.notes_sorted = song.notes_sorted
+        self.note_starts = song.note_starts
+        self.muted.clear(); self.solo.clear()
+
+        self.song = song
+        self.current_midi = song.path
+        self.song_total = song.total
+        if self.trace is not None: self.trace.song(song.path)
+        self.time = 0.0
+        if song.judge is None:   # 沒經過載入執行緒（直接 from_notes 建的）就在這裡補建
+            song.prepare()
+        self.judge = song.judge   # 通常載入執行緒已建好（Song.prepare / StreamingSong）
+        self.judge.set_enabled(None)   # 同一個 Song 切回來時還留著上次的 mute / solo 遮罩
+        self.judge.reset(0.0)
+        self._stop_all()
+        self.is_playing = False
+        self._next_on_idx = self._next_snd_idx = 0
+        self._active_heap.clear(); self._lit_heap.clear()
+        self._restart_watcher()
+
+    def seek(self, t: float):
+        """跳到 t 秒：放掉發聲中的音，排程指標與判定從 t 重新開始（串流歌曲下一個 frame 換窗）。"""
+        t = max(0.0, min(t, self.song_total))
+        flightrec.record("seek", round(t, 3))
+        self._stop_all()
+        self.time = t
+        self._time_ms = pygame.time.get_ticks()
+        self._next_on_idx = bisect_right(self.note_starts, t + SCHED_TOL)
+        self._next_snd_idx = bisect_right(self.note_starts, self._sound_time())
+        self.judge.reset(t)
+
+    def _restart_watcher(self):
+        if self.watcher is not None:
+            self.watcher.close(); self.watcher = None
+        song = self.song
+        if self.cfg.watch_file and song is not None and song.path and not song.streaming:
+            self.watcher = SongWatcher(song.path, self.cfg.reduce)
+
+    def _toggle_watch(self):
+        if self.song is not None and self.song.streaming:
+            self._toast("Watch is not available for streamed files", 3.0); return
+        self.cfg.watch_file = not self.cfg.watch_file
+        self._restart_watcher()
+        self._toast(f"Watch file: {'ON' if self.cfg.watch_file else 'OFF'}", 2.0)
+
+    def _reload_song(self, song: Song):
+        """監看到的新版本：換掉音符但保留播放位置、播放狀態、分軌設定與分數。"""
+        changed = self.watcher.last_changed if self.watcher is not None else None
+        flightrec.record("reload", song.path, changed)
+        old, self.song = self.song, song
+        stale = self.playlist.replace(song.path, song)   # 清單裡準備好的那份多半就是 old
+        if old is not None: old.close()
+        if stale is not None and stale is not old: stale.close()
+        self.song_total = song.total
+        self._apply_tracks(keep_score=True)
+        what = "all tracks" if changed is None else ", ".join(song.track_label(t) for t in changed) or "no notes"
+        self._toast(f"Reloaded ✓ ({what})", 2.0)
+
+    def switch_to(self, idx: int, autoplay: bool = False):
+        """切到清單第 idx 首：已預先準備好就在本 frame 內完成，否則等背景載入。"""
+        flightrec.record("switch", idx, autoplay)
+        song = self.playlist.take(idx)
+        if song is None:
+            self._pending_idx, self._pending_autoplay = self.playlist.wrap(idx), autoplay
+            self._toast("Loading…", 30.0)
+            return
+        self._pending_idx = None
+        self.set_song(song)
+        self.is_playing = autoplay
+        self._msg_time = 0; self._toast(f"[{self.playlist.index + 1}/{len(self.playlist)}] Loaded ✓", 2.0)
+        nxt = self.playlist.next_playable(self.playlist.index)
+        if nxt is not None:
+            self.playlist.prefetch(nxt)
+
+    def _poll_playlist(self):
+        if self._pending_idx is not None:
+            if self.playlist.failed(self._pending_idx):
+                self._pending_idx = None
+                self._msg_time = 0; self._toast("Failed to load MIDI (see logs)", 6.0)
+            else:
+                self.switch_to(self._pending_idx, self._pending_autoplay)
+        elif (self.is_playing and self.playlist.index >= 0 and len(self.playlist) > 1
+              and self.time > self.song_total + 1.0):
+            # 播完自動下一首：跳過載入失敗的，清單尾端就停（不重試、不繞回）
+            nxt = self.playlist.next_playable(self.playlist.index)
+            if nxt is None:
+                self.is_playing = False; self._toast("End of playlist", 3.0)
+            else:
+                self.switch_to(nxt, autoplay=True)
+
     def load_sf2_interactive(self):
         return False  # 保留接口
 
     def open_keymap_overlay(self):
+        from ui.keymap_overlay import KeymapOverlay
         self.is_playing = False
         self.overlay = KeymapOverlay(
             (self.renderer.cfg.window_w, self.renderer.cfg.window_h),
@@ -111,9 +257,44 @@ class App:
             last_midi=self.renderer.last_midi
         )
 
-    def save_keymap_json(self, mapping: Optional[Dict[int, int]] = None):
-        path = save_file_dialog("Save Keymap JSON", ".json", [("JSON", "*.json"), ("All files", "*.*")])
-        if not path: return False
+    def open_calibration(self):
+        from ui.calibration import LatencyCalibration
+        if not self.synth.use_midi_out:
+            self._toast("No MIDI output to calibrate", 3.0); return
+        self.is_playing = False
+        self._stop_all()
+        self.calibration = LatencyCalibration(
+            (self.renderer.cfg.window_w, self.renderer.cfg.window_h),
+            self.synth, self.synth.device_name, current_ms=self.audio_lead * 1000.0)
+
+    def _finish_calibration(self):
+        cal, self.calibration = self.calibration, None
+        cal.close()
+        if cal.finished and cal.result_ms is not None:
+            try:
+                ms = self.latency.set(cal.device, cal.result_ms)
+            except Exception as e:
+                log_exception("Failed to save latency", e)
+                ms = cal.result_ms
+                self._toast("Latency applied (not saved, see logs)", 4.0)
+            else:
+                self._toast(f"Latency {ms:+.0f} ms saved ✓", 3.0)
+            self.audio_lead = ms / 1000.0
+            flightrec.record("latency", ms)
+
+    def _load_keymap_into_overlay(self, path: str):
+        loaded = self.load_keymap_json(path)
+        if loaded is None:
+            self._toast("Failed to load keymap", 4.0)
+        elif self.overlay is not None:
+            self.overlay.kc_to_pitch = loaded
+
+    def save_keymap_json(self, mapping: Optional[Dict[int, int]] = None, path: Optional[str] = None):
+        if path is None:
+            m = dict(mapping if mapping is not None else self.keymap)
+            self.open_browser("Save Keymap JSON", (".json",), lambda p: self.save_keymap_json(m, p),
+                              save=True, default_name="keymap.json")
+            return False
         try:
             m = mapping if mapping is not None else self.keymap
             with open(path, "w", encoding="utf-8") as f:
@@ -122,9 +303,7 @@ class App:
         except Exception:
             return False
 
-    def load_keymap_json(self) -> Optional[Dict[int, int]]:
-        path = pick_file_dialog("Load Keymap JSON", [("JSON", "*.json"), ("All files", "*.*")])
-        if not path: return None
+    def load_keymap_json(self, path: str) -> Optional[Dict[int, int]]:
         try:
             with open(path, "r", encoding="utf-8") as f:
                 obj = json.load(f)
@@ -135,38 +314,277 @@ class App:
     def _stop_all(self):
         # 關掉所有聲音
         self.synth.all_notes_off()
-        self.playing.clear()
-        self.highlight_pitches.clear()
-        self._playing_counts.clear()
-        self._active_heap.clear()
+        self.keys.clear()
+        self._midi_tokens.clear()
+        self._active_heap.clear(); self._lit_heap.clear()
         self._active_tokens = 0
 
+    def _toggle_track(self, slot: int, solo: bool):
+        """slot 1..9 = 第幾個有音符的 track（或 channel）；0 = 全部恢復。"""
+        if self.song is None: return
+        tracks = self.song.tracks
+        if slot == 0:
+            self.muted.clear(); self.solo.clear()
+            self._toast("All tracks on", 2.0)
+        elif slot <= len(tracks):
+            t = tracks[slot - 1]
+            target = self.solo if solo else self.muted
+            target.symmetric_difference_update((t,))
+            on = t in target
+            self._toast(f"{self.song.track_label(t)}: {('solo' if solo else 'mute')} {'on' if on else 'off'}", 2.0)
+        else:
+            return
+        flightrec.record("tracks", sorted(self.muted), sorted(self.solo))
+        self._apply_tracks()
+
+    def _apply_tracks(self, keep_score: bool = False):
+        """
+        依 mute / solo 重算可見且會發聲的音；已在發聲的自動音照常到尾再放開。
+        judge 沿用 song 建好的那個，只換遮罩（靜音的音不判定），不重建。
+        """
+        song = self.song
+        lut = None
+        if not self.muted and not self.solo:
+            self.notes_sorted, self.note_starts = song.notes_sorted, song.note_starts
+        else:
+            lut = song.track_lut(self.solo if self.solo else [t for t in song.tracks if t not in self.muted])
+            self.notes_sorted, self.note_starts = song.select_tracks(lut)
+        self.notes = self.notes_sorted
+        self._next_on_idx = bisect_right(self.note_starts, self.time + SCHED_TOL)
+        self._next_snd_idx = bisect_right(self.note_starts, self._sound_time())
+        old, j = self.judge, song.judge   # 串流換窗 / 監看重載時 song.judge 是新的
+        score = (old.perfect, old.good, old.miss, old.extra)
+        j.set_enabled(lut)
+        j.reset(self.time)
+        if keep_score:   # 串流換窗、監看重載：同一首歌，分數延續
+            j.perfect, j.good, j.miss, j.extra = score
+        self.judge = j
+
+    def _toggle_practice(self):
+        self.practice = not self.practice
+        flightrec.record("practice", self.practice)
+        self.judge.reset(self.time)
+
+    def _toggle_auto_sound(self):
+        self.auto_sound = not self.auto_sound
+        flightrec.record("auto_sound", self.auto_sound)
+        if not self.auto_sound:
+            self._stop_all()
+        self.keys.set_show_auto(self.auto_sound)
+
+    def _is_play_event(self, e) -> bool:
+        if e.type == MIDI_NOTE_EVENT:
+            return True
+        if e.type not in (pygame.KEYDOWN, pygame.KEYUP) or self.overlay is not None or self.calibration is not None \
+                or self.browser is not None:
+            return False
+        if e.key in TRACK_KEYS and (e.mod & pygame.KMOD_CTRL):
+            return False
+        if e.key not in self.keymap or e.key in CONTROL_KEYS:
+            return False
+        if e.type == pygame.KEYDOWN and e.key == pygame.K_EQUALS and (pygame.key.get_mods() & pygame.KMOD_SHIFT):
+            return False
+        return True
+
+    def _on_play_event(self, e, t_ms: int):
+        # 事件一到就處理（不等 frame），t_ms 為事件時間戳
+        if e.type == MIDI_NOTE_EVENT:
+            pitch = e.pitch
+            if e.on:
+                self.keys.press(pitch, MIDI_IN)
+                flightrec.record("midi_on", pitch, e.velocity)
+                if self.cfg.input.midi_thru:
+                    tok = self.synth.note_on(pitch, e.velocity)
+                    if tok is not None:
+                        self._midi_tokens.setdefault(pitch, []).append(tok)
+                self._performed_on(pitch, e.velocity, t_ms)
+            else:
+                self.keys.release(pitch, MIDI_IN)
+                flightrec.record("midi_off", pitch)
+                toks = self._midi_tokens.get(pitch)
+                if toks:
+                    self.synth.note_off_token(toks.pop(0))
+                self.recorder.note_off(t_ms, pitch)
+            return
+
+        pitch = self.keymap[e.key]
+        if e.type == pygame.KEYDOWN:
+            self.keys.press(pitch, MANUAL)
+            flightrec.record("key_on", pitch, e.key)
+            tok = self.synth.note_on(pitch, 110)
+            if tok is not None:
+                self._key_token[e.key] = tok
+            self._performed_on(pitch, 110, t_ms)
+        else:
+            self.keys.release(pitch, MANUAL)
+            flightrec.record("key_off", pitch, e.key)
+            tok = self._key_token.pop(e.key, None)
+            if tok is not None:
+                self.synth.note_off_token(tok)
+            else:
+                self.synth.note_off(pitch)
+            self.recorder.note_off(t_ms, pitch)
+
+    def _performed_on(self, pitch: int, vel: int, t_ms: int):
+        self.recorder.note_on(t_ms, pitch, vel)
+        if self.practice and self.is_playing:
+            # 以事件時間戳換算成歌曲時間
+            rate = self.playback_rates[self.playback_idx]
+            self.judge.press(pitch, self.time + (t_ms - self._time_ms) / 1000.0 * rate)
+
+    def export_reduced_midi(self, path: Optional[str] = None) -> bool:
+        if not self.notes_sorted:
+            self._toast("No song loaded", 2.0); return False
+        if self.song is not None and self.song.streaming:
+            self._toast("Export is not available for streamed files", 3.0); return False
+        if path is None:
+            base = os.path.splitext(os.path.basename(self.current_midi or "song"))[0]
+            self.open_browser("Export Reduced MIDI", MIDI_EXTS, self.export_reduced_midi,
+                              save=True, default_name=f"{base}-reduced.mid")
+            return False
+        try:
+            from midi.writer import write_notes_midi
+            song = self.song
+            write_notes_midi(path, self.notes_sorted, song.tempo_map if song else None,
+                             track_names=song.track_names if song else None)
+            self._toast("Reduced MIDI exported ✓", 2.0)
+            return True
+        except Exception as e:
+            log_exception("export_reduced_midi", e)
+            self._toast("Failed to export MIDI (see logs)", 6.0)
+            return False
+
+    def save_performance(self, path: Optional[str] = None) -> bool:
+        if not len(self.recorder):
+            self._toast("Nothing recorded", 2.0); return False
+        if path is None:
+            self.open_browser("Save Performance MIDI", MIDI_EXTS, self.save_performance,
+                              save=True, default_name="performance.mid")
+            return False
+        try:
+            self.recorder.save_midi(path)
+            self._toast("Performance saved ✓", 2.0)
+            return True
+        except Exception as e:
+            log_exception("save_performance", e)
+            self._toast("Failed to save performance (see logs)", 6.0)
+            return False
+
+    def _mem_snapshot(self):
+        """F11：第一次記下基準，第二次把快照差異連同各子系統估計寫到 logs/memdiff-*.txt。"""
+        report = memstats.format_report(memstats.app_report(self), self.song)
+        logging.info("memory estimate:\n%s", report)
+        try:
+            path = self.mem_diff.toggle(report)
+        except Exception as e:
+            log_exception("memory snapshot", e)
+            self._toast("Memory snapshot failed (see logs)", 6.0); return
+        if path is None:
+            self._toast("Memory baseline taken (F11 again to diff)", 3.0)
+        else:
+            self._toast(f"Memory diff saved: {os.path.basename(path)}", 3.0)
+
     def _adjust_speed(self, delta: float):
         new_pps = self.renderer.cfg.pixels_per_second + delta
         new_pps = max(60.0, min(1200.0, new_pps))
         self.renderer.cfg.pixels_per_second = new_pps
 
+    def _sound_time(self) -> float:
+        """發聲排程看的時間：畫面時間 + 音源延遲（換算成曲內秒數）。"""
+        return self.time + SCHED_TOL + self.audio_lead * self.playback_rates[self.playback_idx]
+
+    def _advance_playback(self, dt: float):
+        """
+        推進 dt 秒：送出到點的 note_on、關掉到期的音（run() 每 frame 呼叫一次）。
+        發聲與鍵盤亮燈分開排程：音源有輸出延遲時發聲提前 audio_lead 送出，聽到時剛好對上判定線。
+        發聲的 note_on / note_off 用同一條時間線（t_snd）：每個 note_on 前先放掉 end <= 它 onset 的音，
+        前一個音截在 t、下一個音從 t 開始時 token 不會重疊（sweep_poly 的上限 = POLYPHONY_LIMIT 時不會丟音）。
+        """
+        self.time += dt * self.playback_rates[self.playback_idx]
+        self._time_ms = pygame.time.get_ticks()
+        tol = SCHED_TOL
+        notes, n_notes = self.notes_sorted, len(self.notes_sorted)
+        t_snd = self._sound_time()
+        heap = self._active_heap
+
+        while self._next_snd_idx < n_notes and notes[self._next_snd_idx].start <= t_snd:
+            n = notes[self._next_snd_idx]
+            if heap and heap[0][0] <= n.start:
+                self._release_sound(n.start)
+            tok = None
+            if self.auto_sound and self._active_tokens < POLYPHONY_LIMIT:
+                tok = self.synth.note_on(n.pitch, max(10, min(120, n.velocity)))
+                if tok is not None:
+                    self._active_tokens += 1
+            flightrec.record("auto_on", n.pitch, tok)
+            # 序號排在 token 前：同一 end 時不會拿 None 跟 int 比
+            heapq.heappush(heap, (n.end, self._next_snd_idx, tok, n.pitch))
+            self._next_snd_idx += 1
+
+        if heap and heap[0][0] <= t_snd:
+            self._release_sound(t_snd)
+
+        while self._next_on_idx < n_notes and notes[self._next_on_idx].start <= self.time + tol:
+            n = notes[self._next_on_idx]
+            self.keys.press(n.pitch, AUTO)
+            heapq.heappush(self._lit_heap, (n.end, n.pitch))
+            self._next_on_idx += 1
+
+        while self._lit_heap and self._lit_heap[0][0] < self.time - tol:
+            self.keys.release(heapq.heappop(self._lit_heap)[1], AUTO)
+
+    def _release_sound(self, t: float):
+        """放掉發聲中 end <= t 的自動音。"""
+        heap = self._active_heap
+        while heap and heap[0][0] <= t:
+            _, _, tok, pitch = heapq.heappop(heap)
+            if self.auto_sound and tok is not None:
+                self.synth.note_off_token(tok)
+                if self._active_tokens > 0:
+                    self._active_tokens -= 1
+            elif self.auto_sound:
+                self.synth.note_off(pitch)
+            flightrec.record("auto_off", pitch, tok)
+
     def run(self):
         running = True
+        first_frame_done = False
+        next_frame = pygame.time.get_ticks() + FRAME_MS
         while running:
-            dt = self.renderer.tick(60)
-            for e in pygame.event.get():
+            if self.replay is not None:
+                dt = self.replay.step(self)   # 事件與 dt 取自 trace 檔，不等待
+                if dt is None:
+                    self._stop_all(); break
+            else:
+                # frame 之間等待輸入：演奏鍵在 InputPump 內立即處理
+                self.input.wait_until(next_frame)
+                self.input.poll()
+                next_frame = max(next_frame + FRAME_MS, pygame.time.get_ticks())
+                dt = self.renderer.tick(0)
+                if self.trace is not None: self.trace.frame(dt, self.audio_lead)
+            flightrec.heartbeat()
+            flightrec.record("frame", round(dt * 1000.0, 2), round(self.time, 3))
+            for e in self.input.drain():
                 if e.type == pygame.QUIT:
                     self._stop_all(); running = False
 
+                if self.browser is not None:
+                    self.browser.handle_event(e)
+                    continue
                 if self.overlay and self.overlay.active:
                     self.overlay.handle_event(e)
                     continue
+                if self.calibration is not None:
+                    self.calibration.handle_event(e)
+                    continue
 
                 if e.type == pygame.KEYDOWN:
                     if e.key == pygame.K_SPACE:
-                        self.is_playing = not self.is_playing; continue
+                        self.is_playing = not self.is_playing
+                        flightrec.record("play", self.is_playing); continue
 
                     if e.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
-                        self.auto_sound = not self.auto_sound
-                        if not self.auto_sound:
-                            self._stop_all()
-                        continue
+                        self._toggle_auto_sound(); continue
 
                     if e.key in (pygame.K_KP_PLUS, getattr(pygame, "K_PLUS", pygame.K_EQUALS)):
                         mods = pygame.key.get_mods()
@@ -175,26 +593,34 @@ class App:
                     if e.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
                         self._adjust_speed(-20); continue
 
-                    # 手動演奏鍵
-                    if e.key in self.keymap:
-                        pitch = self.keymap[e.key]
-                        self.highlight_pitches.add(pitch)
-                        tok = self.synth.note_on(pitch, 110)
-                        if tok is not None:
-                            self._key_token[e.key] = tok
-
-                if e.type == pygame.KEYUP:
-                    if e.key not in (pygame.K_SPACE, pygame.K_RETURN, pygame.K_KP_ENTER) and e.key in self.keymap:
-                        pitch = self.keymap[e.key]
-                        self.highlight_pitches.discard(pitch)
-                        tok = self._key_token.pop(e.key, None)
-                        if tok is not None:
-                            self.synth.note_off_token(tok)
-                        else:
-                            self.synth.note_off(pitch)
-
+                    if e.key == pygame.K_F6:
+                        self._toggle_watch(); continue
+                    if e.key == pygame.K_F7:
+                        self.open_calibration(); continue
+                    if e.key == pygame.K_F8:
+                        self.export_reduced_midi(); continue
+                    if e.key == pygame.K_F9:
+                        self.save_performance(); continue
+                    if e.key == pygame.K_F10:
+                        self.recorder.clear(); self._toast("Recording cleared", 2.0); continue
+                    if e.key == pygame.K_F11:
+                        self._mem_snapshot(); continue
+                    if e.key in TRACK_KEYS and (e.mod & pygame.KMOD_CTRL):
+                        self._toggle_track(TRACK_KEYS[e.key], solo=bool(e.mod & pygame.KMOD_SHIFT)); continue
+                    if e.key in (pygame.K_PAGEDOWN, pygame.K_PAGEUP) and len(self.playlist):
+                        step = 1 if e.key == pygame.K_PAGEDOWN else -1
+                        self.switch_to(max(0, self.playlist.index) + step, autoplay=self.is_playing); continue
+
+                if e.type == pygame.MOUSEBUTTONUP and e.button == 1:
+                    self._scrubbing = False
+                if e.type == pygame.MOUSEMOTION and self._scrubbing:
+                    self.seek(self.renderer.minimap.time_at(e.pos[0], self.song_total)); continue
                 if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
                     mx, my = e.pos
+                    if self.song is not None and self.cfg.render.minimap_h > 0 \
+                            and self.renderer.minimap.rect.collidepoint(mx, my):
+                        self._scrubbing = True
+                        self.seek(self.renderer.minimap.time_at(mx, self.song_total)); continue
                     if my <= STATUS_H:
                         for label, rect in self.renderer.button_rects.items():
                             if rect.collidepoint(mx, my):
@@ -204,12 +630,14 @@ class App:
                                     self.open_keymap_overlay()
                                 elif label == "PLAY/PAUSE":
                                     self.is_playing = not self.is_playing
+                                    flightrec.record("play", self.is_playing)
                                 elif label == "AUTO SOUND":
-                                    self.auto_sound = not self.auto_sound
-                                    if not self.auto_sound:
-                                        self._stop_all()
+                                    self._toggle_auto_sound()
+                                elif label == "PRACTICE":
+                                    self._toggle_practice()
                                 elif label == "SPEED":
                                     self.playback_idx = (self.playback_idx + 1) % len(self.playback_rates)
+                                    flightrec.record("speed", self.playback_rates[self.playback_idx])
                                 elif label == "KEY RANGE":
                                     if self.renderer.cfg.key_range == "88":
                                         self.renderer.cfg.key_range = "76"
@@ -218,6 +646,7 @@ class App:
                                     else:
                                         self.renderer.cfg.key_range = "88"
                                     self.renderer.set_key_range(self.renderer.cfg.key_range)
+                                    flightrec.record("key_range", self.renderer.cfg.key_range)
                                     self._stop_all()
                                 elif label == "QUIT":
                                     self._stop_all(); running = False
@@ -236,8 +665,7 @@ class App:
                 if getattr(self.overlay, "want_save", False):
                     self.save_keymap_json(mapping=self.overlay.kc_to_pitch); self.overlay.want_save = False
                 if getattr(self.overlay, "want_load", False):
-                    loaded = self.load_keymap_json()
-                    if loaded is not None: self.overlay.kc_to_pitch = loaded
+                    self.open_browser("Load Keymap JSON", (".json",), self._load_keymap_into_overlay)
                     self.overlay.want_load = False
                 if self.overlay.finished:
                     if self.overlay.result_keymap is not None:
@@ -246,40 +674,29 @@ class App:
                 elif self.overlay.cancelled:
                     self.overlay = None
 
+            if self.browser is not None:
+                self.browser.update(dt)
+                if not self.browser.active:
+                    self._finish_browser()
+
+            if self.calibration is not None:
+                self.calibration.update(dt)
+                if not self.calibration.active:
+                    self._finish_calibration()
+
+            self._poll_playlist()
+            if self.watcher is not None:
+                song = self.watcher.poll()
+                if song is not None: self._reload_song(song)
+            if self.song is not None and self.song.streaming and self.song.poll(self.time):
+                self._apply_tracks(keep_score=True)
+
             # ===== 時間軸播放（token 精準關閉） =====
-            if (not self.overlay) and self.is_playing and self.notes_sorted:
-                prev_t = self.time
-                self.time += dt * self.playback_rates[self.playback_idx]
-                tol = 0.003
-
-                while self._next_on_idx < len(self.notes_sorted) and \
-                      self.notes_sorted[self._next_on_idx].start <= self.time + tol:
-                    n = self.notes_sorted[self._next_on_idx]
-                    tok = None
-                    if self.auto_sound and self._active_tokens < POLYPHONY_LIMIT:
-                        tok = self.synth.note_on(n.pitch, max(10, min(120, n.velocity)))
-                        if tok is not None:
-                            self._active_tokens += 1
-                    self._playing_counts[n.pitch] = self._playing_counts.get(n.pitch, 0) + 1
-                    self.playing.add(n.pitch)
-                    heapq.heappush(self._active_heap, (n.end, tok, n.pitch, n.velocity))
-                    self._next_on_idx += 1
-
-                while self._active_heap and self._active_heap[0][0] < self.time - tol:
-                    end, tok, pitch, _ = heapq.heappop(self._active_heap)
-                    if self.auto_sound and tok is not None:
-                        self.synth.note_off_token(tok)
-                        if self._active_tokens > 0:
-                            self._active_tokens -= 1
-                    elif self.auto_sound:
-                        self.synth.note_off(pitch)
-
-                    cnt = self._playing_counts.get(pitch, 0)
-                    if cnt <= 1:
-                        self._playing_counts.pop(pitch, None)
-                        self.playing.discard(pitch)
-                    else:
-                        self._playing_counts[pitch] = cnt - 1
+            if (not self.overlay) and self.calibration is None and self.is_playing and self.notes_sorted:
+                self._advance_playback(dt)
+
+            if self.practice and self.is_playing:
+                self.judge.sweep(self.time)
 
             # ----- Render -----
             self.renderer.begin_frame()
@@ -291,14 +708,41 @@ class App:
                 f"RANGE: {self.renderer.cfg.key_range}",
                 f"KEYS: {len(self.keymap)}",
             ]
+            if self.practice:
+                j = self.judge
+                right_fields.append(f"SCORE: {j.accuracy*100:.1f}% P{j.perfect} G{j.good} M{j.miss}"
+                                    + (f" [{j.last_grade.upper()}]" if j.last_grade else ""))
+            if self.audio_lead: right_fields.append(f"LAT: {self.audio_lead * 1000:+.0f}ms")
+            if self.solo: right_fields.append("SOLO: " + ",".join(str(t) for t in sorted(self.solo)))
+            elif self.muted: right_fields.append("MUTE: " + ",".join(str(t) for t in sorted(self.muted)))
+            if len(self.recorder): right_fields.append(f"REC: {len(self.recorder)}")
             if self._msg: right_fields.append(self._msg)
             right_info = "  |  ".join(right_fields)
 
             self.renderer.draw_status_bar(right_info_text=right_info, song_title=song_title)
-            highlight = set(self.highlight_pitches) | (set(self.playing) if self.auto_sound else set())
             self.renderer.draw_notes(self.notes_sorted, self.note_starts, self.time)
-            self.renderer.draw_keyboard(highlight=highlight)
+            if self.song is not None:
+                self.renderer.draw_minimap(self.song.density, self.time, self.song_total)
+            self.renderer.draw_keyboard(keystate=self.keys)
 
             if self.overlay and self.overlay.active:
                 self.overlay.draw(self.renderer.screen)
+            if self.calibration is not None:
+                self.calibration.draw(self.renderer.screen)
+            if self.browser is not None:
+                self.browser.draw(self.renderer.screen)
             self.renderer.end_frame()
+            if not first_frame_done:
+                first_frame_done = True
+                startup.mark("first frame")
+                startup.emit()
+
+        self._closing = True
+        self._device_thread.join(timeout=2.0)
+        if self.midi_in is not None:
+            self.midi_in.close()
+        self.playlist.close()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.song is not None:
+            self.song.close()
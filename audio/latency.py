@@ -0,0 +1,87 @@
+# audio/latency.py
+"""
+音源輸出延遲：
+- LatencyStore：每個輸出裝置一個偏移值（ms），存成 JSON
+- measure_loopback：輸出接回輸入（實體 MIDI 線或 MockLoopbackOutput）量測送出到收到的時間差
+App 依偏移值把自動發聲提前送出，讓聲音與落到判定線的音符對齊。
+"""
+import json, logging, os, statistics, time
+from typing import Callable, Dict, Optional
+
+CLICK_PITCH = 84
+MIN_MS, MAX_MS = -200.0, 500.0   # 合理範圍外的量測值一律夾住
+
+def default_latency_path() -> str:
+    from utils.crashlog import log_dir
+    return os.path.join(os.path.dirname(log_dir()), "latency.json")
+
+def _ms_clock() -> int:
+    return int(time.perf_counter() * 1000)
+
+class LatencyStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_latency_path()
+        self._data: Dict[str, float] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._data = {str(k): float(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logging.exception("latency file unreadable: %s", self.path)
+
+    def get(self, device: str) -> float:
+        return self._data.get(device, 0.0)
+
+    def set(self, device: str, ms: float) -> float:
+        ms = round(min(max(ms, MIN_MS), MAX_MS), 1)
+        self._data[device] = ms
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        return ms
+
+class MockLoopbackOutput:
+    """假輸出裝置：note_on 在 latency_ms 後「回送」到 FakeMidiInput（時間戳往後推），沒有硬體時驗證校正流程。"""
+    def __init__(self, loop_in, latency_ms: float = 25.0, clock: Callable[[], int] = _ms_clock):
+        self.loop_in = loop_in
+        self.latency_ms = latency_ms
+        self.clock = clock
+        self.device_name = "mock"
+
+    def note_on(self, pitch: int, vel: int = 100):
+        self.loop_in.feed(0x90, pitch, vel, self.clock() + int(round(self.latency_ms)))
+        return None
+
+    def note_off(self, pitch: int):
+        pass
+
+def measure_loopback(out, dev, clicks: int = 8, interval_s: float = 0.15, timeout_s: float = 1.0,
+                     clock: Optional[Callable[[], int]] = None) -> Optional[float]:
+    """
+    out：有 note_on / note_off 的輸出（Synth 或 mock）；dev：pygame.midi.Input 介面（poll / read）。
+    clock 必須與 dev 的時間戳同基準（預設用 out.clock，沒有則 pygame.midi.time）。回傳中位數（ms），收不到回音則 None。
+    """
+    clock = clock or getattr(out, "clock", None)
+    if clock is None:
+        import pygame.midi
+        clock = pygame.midi.time
+    offsets = []
+    for _ in range(clicks):
+        while dev.poll(): dev.read(64)   # 清掉殘留
+        t_send = clock()
+        out.note_on(CLICK_PITCH, 100)
+        deadline = time.perf_counter() + timeout_s
+        got = None
+        while got is None and time.perf_counter() < deadline:
+            if not dev.poll():
+                time.sleep(0.0005); continue
+            for (status, d1, d2, _), ts in dev.read(64):
+                if (status & 0xF0) == 0x90 and d2 > 0 and d1 == CLICK_PITCH:
+                    got = ts; break
+        out.note_off(CLICK_PITCH)
+        if got is not None:
+            offsets.append(got - t_send)
+        time.sleep(interval_s)
+    return float(statistics.median(offsets)) if offsets else None
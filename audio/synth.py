@@ -10,25 +10,34 @@ class Synth:
     - note_off_token(token) 精準關閉該次觸發
     - note_off(pitch) 關掉該 pitch 的最後一發（後備）
     """
-    def __init__(self, cfg):
+    def __init__(self, cfg, open_device: bool = True):
         self.cfg = cfg
         self.midi_out = None
         self.use_midi_out = False
+        self.device_name = "none"         # 延遲偏移以此為 key（audio/latency.py）
 
         self.channels = [ch for ch in range(16) if ch != DRUM_CH]
         self._rr_index = 0
         self._next_token = 1
         self._token_map = {}              # token -> (ch, pitch)
-        self._active_stack_by_pitch = {}  # pitch -> [token1, token2, ...]
+        self._active_stack_by_pitch = [[] for _ in range(128)]  # pitch -> [token1, token2, ...]（固定 128 格）
 
+        if open_device:
+            self.open()
+
+    def open(self):
+        """pygame.midi.init + 探測裝置（較慢，App 在背景執行緒呼叫；完成前 note_on 一律回傳 None）。"""
         try:
             pygame.midi.init()
             dev = pygame.midi.get_default_output_id()
             if dev != -1:
-                self.midi_out = pygame.midi.Output(dev)
+                out = pygame.midi.Output(dev)
                 for ch in self.channels:
-                    self.midi_out.set_instrument(0, ch)  # Acoustic Grand
-                self.use_midi_out = True
+                    out.set_instrument(0, ch)  # Acoustic Grand
+                self.midi_out = out
+                info = pygame.midi.get_device_info(dev)
+                if info: self.device_name = info[1].decode("utf-8", "replace")
+                self.use_midi_out = True       # 最後才打開，避免其他執行緒看到半初始化狀態
                 print(f"[Synth] Using system MIDI out (device {dev})")
             else:
                 print("[Synth] No MIDI output device found")
@@ -54,7 +63,7 @@ class Synth:
     def _new_token(self, ch: int, pitch: int) -> int:
         t = self._next_token; self._next_token += 1
         self._token_map[t] = (ch, pitch)
-        self._active_stack_by_pitch.setdefault(pitch, []).append(t)
+        self._active_stack_by_pitch[pitch & 0x7F].append(t)
         return t
 
     def note_on(self, pitch: int, vel: int = 100):
@@ -69,15 +78,13 @@ class Synth:
 
     def note_off(self, pitch: int):
         if not (self.use_midi_out and self.midi_out): return
-        stack = self._active_stack_by_pitch.get(int(pitch))
+        stack = self._active_stack_by_pitch[int(pitch) & 0x7F]
         if stack:
             t = stack.pop()
             ch, p = self._token_map.pop(t, (None, None))
             if ch is not None:
                 try: self.midi_out.note_off(p, 0, ch)
                 except Exception: pass
-            if not stack:
-                self._active_stack_by_pitch.pop(int(pitch), None)
             return
         for ch in self.channels:
             try: self.midi_out.note_off(int(pitch), 0, ch)
@@ -89,11 +96,10 @@ class Synth:
         if ch is None: return
         try: self.midi_out.note_off(p, 0, ch)
         except Exception: pass
-        st = self._active_stack_by_pitch.get(p)
+        st = self._active_stack_by_pitch[p & 0x7F]
         if st:
             try: st.remove(token)
             except ValueError: pass
-            if not st: self._active_stack_by_pitch.pop(p, None)
 
     def all_notes_off(self):
         if not (self.use_midi_out and self.midi_out): return
@@ -102,4 +108,5 @@ class Synth:
                 try: self.midi_out.note_off(p, 0, ch)
                 except Exception: pass
         self._token_map.clear()
-        self._active_stack_by_pitch.clear()
+        for st in self._active_stack_by_pitch:
+            st.clear()
@@ -0,0 +1,148 @@
+# batch.py
+"""
+無視窗批次工具：python main.py {analyze,reduce,stats} "songs/**/*.mid" ...
+- 以 process pool 平行處理，in-flight 工作數有上限（不會一次把整個曲庫塞進佇列）
+- 每完成一個檔案就輸出一行 JSON（JSON Lines），可直接 pipe 給其他工具
+"""
+import sys, os, glob, json, time, argparse, heapq
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Optional
+from config import ReductionConfig
+from utils.asynclog import pool_context
+from notes.reduction import REDUCTION_MODES
+
+COMMANDS = ("analyze", "reduce", "stats")
+
+def expand_inputs(patterns: List[str]) -> Iterator[str]:
+    seen = set()
+    for pat in patterns:
+        paths = sorted(glob.glob(pat, recursive=True)) if glob.has_magic(pat) else [pat]
+        for p in paths:
+            if p not in seen and os.path.isfile(p):
+                seen.add(p)
+                yield p
+
+def _peak_polyphony(notes) -> int:
+    ends: list[float] = []
+    peak = 0
+    for n in notes:  # notes 依 start 排序
+        while ends and ends[0] <= n.start:
+            heapq.heappop(ends)
+        heapq.heappush(ends, n.end)
+        peak = max(peak, len(ends))
+    return peak
+
+def _analyze(notes, total: float) -> dict:
+    pitches = [n.pitch for n in notes]
+    return {
+        "notes": len(notes),
+        "duration": round(total, 3),
+        "channels": sorted({n.channel for n in notes}),
+        "pitch_min": min(pitches, default=None),
+        "pitch_max": max(pitches, default=None),
+        "peak_polyphony": _peak_polyphony(notes),
+    }
+
+def _stats(notes, total: float) -> dict:
+    n = len(notes)
+    pc = [0] * 12
+    per_track: dict = {}
+    for x in notes:
+        pc[x.pitch % 12] += 1
+        per_track[x.track] = per_track.get(x.track, 0) + 1
+    return {
+        "notes": n,
+        "notes_per_sec": round(n / total, 3) if total > 0 else 0.0,
+        "velocity_mean": round(sum(x.velocity for x in notes) / n, 2) if n else 0.0,
+        "duration_mean": round(sum(x.dur for x in notes) / n, 4) if n else 0.0,
+        "pitch_class_hist": pc,
+        "notes_per_track": {str(t): c for t, c in sorted(per_track.items())},
+    }
+
+def run_one(cmd: str, path: str, reduce_cfg: ReductionConfig, write_dir: Optional[str] = None) -> dict:
+    """在 worker process 內執行；例外轉成 error 欄位，不讓單一壞檔中斷整批。"""
+    from midi.parser import parse_midi
+    out = {"path": path, "cmd": cmd}
+    try:
+        t0 = time.perf_counter()
+        parsed = parse_midi(path)
+        notes, total = parsed.notes, parsed.total
+        out["parse_s"] = round(time.perf_counter() - t0, 4)
+        if cmd == "analyze":
+            out.update(_analyze(notes, total))
+        elif cmd == "stats":
+            out.update(_stats(notes, total))
+        else:
+            from notes.reduction import make_reduction
+            t1 = time.perf_counter()
+            reduced = make_reduction(reduce_cfg.mode).apply(notes, reduce_cfg)
+            out.update({
+                "mode": reduce_cfg.mode,
+                "notes_in": len(notes),
+                "notes_out": len(reduced),
+                "reduce_s": round(time.perf_counter() - t1, 4),
+                "peak_polyphony_in": _peak_polyphony(notes),
+                "peak_polyphony_out": _peak_polyphony(reduced),
+            })
+            if write_dir:
+                from midi.writer import write_notes_midi
+                dst = os.path.join(write_dir, os.path.splitext(os.path.basename(path))[0] + ".reduced.mid")
+                write_notes_midi(dst, reduced, parsed.tempo_map, track_names=parsed.track_names)
+                out["written"] = dst
+        out["ok"] = True
+    except Exception as e:
+        out["ok"] = False
+        out["error"] = f"{type(e).__name__}: {e}"
+    return out
+
+def run_batch(cmd: str, paths: Iterator[str], reduce_cfg: ReductionConfig,
+              workers: int = 0, max_inflight: int = 0, out=None, write_dir: Optional[str] = None) -> int:
+    """回傳失敗檔案數。結果依完成順序逐行寫出。"""
+    out = out or sys.stdout
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or workers * 2
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as ex:
+        pending = set()
+        def drain(block_until: int):
+            nonlocal pending, failed
+            while len(pending) > block_until:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    res = f.result()
+                    failed += 0 if res.get("ok") else 1
+                    out.write(json.dumps(res, ensure_ascii=False) + "\n")
+                out.flush()
+        for p in paths:
+            pending.add(ex.submit(run_one, cmd, p, reduce_cfg, write_dir))
+            drain(max_inflight - 1)   # 佇列滿了就等有工作完成再送
+        drain(0)
+    return failed
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(prog="main.py", description="PI-DX 批次 parse / reduce / 分析")
+    ap.add_argument("cmd", choices=COMMANDS)
+    ap.add_argument("inputs", nargs="+", help='檔案或 glob（記得加引號，例如 "songs/**/*.mid"）')
+    ap.add_argument("-j", "--workers", type=int, default=0, help="process 數（預設 = CPU 核心數）")
+    ap.add_argument("--max_inflight", type=int, default=0, help="同時排隊的工作上限（預設 = workers*2）")
+    ap.add_argument("--reduction_mode", default="basic", choices=REDUCTION_MODES)
+    ap.add_argument("--reduction_vel", type=int, default=1)
+    ap.add_argument("--reduction_poly", type=int, default=16)
+    ap.add_argument("--slice_ms", type=int, default=40)
+    ap.add_argument("--target_nps", type=float, default=40.0, help="adaptive：每秒保留的音數目標")
+    ap.add_argument("--density_window_ms", type=int, default=2000)
+    ap.add_argument("--hand_span", type=int, default=12, help="two_hand：單手跨度（半音）")
+    ap.add_argument("--max_fingers", type=int, default=5)
+    ap.add_argument("--max_sounding", type=int, default=24, help="sweep_poly：同時發聲上限")
+    ap.add_argument("--write", default=None, metavar="DIR", help="reduce：把結果寫成 DIR/<name>.reduced.mid")
+    args = ap.parse_args(argv)
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+    rcfg = ReductionConfig(min_velocity=args.reduction_vel, max_poly_per_slice=args.reduction_poly,
+                           slice_ms=args.slice_ms, mode=args.reduction_mode,
+                           target_nps=args.target_nps, density_window_ms=args.density_window_ms,
+                           hand_span=args.hand_span, max_fingers=args.max_fingers,
+                           max_sounding=args.max_sounding)
+    failed = run_batch(args.cmd, expand_inputs(args.inputs), rcfg, args.workers, args.max_inflight,
+                       write_dir=args.write)
+    return 1 if failed else 0
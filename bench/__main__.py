@@ -0,0 +1,5 @@
+# bench/__main__.py
+import sys
+from bench.run import main
+
+sys.exit(main(sys.argv[1:]))
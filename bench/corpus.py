@@ -0,0 +1,65 @@
+# bench/corpus.py
+"""
+基準測試用的合成 MIDI：固定 seed，可控制音符數、同時發聲數（聲部數）與 tempo 變化密度。
+同一組參數每次產生的檔案逐位元組相同。
+"""
+import os, random
+from dataclasses import dataclass, replace
+from typing import List
+from notes.model import Note
+from midi.tempo import TempoMap
+from midi.writer import write_notes_midi
+
+TPB = 480
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    name: str
+    notes: int
+    polyphony: int           # 聲部數；每個聲部內音不重疊
+    tempo_changes: int = 0   # 平均分布在整首的 set_tempo 數
+    seed: int = 1
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}-{self.notes}"
+
+    def scaled(self, k: float) -> "CorpusSpec":
+        return replace(self, notes=max(self.polyphony, int(self.notes * k)),
+                       tempo_changes=int(self.tempo_changes * k))
+
+CORPUS = (
+    CorpusSpec("sparse", 20_000, 4),
+    CorpusSpec("dense", 200_000, 48, tempo_changes=50),
+    CorpusSpec("tempo", 50_000, 8, tempo_changes=2_000),
+)
+
+def make_notes(spec: CorpusSpec) -> List[Note]:
+    rng = random.Random(spec.seed)
+    per_voice = -(-spec.notes // spec.polyphony)
+    out: List[Note] = []
+    for v in range(spec.polyphony):
+        lo = 21 + (v * 67) // spec.polyphony   # 各聲部分散在鍵盤上
+        t = rng.uniform(0.0, 0.2)
+        for _ in range(min(per_voice, spec.notes - len(out))):
+            dur = rng.uniform(0.05, 0.5)
+            out.append(Note(pitch=lo + rng.randint(0, 20), start=t, end=t + dur,
+                            velocity=rng.randint(1, 127), channel=v % 16))
+            t += dur + rng.uniform(0.0, 0.05)
+    out.sort(key=lambda n: (n.start, n.pitch))
+    return out
+
+def make_tempo_map(spec: CorpusSpec, total_s: float) -> TempoMap:
+    rng = random.Random(spec.seed + 1)
+    total_ticks = int(total_s * TPB * 2)   # 以 120 bpm 估整首長度
+    step = max(1, total_ticks // (spec.tempo_changes + 1))
+    return TempoMap(TPB, [(step * (i + 1), rng.randint(300_000, 900_000)) for i in range(spec.tempo_changes)])
+
+def write_corpus(spec: CorpusSpec, out_dir: str) -> str:
+    """寫成 out_dir/<name>-<notes>-<poly>-<tempo>-<seed>.mid；已存在就直接用。"""
+    path = os.path.join(out_dir, f"{spec.key}-{spec.polyphony}-{spec.tempo_changes}-{spec.seed}.mid")
+    if not os.path.exists(path):
+        notes = make_notes(spec)
+        total = max((n.end for n in notes), default=0.0)
+        write_notes_midi(path, notes, make_tempo_map(spec, total))
+    return path
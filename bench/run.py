@@ -0,0 +1,177 @@
+# bench/run.py
+"""
+效能基準：python main.py bench [--quick] [--save] [--threshold 0.2]
+- 階段：parse（mido）、smf（out-of-core 索引 + 全曲解碼）、每種 reduction、playback（App 的排程 + 繪製）
+- 吞吐量取 repeat 次中最快的一次（notes/s）；峰值記憶體另外以 tracemalloc 跑一次
+- 與 bench/baseline.json 比較：吞吐量掉超過 threshold 或記憶體多超過 mem_threshold 就 exit 1
+基準值與機器有關，不進版控；換機器或確認過的變更後用 --save 更新。
+CI：在同一台 runner 上先以主線跑 `bench --quick --save --baseline <快取路徑>`，
+再對變更跑 `bench --quick --check --baseline <快取路徑>`；--check 時沒有基準檔、
+或有項目沒有基準值都算失敗（exit 2），不會因為基準檔不見而默默通過。
+"""
+import argparse, gc, json, logging, os, sys, tempfile, time, tracemalloc
+from dataclasses import replace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from config import ReductionConfig
+from bench.corpus import CORPUS, CorpusSpec, write_corpus
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+FRAME_S = 1.0 / 60
+MIN_PEAK_KB = 64   # 峰值太小時比例沒意義，不比較記憶體
+
+def _best_time(fn: Callable[[], int], repeat: int) -> Tuple[float, int]:
+    best, count = float("inf"), 0
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, count
+
+def _peak_kb(fn: Callable[[], int]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+# ---- 播放迴圈：用真的 App（SDL dummy driver），不開自動發聲 ----
+_app = None
+
+def _bench_app():
+    global _app
+    if _app is None:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        from config import AppConfig, InputConfig
+        from app import App
+        # headless：不在背景探測 MIDI 裝置，計時只含排程與繪製
+        _app = App(AppConfig(input=InputConfig(midi_in="none")), [], headless=True)
+    return _app
+
+def _playback(song, frames: int) -> int:
+    app = _bench_app()
+    app.set_song(song)
+    app.is_playing = True
+    r = app.renderer
+    for _ in range(frames):
+        app._advance_playback(FRAME_S)
+        r.begin_frame()
+        r.draw_notes(app.notes_sorted, app.note_starts, app.time)
+        r.draw_keyboard(keystate=app.keys)
+    return app._next_on_idx
+
+def _smf_all(path: str) -> int:
+    from midi.smf import SmfIndex
+    idx = SmfIndex(path)
+    try:
+        return len(idx.decode(0.0, idx.total + 1.0))
+    finally:
+        idx.close()
+
+def stages(path: str, reduce_cfg: ReductionConfig, frames: int) -> Iterator[Tuple[str, Callable[[], int]]]:
+    from midi.parser import parse_midi
+    from notes.reduction import REDUCTION_MODES, make_reduction
+    from notes.song import Song
+    parsed = parse_midi(path)
+    notes = parsed.notes
+    yield "parse", lambda: len(parse_midi(path).notes)
+    yield "smf", lambda: _smf_all(path)
+    for mode in REDUCTION_MODES:
+        strat, cfg = make_reduction(mode), replace(reduce_cfg, mode=mode)
+        yield f"reduce:{mode}", lambda s=strat, c=cfg: (s.apply(notes, c), len(notes))[1]
+    try:
+        import pygame  # noqa: F401
+    except ImportError:
+        print("[bench] pygame not installed: skipping playback", file=sys.stderr)
+        return
+    song = Song.from_notes(make_reduction(reduce_cfg.mode).apply(notes, reduce_cfg), path, parsed.tempo_map)
+    song.prepare()
+    yield "playback", lambda: _playback(song, frames)
+
+def run(specs: List[CorpusSpec], corpus_dir: str, repeat: int = 3, frames: int = 1800,
+        only: Optional[str] = None) -> Dict[str, dict]:
+    results: Dict[str, dict] = {}
+    rcfg = ReductionConfig()
+    for spec in specs:
+        path = write_corpus(spec, corpus_dir)
+        for name, fn in stages(path, rcfg, frames):
+            key = f"{spec.key}/{name}"
+            if only and only not in key: continue
+            secs, count = _best_time(fn, repeat)
+            results[key] = {
+                "notes": count,
+                "notes_per_s": round(count / secs, 1) if secs > 0 else 0.0,
+                "peak_kb": round(_peak_kb(fn), 1),
+            }
+            if name == "playback":
+                results[key]["frames_per_s"] = round(frames / secs, 1)
+            print(f"{key:<32s} {count:>9d} notes {results[key]['notes_per_s']:>13,.0f} notes/s "
+                  f"{results[key]['peak_kb']:>11,.0f} KB", flush=True)
+    return results
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            threshold: float, mem_threshold: float) -> List[str]:
+    """回傳退步項目的說明；沒有基準值的項目不比較。"""
+    bad = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if b is None: continue
+        if r["notes_per_s"] < b["notes_per_s"] * (1.0 - threshold):
+            bad.append(f"{key}: {r['notes_per_s']:,.0f} notes/s vs baseline {b['notes_per_s']:,.0f} "
+                       f"({r['notes_per_s'] / b['notes_per_s'] - 1:+.0%})")
+        if b["peak_kb"] >= MIN_PEAK_KB and r["peak_kb"] > b["peak_kb"] * (1.0 + mem_threshold):
+            bad.append(f"{key}: peak {r['peak_kb']:,.0f} KB vs baseline {b['peak_kb']:,.0f} KB "
+                       f"({r['peak_kb'] / b['peak_kb'] - 1:+.0%})")
+    return bad
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(prog="main.py bench", description="PI-DX 效能基準")
+    ap.add_argument("--quick", action="store_true", help="語料縮成 1/10（快速檢查）")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--frames", type=int, default=1800, help="playback 階段跑幾個 frame")
+    ap.add_argument("--only", default=None, help="只跑名稱含此字串的項目，例如 reduce 或 dense/")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save", action="store_true", help="把這次結果寫進基準檔")
+    ap.add_argument("--check", action="store_true", help="CI 用：沒有基準檔或基準值不齊時 exit 2")
+    ap.add_argument("--threshold", type=float, default=0.20, help="吞吐量允許退步比例")
+    ap.add_argument("--mem_threshold", type=float, default=0.25, help="峰值記憶體允許增加比例")
+    ap.add_argument("--corpus_dir", default=None, help="合成語料存放處（預設為暫存資料夾）")
+    ap.add_argument("--json", default=None, metavar="OUT", help="結果另存 JSON")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    specs = [s.scaled(0.1) for s in CORPUS] if args.quick else list(CORPUS)
+    frames = args.frames // 3 if args.quick else args.frames
+    with tempfile.TemporaryDirectory(prefix="pidx-bench-") as tmp:
+        corpus_dir = args.corpus_dir or tmp
+        os.makedirs(corpus_dir, exist_ok=True)
+        results = run(specs, corpus_dir, args.repeat, frames, args.only)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    baseline: Dict[str, dict] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline saved: {args.baseline}")
+        return 0
+    missing = [key for key in results if key not in baseline]
+    if args.check and (not baseline or missing):
+        print(f"no baseline for {len(missing)} item(s) in {args.baseline} (run with --save first)"
+              + "".join(f"\n  {key}" for key in missing))
+        return 2
+    if not baseline:
+        print("no baseline yet (run with --save to create one)")
+        return 0
+    bad = compare(results, baseline, args.threshold, args.mem_threshold)
+    for line in bad:
+        print("REGRESSION", line)
+    return 1 if bad else 0
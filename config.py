@@ -1,5 +1,5 @@
 # config.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 @dataclass
@@ -10,6 +10,7 @@ class RenderConfig:
     pixels_per_second: float = 280.0  # fall speed
     spawn_seconds: float = 3.0        # note runway above screen
     key_range: str = "88"
+    minimap_h: int = 28               # 狀態列下方的整首密度縮圖（0 = 關閉）
 
 @dataclass
 class ReductionConfig:
@@ -17,14 +18,33 @@ class ReductionConfig:
     max_poly_per_slice: int = 16
     slice_ms: int = 40
     mode: str = "basic"  # or "melody_bass" etc.
+    target_nps: float = 40.0          # adaptive：每秒保留的音數目標
+    density_window_ms: int = 2000     # adaptive：量測局部密度的視窗長度
+    hand_span: int = 12               # two_hand：一隻手能同時按到的跨度（半音）
+    max_fingers: int = 5              # two_hand：一隻手同時最多幾個音
+    max_sounding: int = 24            # sweep_poly：同時發聲上限（與 app.POLYPHONY_LIMIT 相同）
 
 @dataclass
 class AudioConfig:
     sf2_path: Optional[str] = None
     sample_rate: int = 44100
+    latency_file: Optional[str] = None   # 各輸出裝置的延遲偏移（None = logs 旁的 latency.json）
+
+@dataclass
+class InputConfig:
+    midi_in: Optional[str] = "auto"  # 'auto' | 'none' | 裝置 id
+    midi_thru: bool = False          # MIDI 輸入是否直接送到音源
+
+@dataclass
+class StreamConfig:
+    threshold_mb: int = 512   # 檔案 >= 此大小改用 out-of-core 視窗載入（0 = 停用）
+    window_s: float = 8.0     # 每個解碼視窗的長度；記憶體中最多保留前、目前、後 3 個
 
 @dataclass
 class AppConfig:
-    render: RenderConfig = RenderConfig()
-    reduce: ReductionConfig = ReductionConfig()
-    audio: AudioConfig = AudioConfig()
+    render: RenderConfig = field(default_factory=RenderConfig)
+    reduce: ReductionConfig = field(default_factory=ReductionConfig)
+    audio: AudioConfig = field(default_factory=AudioConfig)
+    input: InputConfig = field(default_factory=InputConfig)
+    stream: StreamConfig = field(default_factory=StreamConfig)
+    watch_file: bool = False   # 監看 current_midi，存檔後自動重載（F6 切換）
@@ -4,11 +4,9 @@ from tkinter import ttk
 from typing import Dict, Optional, Tuple
 import pygame  # 用於 keysym -> pygame keycode 轉換
 
-FIRST_MIDI, LAST_MIDI = 21, 108
-WHITE_SET = {0, 2, 4, 5, 7, 9, 11}
+from render.keyboard import is_black as midi_is_black, keyboard_geometry
 
-def midi_is_black(p: int) -> bool:
-    return (p % 12) not in WHITE_SET
+FIRST_MIDI, LAST_MIDI = 21, 108
 
 class KeymapEditor(tk.Toplevel):
     """
@@ -51,9 +49,7 @@ class KeymapEditor(tk.Toplevel):
         ttk.Button(btns, text="Cancel", command=self.on_cancel).pack(side="right", padx=(0, 6))
 
         # 幾何資料
-        self.white_keys: list[tuple[int, float, float]] = []  # (pitch, x0, x1)
-        self.black_keys: list[tuple[int, float, float]] = []  # (pitch, x0, x1)
-        self._layout_keys()
+        self._layout_keys()   # white_keys / black_keys: (pitch, x0, x1)
         self._redraw()
 
         # 事件
@@ -68,29 +64,9 @@ class KeymapEditor(tk.Toplevel):
 
     # ---------- 幾何與繪製 ----------
     def _layout_keys(self):
-        total_white = sum(1 for p in range(FIRST_MIDI, LAST_MIDI + 1) if (p % 12) in WHITE_SET)
-        white_w = self.width / total_white
-
-        # 白鍵
-        x = 0.0
-        for p in range(FIRST_MIDI, LAST_MIDI + 1):
-            if (p % 12) in WHITE_SET:
-                self.white_keys.append((p, x, x + white_w))
-                x += white_w
-
-        # 黑鍵（放在相鄰白鍵之間）
-        idx_white = 0
-        for p in range(FIRST_MIDI, LAST_MIDI + 1):
-            pc = p % 12
-            if pc in WHITE_SET:
-                if pc in {0, 2, 5, 7, 9} and idx_white + 1 < len(self.white_keys):  # C D F G A 右側有黑鍵
-                    left_white_x0 = self.white_keys[idx_white][1]
-                    right_white_x0 = self.white_keys[idx_white + 1][1]
-                    white_w = right_white_x0 - left_white_x0
-                    bx = left_white_x0 + white_w * 0.7
-                    bw = white_w * 0.6
-                    self.black_keys.append((p + 1, bx, bx + bw))  # p+1 為對應黑鍵
-                idx_white += 1
+        self.geom = keyboard_geometry(FIRST_MIDI, LAST_MIDI, float(self.width))
+        self.white_keys = self.geom.white_keys
+        self.black_keys = self.geom.black_keys
 
     def _redraw(self):
         self.canvas.delete("all")
@@ -121,32 +97,21 @@ class KeymapEditor(tk.Toplevel):
         self.canvas.create_text(10, 14, text=tip, fill="#c8c8d0", anchor="w", font=("Consolas", 11))
 
     def _label_anchor(self, pitch: int) -> Tuple[Optional[float], Optional[float]]:
-        for p, x0, x1 in self.black_keys:
-            if p == pitch:
-                return (x0 + x1) / 2, self.height - self.white_h - 8
-        for p, x0, x1 in self.white_keys:
-            if p == pitch:
-                return (x0 + x1) / 2, self.height - 18
-        return None, None
+        if not self.geom.has_key(pitch):
+            return None, None
+        y = self.height - self.white_h - 8 if midi_is_black(pitch) else self.height - 18
+        return self.geom.center_x(pitch), y
 
     # ---------- 互動 ----------
     def on_click(self, event):
         x, y = event.x, event.y
-        # 先測黑鍵
-        if self.height - self.white_h <= y <= self.height - self.white_h + self.black_h:
-            for p, x0, x1 in self.black_keys:
-                if x0 <= x <= x1:
-                    self.selected_pitch = p
-                    self.waiting_key = True
-                    self._redraw()
-                    return
-        # 再測白鍵
-        for p, x0, x1 in self.white_keys:
-            if x0 <= x <= x1:
-                self.selected_pitch = p
-                self.waiting_key = True
-                self._redraw()
-                return
+        # 黑鍵高度內黑鍵優先，其餘算白鍵
+        top = self.height - self.white_h
+        p = self.geom.pitch_at(x, top <= y <= top + self.black_h)
+        if p is not None:
+            self.selected_pitch = p
+            self.waiting_key = True
+            self._redraw()
 
     def on_key(self, event):
         if not self.waiting_key or self.selected_pitch is None:
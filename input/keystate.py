@@ -0,0 +1,80 @@
+# input/keystate.py
+from array import array
+
+N_KEYS = 128
+AUTO, MANUAL, MIDI_IN = 0, 1, 2   # 音來源
+N_SOURCES = 3
+
+class KeyState:
+    """
+    128 格固定大小的琴鍵狀態（App 寫、Renderer 讀）：
+    - counts[src][pitch]：各來源的疊加次數（自動播放 / 手動鍵 / MIDI-in）
+    - lit[pitch]：目前是否高亮（自動播放的音只在 show_auto 時顯示）
+    - 記錄自上次 clear_dirty() 以來狀態有變的鍵；整個過程不配置新物件
+    音源不經過這裡：audio.synth.Synth 以自己的 128 格 token stack 追蹤每次觸發（關音要對到 channel）。
+    """
+    def __init__(self):
+        self.counts = [array('H', bytes(2 * N_KEYS)) for _ in range(N_SOURCES)]
+        self.lit = bytearray(N_KEYS)
+        self.show_auto = True
+        self.dirty_keys = array('B', bytes(N_KEYS))
+        self.n_dirty = 0
+        self._dirty_flag = bytearray(N_KEYS)
+
+    def press(self, pitch: int, src: int):
+        if not (0 <= pitch < N_KEYS): return
+        c = self.counts[src]
+        if c[pitch] < 0xFFFF:
+            c[pitch] += 1
+        if c[pitch] == 1:
+            self._refresh(pitch)
+
+    def release(self, pitch: int, src: int):
+        if not (0 <= pitch < N_KEYS): return
+        c = self.counts[src]
+        if c[pitch]:
+            c[pitch] -= 1
+            if not c[pitch]:
+                self._refresh(pitch)
+
+    def count(self, pitch: int, src: int) -> int:
+        return self.counts[src][pitch] if 0 <= pitch < N_KEYS else 0
+
+    def clear(self, src: int | None = None):
+        srcs = range(N_SOURCES) if src is None else (src,)
+        for s in srcs:
+            c = self.counts[s]
+            for p in range(N_KEYS):
+                if c[p]:
+                    c[p] = 0
+                    self._refresh(p)
+
+    def set_show_auto(self, flag: bool):
+        if self.show_auto == flag: return
+        self.show_auto = flag
+        c = self.counts[AUTO]
+        for p in range(N_KEYS):
+            if c[p]:
+                self._refresh(p)
+
+    def _refresh(self, p: int):
+        on = 1 if (self.counts[MANUAL][p] or self.counts[MIDI_IN][p]
+                   or (self.show_auto and self.counts[AUTO][p])) else 0
+        if on != self.lit[p]:
+            self.lit[p] = on
+            self._mark(p)
+
+    def _mark(self, p: int):
+        if not self._dirty_flag[p]:
+            self._dirty_flag[p] = 1
+            self.dirty_keys[self.n_dirty] = p
+            self.n_dirty += 1
+
+    def mark_all_dirty(self):
+        for p in range(N_KEYS):
+            self._mark(p)
+
+    def clear_dirty(self):
+        for i in range(self.n_dirty):
+            self._dirty_flag[self.dirty_keys[i]] = 0
+        self.n_dirty = 0
@@ -0,0 +1,53 @@
+# input/live.py
+import pygame
+from typing import Callable, List, Optional
+
+class InputPump:
+    """
+    低延遲輸入：在 frame 之間的空檔用 pygame.event.wait 等事件，
+    演奏事件（is_play 判定）一到就附上時間戳交給 on_play，不必等到下一個 frame；
+    其餘事件暫存，由主迴圈在 frame 開頭 drain() 處理。
+    時間戳 e.t_ms（ms，pygame.time.get_ticks 基準）：pygame 2.6 的事件不帶 SDL 時間戳，
+    - MIDI_NOTE_EVENT：MidiInputThread 依裝置時間戳換算好放進 t_ms
+    - 其他事件：取出時蓋上。frame 之間在 event.wait 裡等，取出 ≈ 到達；render 期間到的事件
+      要到下一次等待才取出，最多晚一個 frame
+    """
+    def __init__(self, is_play: Callable[[pygame.event.Event], bool],
+                 on_play: Callable[[pygame.event.Event, int], None]):
+        self.is_play = is_play
+        self.on_play = on_play
+        self.pending: List[pygame.event.Event] = []
+        self.tap: Optional[Callable[[pygame.event.Event, int], None]] = None   # utils.trace 記錄用
+
+    def _dispatch(self, e: pygame.event.Event):
+        if "t_ms" not in e.dict:
+            e.t_ms = pygame.time.get_ticks()   # 暫存到 pending 的事件也帶著（F7 校正的 tap 要用）
+        ts = e.t_ms
+        if self.tap is not None: self.tap(e, ts)
+        if self.is_play(e):
+            self.on_play(e, ts)
+        else:
+            self.pending.append(e)
+
+    def feed(self, e: pygame.event.Event):
+        """從外部送入一個事件（trace 重播），與從 pygame 佇列收到的處理方式相同。"""
+        self._dispatch(e)
+
+    def wait_until(self, deadline_ms: float):
+        """處理事件直到 deadline（取代 Clock.tick 的 sleep）。"""
+        while True:
+            left = int(deadline_ms - pygame.time.get_ticks())
+            if left <= 0:
+                break
+            e = pygame.event.wait(left)
+            if e.type == pygame.NOEVENT:
+                break
+            self._dispatch(e)
+
+    def poll(self):
+        for e in pygame.event.get():
+            self._dispatch(e)
+
+    def drain(self) -> List[pygame.event.Event]:
+        out, self.pending = self.pending, []
+        return out
@@ -0,0 +1,94 @@
+# input/midi_in.py
+import threading, time, logging
+from collections import deque
+from typing import Optional
+import pygame
+import pygame.midi
+
+# 與電腦鍵盤走同一條輸入路徑：背景執行緒把 note 事件 post 進 pygame 事件佇列，
+# InputPump 收到即處理（pygame.event.post 為 thread-safe）
+MIDI_NOTE_EVENT = pygame.USEREVENT + 1
+
+class FakeMidiInput:
+    """本機假裝置，介面同 pygame.midi.Input（poll/read/close）；用來在沒有硬體時測試。"""
+    def __init__(self):
+        self._buf = deque()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def feed(self, status: int, data1: int, data2: int, timestamp: Optional[int] = None):
+        ts = pygame.midi.time() if timestamp is None else int(timestamp)
+        with self._lock:
+            self._buf.append([[status, data1, data2, 0], ts])
+
+    def poll(self) -> bool:
+        return bool(self._buf)
+
+    def read(self, n: int) -> list:
+        out = []
+        with self._lock:
+            while self._buf and len(out) < n:
+                out.append(self._buf.popleft())
+        return out
+
+    def close(self):
+        self.closed = True
+
+def open_midi_input(spec: Optional[str]):
+    """spec：None/'none' 不開；'auto' 用系統預設輸入；數字為裝置 id。"""
+    if spec is None or str(spec).lower() == "none":
+        return None
+    try:
+        pygame.midi.init()
+        dev = pygame.midi.get_default_input_id() if str(spec).lower() == "auto" else int(spec)
+        if dev is None or dev < 0:
+            logging.info("MIDI in: no input device")
+            return None
+        logging.info("MIDI in: using device %d %r", dev, pygame.midi.get_device_info(dev))
+        return pygame.midi.Input(dev)
+    except Exception:
+        logging.exception("MIDI in: open failed")
+        return None
+
+class MidiInputThread:
+    """
+    背景輪詢 MIDI 輸入裝置：一次 read 一批事件，轉成帶時間戳的 MIDI_NOTE_EVENT。
+    裝置時間戳換算成 pygame.time.get_ticks 基準（ms）放在 t_ms，InputPump 直接採用。
+    """
+    def __init__(self, device, batch: int = 64, idle_sleep: float = 0.001, clock=None):
+        self.device = device
+        self.batch = batch
+        self.idle_sleep = idle_sleep
+        self._clock = clock or pygame.midi.time   # 裝置時間戳的時鐘
+        self._offset = pygame.time.get_ticks() - self._clock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="midi-in", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        dev, post = self.device, pygame.event.post
+        while not self._stop.is_set():
+            try:
+                if not dev.poll():
+                    time.sleep(self.idle_sleep); continue
+                events = dev.read(self.batch)
+            except Exception:
+                logging.exception("MIDI in: read failed, stopping")
+                return
+            for data, ts in events:
+                status = data[0] & 0xF0
+                if status not in (0x80, 0x90):
+                    continue
+                on = status == 0x90 and data[2] > 0
+                post(pygame.event.Event(MIDI_NOTE_EVENT, pitch=data[1] & 0x7F, velocity=data[2] & 0x7F,
+                                        on=on, channel=data[0] & 0x0F, t_ms=int(ts) + self._offset))
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=0.5)
+        try: self.device.close()
+        except Exception: pass
@@ -0,0 +1,58 @@
+# input/recorder.py
+from array import array
+
+REC_TPB = 1000         # ticks per beat
+REC_TEMPO = 1_000_000  # µs per beat -> 1 tick = 1 ms，時間戳可直接當 tick
+
+class PerformanceRecorder:
+    """演奏錄製：事件存在記憶體陣列（ms 時間戳 / on-off / pitch / velocity），可存成標準 MIDI 檔。"""
+    def __init__(self):
+        self.t_ms = array('q')
+        self.kind = bytearray()   # 1 = note_on, 0 = note_off
+        self.pitch = bytearray()
+        self.vel = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.t_ms)
+
+    def clear(self):
+        del self.t_ms[:]; del self.kind[:]; del self.pitch[:]; del self.vel[:]
+
+    def note_on(self, t_ms: int, pitch: int, vel: int):
+        if not (0 <= pitch < 128): return
+        self.t_ms.append(int(t_ms)); self.kind.append(1)
+        self.pitch.append(pitch); self.vel.append(max(1, min(int(vel), 127)))
+
+    def note_off(self, t_ms: int, pitch: int):
+        if not (0 <= pitch < 128): return
+        self.t_ms.append(int(t_ms)); self.kind.append(0)
+        self.pitch.append(pitch); self.vel.append(0)
+
+    def save_midi(self, path: str, channel: int = 0):
+        """1 tick = 1 ms，delta 由絕對時間戳相減而得，不會累積誤差。"""
+        import mido
+        mid = mido.MidiFile(ticks_per_beat=REC_TPB)
+        tr = mido.MidiTrack(); mid.tracks.append(tr)
+        tr.append(mido.MetaMessage('set_tempo', tempo=REC_TEMPO, time=0))
+        n = len(self.t_ms)
+        order = sorted(range(n), key=lambda i: self.t_ms[i])  # 穩定排序：同時間保持到達順序
+        t0 = self.t_ms[order[0]] if n else 0
+        last = 0
+        held: dict[int, int] = {}
+        for i in order:
+            tick = self.t_ms[i] - t0
+            p = self.pitch[i]
+            if self.kind[i]:
+                held[p] = held.get(p, 0) + 1
+                tr.append(mido.Message('note_on', note=p, velocity=self.vel[i], channel=channel, time=tick - last))
+            else:
+                if not held.get(p): continue
+                held[p] -= 1
+                tr.append(mido.Message('note_off', note=p, velocity=0, channel=channel, time=tick - last))
+            last = tick
+        # 還按著的音在最後一個事件處收尾
+        for p, cnt in held.items():
+            for _ in range(cnt):
+                tr.append(mido.Message('note_off', note=p, velocity=0, channel=channel, time=0))
+        tr.append(mido.MetaMessage('end_of_track', time=0))
+        mid.save(path)
@@ -2,14 +2,25 @@
 import sys, os
 sys.path.append(os.path.dirname(__file__))  # 確保能找到 config.py
 
+if __name__ == '__main__' and getattr(sys, "frozen", False):
+    # pyinstaller EXE：ProcessPoolExecutor（spawn）的子行程會重新執行 EXE，
+    # freeze_support() 在這裡跑完 worker 就結束，不會往下開整個 App；要在其他 import 與 setup_crashlog 之前
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+from utils import startup
 from utils.crashlog import setup_crashlog, log_exception, log_dir
-setup_crashlog()
+if __name__ == '__main__':
+    # spawn 子行程以 __mp_main__ 重新 import 本檔：不重開同一秒的 native-*.txt（mode "w" 會清掉主行程的）
+    setup_crashlog()
 
 import argparse
-from config import AppConfig, RenderConfig, ReductionConfig, AudioConfig
-from app import App
+from config import AppConfig, RenderConfig, ReductionConfig, AudioConfig, InputConfig, StreamConfig
+from notes.reduction import REDUCTION_MODES
 import logging, traceback
 
+from batch import COMMANDS as BATCH_COMMANDS   # batch 頂層只多帶 utils.asynclog、notes.reduction（都只依賴標準函式庫），不碰 pygame / mido
+
 def _init_logging():
     logs = log_dir()
     os.makedirs(logs, exist_ok=True)
@@ -18,31 +29,82 @@ def _init_logging():
     if logging.getLogger().handlers:
         return
 
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        encoding="utf-8"
-    )
+    # 實際寫入在背景執行緒，render 迴圈只把 record 丟進佇列（見 utils/asynclog.py）
+    from utils.asynclog import setup_async_logging
+    fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    console = logging.StreamHandler()
+    console.setLevel(logging.DEBUG)
+    console.setFormatter(fmt)
+    handlers = [console]
     try:
         from logging.handlers import RotatingFileHandler
         fh = RotatingFileHandler(log_path, maxBytes=2*1024*1024, backupCount=3, encoding="utf-8")
         fh.setLevel(logging.DEBUG)
-        fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
-        logging.getLogger().addHandler(fh)
+        fh.setFormatter(fmt)
+        handlers.append(fh)
     except Exception:
         pass
+    setup_async_logging(handlers, level=logging.DEBUG)
 
 def main():
     _init_logging()
+    if len(sys.argv) > 1 and sys.argv[1] in BATCH_COMMANDS:
+        # 無視窗批次模式：python main.py analyze "songs/**/*.mid"
+        import batch
+        return batch.main(sys.argv[1:])
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # 效能基準：python main.py bench --quick
+        from bench.run import main as bench_main
+        return bench_main(sys.argv[2:])
     logging.info("應用程式啟動")
 
     ap = argparse.ArgumentParser()
     ap.add_argument('--pps', type=float, default=280)
-    ap.add_argument('--reduction_mode', default='basic', choices=['basic','melody_bass'])
+    ap.add_argument('--reduction_mode', default='basic', choices=REDUCTION_MODES)
     ap.add_argument('--reduction_vel', type=int, default=1)
     ap.add_argument('--reduction_poly', type=int, default=16)
     ap.add_argument('--slice_ms', type=int, default=40)
+    ap.add_argument('--target_nps', type=float, default=40.0, help='adaptive：每秒保留的音數目標')
+    ap.add_argument('--density_window_ms', type=int, default=2000, help='adaptive：量測局部密度的視窗')
+    ap.add_argument('--hand_span', type=int, default=12, help='two_hand：單手跨度（半音）')
+    ap.add_argument('--max_fingers', type=int, default=5, help='two_hand：單手同時最多幾個音')
+    ap.add_argument('--max_sounding', type=int, default=24, help='sweep_poly：同時發聲上限')
+    ap.add_argument('--midi', default=None, help='啟動時載入的 MIDI 檔')
+    ap.add_argument('--playlist', nargs='+', default=[], metavar='MIDI', help='播放清單（PageUp/PageDown 切歌）')
+    ap.add_argument('--midi_in', default='auto', help="MIDI 輸入裝置：auto / none / 裝置 id")
+    ap.add_argument('--midi_thru', action='store_true', help='MIDI 輸入直接送到音源')
+    ap.add_argument('--watch', action='store_true', help='監看目前的 MIDI 檔，存檔後自動重載（F6 切換）')
+    ap.add_argument('--stream_mb', type=int, default=512,
+                    help='MIDI 檔 >= 此大小（MB）時只解碼播放位置附近的音（0 = 停用）')
+    # 離線匯出（不開視窗）
+    ap.add_argument('--export', default=None, metavar='OUT',
+                    help='匯出掉落音符畫面：raw 為檔案路徑或 "-"（stdout），png 為資料夾')
+    ap.add_argument('--export_format', default='raw', choices=['raw', 'png'])
+    ap.add_argument('--fps', type=int, default=60)
+    ap.add_argument('--size', default=None, metavar='WxH', help='匯出解析度，例如 1920x1080')
+    ap.add_argument('--export_workers', type=int, default=0)
+    ap.add_argument('--calibrate_loopback', action='store_true',
+                    help='量測音源輸出接回 --midi_in 的延遲並存檔（--midi_in mock 為模擬迴路）')
+    ap.add_argument('--mem_trace', action='store_true',
+                    help='一開始就啟動 tracemalloc：載入記憶體改記各步驟的淨增量（否則為 RSS；較慢）')
+    ap.add_argument('--startup_report', action='store_true', help='第一個 frame 後把啟動計時印到 stdout')
+    ap.add_argument('--trace', default=None, metavar='OUT', help='記錄每個 frame 的 dt 與輸入事件（重現卡頓用）')
+    ap.add_argument('--replay', default=None, metavar='IN', help='不開視窗重播 --trace 的記錄並列出 frame 時間')
+    ap.add_argument('--realtime', action='store_true', help='--replay 照原本的速度（預設全速）')
+    ap.add_argument('--profile', action='store_true', help='cProfile 整段執行，結果寫到 logs/')
     args = ap.parse_args()
+    replay = None
+    if args.replay:
+        from utils.trace import TraceReplay
+        replay = TraceReplay(args.replay, realtime=args.realtime)
+        # 以記錄當時的命令列重建設定（--midi、reduction…）；程式預設值改過的話 check_config 會警告
+        profile = args.profile
+        args = ap.parse_args(replay.header.get("argv", []))
+        args.profile = profile
+    startup.mark("args parsed")
+    if args.mem_trace:
+        import tracemalloc
+        tracemalloc.start(8)
 
     cfg = AppConfig(
         render=RenderConfig(pixels_per_second=args.pps),
@@ -50,16 +112,105 @@ def main():
             min_velocity=args.reduction_vel,
             max_poly_per_slice=args.reduction_poly,
             slice_ms=args.slice_ms,
-            mode=args.reduction_mode
+            mode=args.reduction_mode,
+            target_nps=args.target_nps,
+            density_window_ms=args.density_window_ms,
+            hand_span=args.hand_span,
+            max_fingers=args.max_fingers,
+            max_sounding=args.max_sounding,
         ),
         audio=AudioConfig(sf2_path=None),
+        input=InputConfig(midi_in=args.midi_in, midi_thru=args.midi_thru),
+        stream=StreamConfig(threshold_mb=args.stream_mb),
+        watch_file=args.watch,
     )
 
-    App(cfg, notes=[]).run()
+    if replay is not None:
+        replay.check_config(cfg)
+        cfg.input.midi_in = "none"
+        args.export = None; args.calibrate_loopback = False
+
+    if args.calibrate_loopback:
+        return _calibrate_loopback(cfg)
+
+    if args.export:
+        if not args.midi:
+            ap.error('--export 需要搭配 --midi')
+        return _export(cfg, args)
+
+    from app import App  # pygame / 音源等較重的模組，匯出等模式不需要
+    startup.mark("app imported")
+    if args.startup_report:
+        startup.echo = True
+    app = App(cfg, notes=[], headless=replay is not None)
+    if args.trace:
+        from utils.trace import TraceWriter, strip_args
+        app.trace = TraceWriter(args.trace, strip_args(sys.argv[1:], "--trace", "--profile"), cfg)
+        app.input.tap = app.trace.event
+    if replay is not None:
+        app.replay = replay
+        replay.start()
+    for path in ([args.midi] if args.midi else []) + args.playlist:
+        app.playlist.add(path)
+    if len(app.playlist):
+        app.switch_to(0)
+    prof = None
+    if args.profile:
+        import cProfile
+        prof = cProfile.Profile(); prof.enable()
+    try:
+        app.run()
+    finally:
+        if prof is not None:
+            prof.disable(); _write_profile(prof)
+        if app.trace is not None:
+            app.trace.close()
+        if replay is not None:
+            replay.close(); print(replay.report())
+
+def _write_profile(prof):
+    import datetime, io, pstats
+    path = os.path.join(log_dir(), f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.prof")
+    prof.dump_stats(path)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(25)
+    print(out.getvalue()); print(f"profile -> {path}（snakeviz / pstats 可開）")
+
+def _calibrate_loopback(cfg: AppConfig) -> int:
+    from audio.latency import LatencyStore, MockLoopbackOutput, measure_loopback
+    from input.midi_in import FakeMidiInput, open_midi_input
+    if cfg.input.midi_in == "mock":
+        dev = FakeMidiInput(); out = MockLoopbackOutput(dev, latency_ms=25.0)
+        ms = measure_loopback(out, dev)
+    else:
+        from audio.synth import Synth
+        out = Synth(cfg.audio); dev = open_midi_input(cfg.input.midi_in)
+        if dev is None or not out.use_midi_out:
+            print("loopback 需要 MIDI 輸出與輸入裝置"); return 1
+        ms = measure_loopback(out, dev)
+        out.close()
+    if ms is None:
+        print(f"{out.device_name}: 收不到回音（輸出有接回輸入嗎？）"); return 1
+    ms = LatencyStore(cfg.audio.latency_file).set(out.device_name, ms)
+    print(f"{out.device_name}: {ms:+.1f} ms")
+    return 0
+
+def _export(cfg: AppConfig, args):
+    from notes.song import load_song
+    from render.export import ExportJob, export_song
+    if args.size:
+        w, h = (int(v) for v in args.size.lower().split('x'))
+        cfg.render.window_w, cfg.render.window_h = w, h
+    song = load_song(args.midi, cfg.reduce)
+    job = ExportJob(out_path=args.export, fmt=args.export_format, fps=args.fps, workers=args.export_workers)
+    n = export_song(song, cfg.render, job)
+    logging.info("匯出完成：%d frames -> %s", n, args.export)
 
 if __name__ == '__main__':
     try:
-        main()
+        sys.exit(main())
+    except SystemExit:
+        raise
     except Exception as e:
         try:
             log_exception("Top-level exception", e)
@@ -1,32 +1,69 @@
 # midi/parser.py
-import mido
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
 from notes.model import Note
+from midi.tempo import TempoMap
 
-def parse_midi_to_notes(path: str) -> Tuple[List[Note], float]:
+@dataclass
+class ParsedMidi:
+    notes: List[Note]
+    total: float
+    tempo_map: TempoMap
+    track_names: Dict[int, str] = field(default_factory=dict)   # track -> track_name meta
+
+def _tempo_changes(tracks) -> List[Tuple[int, int]]:
+    out = []
+    for tr in tracks:
+        tick = 0
+        for msg in tr:
+            tick += msg.time
+            if msg.type == 'set_tempo':
+                out.append((tick, msg.tempo))
+    return out
+
+def parse_midi(path: str) -> ParsedMidi:
+    import mido  # 延遲載入：啟動時用不到
     mid = mido.MidiFile(path)
-    tpb = mid.ticks_per_beat
-    tempo = 500000  # default 120 bpm
-    time_sec = 0.0
-    active = {}
+    tmap = TempoMap(mid.ticks_per_beat, _tempo_changes(mid.tracks))
+    seg_ticks = tmap.ticks
+    n_seg = len(seg_ticks)
     notes: List[Note] = []
+    names: Dict[int, str] = {}
+    dangling = []
+    end_sec = 0.0
 
-    for msg in mido.merge_tracks(mid.tracks):
-        time_sec += mido.tick2second(msg.time, tpb, tempo)
-        if msg.is_meta:
-            if msg.type == 'set_tempo':
-                tempo = msg.tempo
-        else:
+    # 逐 track 解析（保留 track 序號）；音符以 (channel, note) 在同一 track 內配對
+    for ti, tr in enumerate(mid.tracks):
+        seg, tick = 0, 0
+        time_sec = 0.0
+        active = {}
+        for msg in tr:
+            tick += msg.time
+            # tick 單調遞增，tempo 段落指標只會往前
+            while seg + 1 < n_seg and seg_ticks[seg + 1] <= tick:
+                seg += 1
+            time_sec = tmap.tick_to_sec(tick, seg)
+            if msg.is_meta:
+                if msg.type == 'track_name' and msg.name:
+                    names[ti] = msg.name
+                continue
             if msg.type == 'note_on' and msg.velocity > 0:
                 active[(msg.channel, msg.note)] = (time_sec, msg.velocity)
             elif msg.type in ('note_off',) or (msg.type == 'note_on' and msg.velocity == 0):
                 key = (msg.channel, msg.note)
                 if key in active:
                     st, vel = active.pop(key)
-                    notes.append(Note(pitch=msg.note, start=st, end=time_sec, velocity=vel, channel=msg.channel))
-    # close dangling
-    for (ch, p), (st, vel) in active.items():
-        notes.append(Note(pitch=p, start=st, end=time_sec, velocity=vel, channel=ch))
+                    notes.append(Note(pitch=msg.note, start=st, end=time_sec, velocity=vel,
+                                      channel=msg.channel, track=ti))
+        dangling.extend((ti, k, v) for k, v in active.items())
+        end_sec = max(end_sec, time_sec)
+    # close dangling（收在整首最後一個事件）
+    for ti, (ch, p), (st, vel) in dangling:
+        notes.append(Note(pitch=p, start=st, end=end_sec, velocity=vel, channel=ch, track=ti))
     total = max((n.end for n in notes), default=0.0)
     notes.sort(key=lambda n: (n.start, n.pitch))
-    return notes, total
\ No newline at end of file
+    return ParsedMidi(notes, total, tmap, names)
+
+def parse_midi_to_notes(path: str) -> Tuple[List[Note], float]:
+    p = parse_midi(path)
+    return p.notes, p.total
@@ -0,0 +1,240 @@
+# midi/smf.py
+"""
+超大 MIDI（black MIDI）用的 out-of-core 讀取，不經過 mido：
+- mmap 整個檔案，事件不讀進記憶體
+- SmfIndex：每個 track 串流掃一次，記下 chunk 位置、tempo / track_name、
+  每 CHECKPOINT_EVENTS 個事件一個檢查點 (tick, 位元組位置, running status)
+- decode()：從檢查點開始，只解出 onset 落在指定時間範圍內的音
+- 每個 track chunk 有 blake2b 摘要；SmfIndex(path, prev=舊索引) 只重掃內容變了的 track（檔案監看用）
+
+事件解碼規則與 mido 相同（meta 不改 running status），音符配對規則與 midi.parser 相同
+（同一 track 內以 channel + pitch 配對，重複 note_on 以最後一個為準）。
+"""
+import hashlib, mmap, struct
+from array import array
+from bisect import bisect_left
+from typing import Callable, Collection, Dict, List, Optional
+from notes.model import Note
+from midi.tempo import TempoMap
+
+CHECKPOINT_EVENTS = 4096
+
+# status -> channel / system common 訊息的資料長度
+_DLEN = bytearray(256)
+for _s in range(0x80, 0xF0):
+    _DLEN[_s] = 1 if (_s & 0xF0) in (0xC0, 0xD0) else 2
+_DLEN[0xF1] = _DLEN[0xF3] = 1
+_DLEN[0xF2] = 2
+
+class TrackIndex:
+    __slots__ = ("num", "start", "end", "digest", "reused", "end_tick", "n_notes", "channels", "tempos",
+                 "ck_tick", "ck_pos", "ck_status")
+
+    def __init__(self, num: int, start: int, end: int, digest: bytes = b""):
+        self.num, self.start, self.end, self.digest = num, start, end, digest
+        self.reused = False      # 與 prev 索引的同號 track 內容相同，直接沿用
+        self.end_tick = 0
+        self.n_notes = 0
+        self.channels = 0        # 有 note_on 的 channel（bit mask）
+        self.tempos: list = []   # 此 track 內的 (tick, tempo)
+        self.ck_tick = array('q')
+        self.ck_pos = array('q')  # 相對 chunk 起點：內容不變、位置平移時仍可沿用
+        self.ck_status = bytearray()
+
+    def adopt(self, old: "TrackIndex"):
+        self.end_tick, self.n_notes, self.channels, self.tempos = old.end_tick, old.n_notes, old.channels, old.tempos
+        self.ck_tick, self.ck_pos, self.ck_status = old.ck_tick, old.ck_pos, old.ck_status
+        self.reused = True
+
+def _vlq(mm, pos: int):
+    b = mm[pos]; pos += 1
+    v = b & 0x7F
+    while b & 0x80:
+        b = mm[pos]; pos += 1
+        v = (v << 7) | (b & 0x7F)
+    return v, pos
+
+class SmfIndex:
+    """開檔即建索引；之後 decode() 可以在任何執行緒呼叫（只讀 mmap）。"""
+    def __init__(self, path: str, checkpoint_every: int = CHECKPOINT_EVENTS, prev: Optional["SmfIndex"] = None):
+        self.path = path
+        self.mm = None
+        self._f = open(path, 'rb')
+        try:
+            # 0 bytes 的檔案 mmap 會丟 ValueError；header / track 有錯時也一樣要關掉，不留住檔案
+            self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._build(checkpoint_every, prev)
+        except BaseException:
+            self.close()
+            raise
+
+    def _build(self, checkpoint_every: int, prev: Optional["SmfIndex"]):
+        mm, path = self.mm, self.path
+        if mm[:4] != b'MThd':
+            raise ValueError(f"not a Standard MIDI File: {path}")
+        hlen, self.format, ntrks, division = struct.unpack('>IHHH', mm[4:14])
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        self.tracks: List[TrackIndex] = []
+        self.truncated = False   # 宣告的 track 數 / chunk 長度不足（檔案還沒寫完或損毀）；仍盡量讀
+        self.track_names: Dict[int, str] = {}
+        self.tpb = division
+        old = prev.tracks if prev is not None and prev.tpb == division else []
+        tempos = []
+        pos, size = 8 + hlen, len(mm)
+        mv = memoryview(mm)   # 摘要直接讀 mmap，不複製 chunk；出錯時也要先放掉，mmap 才關得掉
+        try:
+            while len(self.tracks) < ntrks and pos + 8 <= size:
+                cid, clen = mm[pos:pos + 4], struct.unpack('>I', mm[pos + 4:pos + 8])[0]
+                start, pos = pos + 8, pos + 8 + clen
+                if pos > size: self.truncated, pos = True, size
+                if cid == b'MTrk':
+                    n = len(self.tracks)
+                    tr = TrackIndex(n, start, pos, hashlib.blake2b(mv[start:pos], digest_size=16).digest())
+                    if n < len(old) and old[n].digest == tr.digest:
+                        tr.adopt(old[n])
+                        if n in prev.track_names: self.track_names[n] = prev.track_names[n]
+                    else:
+                        self._index_track(tr, checkpoint_every)
+                    tempos.extend(tr.tempos)
+                    self.tracks.append(tr)
+        finally:
+            mv.release()
+        self.truncated = self.truncated or len(self.tracks) < ntrks
+        self.tempo_map = TempoMap(division, tempos)
+        self.total = self.tempo_map.tick_to_sec(max((t.end_tick for t in self.tracks), default=0))
+        self.n_notes = sum(t.n_notes for t in self.tracks)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self._f.close()
+
+    def _index_track(self, tr: TrackIndex, every: int):
+        mm, pos, end, base = self.mm, tr.start, tr.end, tr.start
+        ck_t, ck_p, ck_s = tr.ck_tick.append, tr.ck_pos.append, tr.ck_status.append
+        tick = status = n = notes = chans = 0
+        dlen = _DLEN
+        while pos < end:
+            if n == 0:
+                n = every
+                ck_t(tick); ck_p(pos - base); ck_s(status)
+            n -= 1
+            b = mm[pos]; pos += 1
+            d = b & 0x7F
+            while b & 0x80:
+                b = mm[pos]; pos += 1
+                d = (d << 7) | (b & 0x7F)
+            tick += d
+            st = mm[pos]
+            if st & 0x80:
+                pos += 1
+                if st != 0xFF: status = st
+            else:
+                st = status
+                if not st: raise ValueError(f"running status without a previous status (track {tr.num})")
+            if st == 0xFF:
+                typ = mm[pos]
+                ln, pos = _vlq(mm, pos + 1)
+                if typ == 0x51 and ln == 3:
+                    tr.tempos.append((tick, int.from_bytes(mm[pos:pos + 3], 'big')))
+                elif typ == 0x03 and ln and tr.num not in self.track_names:
+                    self.track_names[tr.num] = mm[pos:pos + ln].decode('latin-1')
+                elif typ == 0x2F:
+                    break
+                pos += ln
+            elif st == 0xF0 or st == 0xF7:
+                ln, pos = _vlq(mm, pos)
+                pos += ln
+            else:
+                if (st & 0xF0) == 0x90 and mm[pos + 1]:
+                    notes += 1
+                    chans |= 1 << (st & 0x0F)
+                pos += dlen[st]
+        tr.end_tick, tr.n_notes, tr.channels = tick, notes, chans
+
+    def decode(self, a: float, b: float, keep: Optional[Callable[[float], bool]] = None,
+               tail_s: float = 30.0, tracks: Optional[Collection[int]] = None) -> List[Note]:
+        """
+        onset 在 [a, b) 秒內（有給 keep 時改以 keep(start) 判定）的音，依 (start, pitch) 排序。
+        note_off 最多往後找 tail_s 秒，找不到就截在那裡；track 先結束則收在整首結尾（同 parser）。
+        tracks 有給時只解這些 track。
+        """
+        tm = self.tempo_map
+        ta = max(0, tm.sec_to_tick(a) - 1)
+        tb = tm.sec_to_tick(b) + 1
+        t_tail = tm.sec_to_tick(b + tail_s)
+        keep = keep or (lambda s: a <= s < b)
+        out: List[Note] = []
+        for tr in self.tracks:
+            if not tr.ck_tick or (tracks is not None and tr.num not in tracks): continue
+            i = max(0, bisect_left(tr.ck_tick, ta) - 1)   # 最後一個 tick < ta 的檢查點
+            self._decode_track(tr, i, ta, tb, t_tail, keep, out)
+        out.sort(key=lambda n: (n.start, n.pitch))
+        return out
+
+    def _decode_track(self, tr: TrackIndex, ck: int, ta: int, tb: int, t_tail: int, keep, out: List[Note]):
+        mm, end, dlen = self.mm, tr.end, _DLEN
+        tm = self.tempo_map
+        seg_ticks, n_seg = tm.ticks, len(tm.ticks)
+        pos, tick, status = tr.start + tr.ck_pos[ck], tr.ck_tick[ck], tr.ck_status[ck]
+        seg = tm.segment_at_tick(tick)
+        active: Dict[int, tuple] = {}   # (channel << 7 | pitch) -> (start, vel, 在範圍內)
+        pending = 0                     # 範圍內還沒收到 note_off 的音
+        ti = tr.num
+        ended = True
+        while pos < end:
+            b = mm[pos]; pos += 1
+            d = b & 0x7F
+            while b & 0x80:
+                b = mm[pos]; pos += 1
+                d = (d << 7) | (b & 0x7F)
+            tick += d
+            if tick > tb and (not pending or tick > t_tail):
+                ended, tick = False, min(tick, t_tail)   # 範圍內的音都收完了，或超過 tail 要截斷
+                break
+            st = mm[pos]
+            if st & 0x80:
+                pos += 1
+                if st != 0xFF: status = st
+            else:
+                st = status
+            if st == 0xFF:
+                typ = mm[pos]
+                ln, pos = _vlq(mm, pos + 1)
+                if typ == 0x2F: break
+                pos += ln
+                continue
+            if st == 0xF0 or st == 0xF7:
+                ln, pos = _vlq(mm, pos)
+                pos += ln
+                continue
+            hi = st & 0xF0
+            if hi == 0x90 or hi == 0x80:
+                key = ((st & 0x0F) << 7) | mm[pos]
+                vel = mm[pos + 1]
+                if hi == 0x90 and vel:
+                    inr = False
+                    sec = 0.0
+                    if ta <= tick <= tb:
+                        while seg + 1 < n_seg and seg_ticks[seg + 1] <= tick: seg += 1
+                        sec = tm.tick_to_sec(tick, seg)
+                        inr = keep(sec)
+                    prev = active.get(key)
+                    if prev is not None and prev[2]: pending -= 1   # 被新的 note_on 蓋掉（同 parser）
+                    active[key] = (sec, vel, inr)
+                    if inr: pending += 1
+                else:
+                    prev = active.pop(key, None)
+                    if prev is not None and prev[2]:
+                        while seg + 1 < n_seg and seg_ticks[seg + 1] <= tick: seg += 1
+                        out.append(Note(pitch=key & 0x7F, start=prev[0], end=tm.tick_to_sec(tick, seg),
+                                        velocity=prev[1], channel=key >> 7, track=ti))
+                        pending -= 1
+            pos += dlen[st]
+        if pending:
+            close = self.total if ended else tm.tick_to_sec(tick)
+            for key, (sec, vel, inr) in active.items():
+                if inr:
+                    out.append(Note(pitch=key & 0x7F, start=sec, end=close, velocity=vel,
+                                    channel=key >> 7, track=ti))
@@ -0,0 +1,56 @@
+# midi/tempo.py
+from bisect import bisect_right
+from typing import Iterable, List, Tuple
+
+DEFAULT_TEMPO = 500000  # µs / beat（120 bpm）
+
+class TempoMap:
+    """
+    tick <-> 秒 的分段線性對照（每個 set_tempo 一段）。
+    秒數只由「絕對 tick + tempo map」決定，與中間有哪些事件無關，
+    所以寫回 .mid 再 parse 可以得到完全相同的浮點數。
+    """
+    def __init__(self, tpb: int, changes: Iterable[Tuple[int, int]] = ()):
+        self.tpb = int(tpb)
+        seg: dict[int, int] = {0: DEFAULT_TEMPO}
+        for tick, tempo in sorted(changes, key=lambda c: c[0]):  # 穩定排序：同 tick 以最後一個為準
+            seg[int(tick)] = int(tempo)
+        self.ticks: List[int] = sorted(seg)
+        self.tempos: List[int] = [seg[t] for t in self.ticks]
+        self._k = [tp / (self.tpb * 1e6) for tp in self.tempos]   # 每 tick 秒數
+        self.secs: List[float] = [0.0]
+        for i in range(1, len(self.ticks)):
+            self.secs.append(self.secs[i - 1] + (self.ticks[i] - self.ticks[i - 1]) * self._k[i - 1])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TempoMap) and self.tpb == other.tpb \
+            and self.ticks == other.ticks and self.tempos == other.tempos
+
+    @property
+    def changes(self) -> List[Tuple[int, int]]:
+        return list(zip(self.ticks, self.tempos))
+
+    def segment_at_tick(self, tick: int) -> int:
+        return bisect_right(self.ticks, tick) - 1
+
+    def tick_to_sec(self, tick: int, seg: int = -1) -> float:
+        i = seg if seg >= 0 else bisect_right(self.ticks, tick) - 1
+        return self.secs[i] + (tick - self.ticks[i]) * self._k[i]
+
+    def sec_to_tick(self, sec: float) -> int:
+        i = max(0, bisect_right(self.secs, sec) - 1)
+        return self.ticks[i] + int(round((sec - self.secs[i]) / self._k[i]))
+
+    def secs_to_ticks(self, secs: Iterable[float]) -> List[int]:
+        """大量轉換（寫檔用）：區域變數綁定，單一 tempo 時免 bisect。"""
+        if len(self.ticks) == 1:
+            k = self._k[0]
+            return [int(round(s / k)) for s in secs]
+        bs, ss, ts, ks = bisect_right, self.secs, self.ticks, self._k
+        out = []
+        ap = out.append
+        for s in secs:
+            i = bs(ss, s) - 1
+            if i < 0: i = 0
+            ap(ts[i] + int(round((s - ss[i]) / ks[i])))
+        return out
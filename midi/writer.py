@@ -0,0 +1,99 @@
+# midi/writer.py
+"""
+把（reduction 後的）音符表寫回標準 MIDI 檔：只有 track 0 時寫 format 0，否則 format 1，
+每個 Note.track 一個 MTrk（中間沒音的 track 也寫空的，序號才對得上），tempo map 放在 track 0，
+track_names 寫成各 track 開頭的 track_name meta。
+不經過 mido 訊息物件：事件以整數排序鍵排序，delta time 直接編成 VLQ 寫進 bytearray，最後一次寫出。
+搭配原曲的 TempoMap 時，parse_midi 讀回的 start/end/track 與 track_names 與輸入完全相同
+（前提：同一 track 內同一 channel+pitch 的音不重疊，與 parser 的配對規則一致；零長度的音不算重疊）。
+"""
+import struct
+from typing import Dict, List, Optional
+from notes.model import Note
+from midi.tempo import TempoMap
+
+# 同一 tick 內的事件順序：tempo -> note_off -> 零長度的音（on、off 緊接著）-> note_on
+# 零長度的音成對寫在其他 note_on 之前：同 onset、同 pitch 的另一個音不會被它的 note_off 提早關掉
+_ORD_TEMPO, _ORD_OFF, _ORD_ZERO, _ORD_ON = 0, 1, 2, 3
+
+def _vlq(v: int, buf: bytearray):
+    if v < 0x80:
+        buf.append(v); return
+    stack = [v & 0x7F]
+    v >>= 7
+    while v:
+        stack.append((v & 0x7F) | 0x80)
+        v >>= 7
+    buf.extend(reversed(stack))
+
+def encode_notes_midi(notes: List[Note], tempo_map: Optional[TempoMap] = None, tpb: int = 480,
+                      track_names: Optional[Dict[int, str]] = None) -> bytes:
+    tmap = tempo_map or TempoMap(tpb)
+    names = track_names or {}
+    n = len(notes)
+    n_trk = max(max((x.track for x in notes), default=0), max(names, default=0)) + 1
+    on_t = tmap.secs_to_ticks([x.start for x in notes])
+    off_t = tmap.secs_to_ticks([x.end for x in notes])
+
+    # 排序鍵：(tick, 順序, 序號) 打包成一個 int，sort 一個整數 list 比 tuple 快很多
+    n2 = 2 * n
+    sb = (n2 + len(tmap.ticks)).bit_length() + 1
+    keys = []
+    ap = keys.append
+    msgs = []          # 序號 -> 3 bytes 的 channel message
+    mp = msgs.append
+    for i, (t, _) in enumerate(tmap.changes):
+        ap((((t << 2) | _ORD_TEMPO) << sb) | (n2 + i))
+    for i in range(n):
+        a, b = on_t[i], off_t[i]
+        if b < a: b = a
+        if b == a:   # 序號 2i / 2i+1 相鄰：on 之後緊接自己的 off
+            ap((((a << 2) | _ORD_ZERO) << sb) | (2 * i))
+            ap((((a << 2) | _ORD_ZERO) << sb) | (2 * i + 1))
+        else:
+            ap((((a << 2) | _ORD_ON) << sb) | (2 * i))
+            ap((((b << 2) | _ORD_OFF) << sb) | (2 * i + 1))
+        x = notes[i]
+        ch, p = x.channel & 0x0F, x.pitch & 0x7F
+        v = x.velocity
+        mp(bytes((0x90 | ch, p, 1 if v < 1 else (127 if v > 127 else v))))
+        mp(bytes((0x80 | ch, p, 0)))
+    keys.sort()
+
+    trks = []
+    for t in range(n_trk):
+        trk = bytearray()
+        name = names.get(t)
+        if name:   # mido 以 latin-1 解 text meta
+            raw = name.encode('latin-1', 'replace')
+            trk += b'\x00\xFF\x03'; _vlq(len(raw), trk); trk += raw
+        trks.append(trk)
+    last = [0] * n_trk
+    mask = (1 << sb) - 1
+    sh = sb + 2
+    tempos = tmap.tempos
+    for k in keys:
+        tick = k >> sh
+        seq = k & mask
+        t = 0 if seq >= n2 else notes[seq >> 1].track
+        trk = trks[t]
+        d = tick - last[t]
+        if d < 0x80: trk.append(d)
+        else: _vlq(d, trk)
+        last[t] = tick
+        if seq >= n2:
+            trk += b'\xFF\x51\x03'
+            trk += tempos[seq - n2].to_bytes(3, 'big')
+        else:
+            trk += msgs[seq]
+    parts = [b'MThd', struct.pack('>IHHH', 6, 0 if n_trk == 1 else 1, n_trk, tmap.tpb)]
+    for trk in trks:
+        trk += b'\x00\xFF\x2F\x00'  # end of track
+        parts += (b'MTrk', struct.pack('>I', len(trk)), bytes(trk))
+    return b''.join(parts)
+
+def write_notes_midi(path: str, notes: List[Note], tempo_map: Optional[TempoMap] = None, tpb: int = 480,
+                     track_names: Optional[Dict[int, str]] = None):
+    data = encode_notes_midi(notes, tempo_map, tpb, track_names)
+    with open(path, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,64 @@
+# notes/density.py
+"""
+整首歌的音符密度（時間 × 音高）多解析度金字塔，給 render/minimap.py 用：
+- 第 0 層：BASE_BINS 個時間格 × ROWS 個音高帶（每帶 PITCH_BAND 個半音），以 onset 計數
+- 往上每層把相鄰兩個時間格相加，直到只剩 1 格；任何寬度都能找到「格數剛好 >= 像素數」的一層
+只用標準函式庫（array）；載入時建一次，O(音符數 + 格數)。
+"""
+import math
+from array import array
+from typing import List, Sequence
+from notes.model import Note
+
+BASE_BINS = 4096
+ROWS = 32
+PITCH_BAND = 128 // ROWS
+
+class DensityPyramid:
+    def __init__(self, notes: Sequence[Note], total: float, base_bins: int = BASE_BINS):
+        self.total = max(total, 1e-6)
+        n0 = 1 << max(0, math.ceil(math.log2(max(1, base_bins))))
+        level = array('I', bytes(4 * n0 * ROWS))
+        k = n0 / self.total
+        last = n0 - 1
+        lo, hi = ROWS, -1
+        for n in notes:
+            b, r = int(n.start * k), n.pitch >> 2
+            level[(b if b < last else last) * ROWS + r] += 1
+            if r < lo: lo = r
+            if r > hi: hi = r
+        self.row_lo, self.row_hi = (lo, hi) if hi >= 0 else (0, ROWS - 1)   # 有音的音高帶範圍
+        self.levels: List[array] = [level]
+        while n0 > 1:
+            prev, n0 = level, n0 // 2
+            level = array('I', bytes(4 * n0 * ROWS))
+            for i in range(n0):
+                a, b, o = 2 * i * ROWS, (2 * i + 1) * ROWS, i * ROWS
+                for r in range(ROWS):
+                    level[o + r] = prev[a + r] + prev[b + r]
+            self.levels.append(level)
+
+    def bins(self, level: int) -> int:
+        return len(self.levels[level]) // ROWS
+
+    def level_for(self, width: int) -> int:
+        """格數 >= width 的最粗一層（每個像素欄對到 1~2 格）。"""
+        lv = 0
+        while lv + 1 < len(self.levels) and self.bins(lv + 1) >= width:
+            lv += 1
+        return lv
+
+    def columns(self, width: int) -> List[array]:
+        """width 個像素欄，每欄 ROWS 個計數（row 0 = 最低音帶）。"""
+        lv = self.level_for(width)
+        src, nb = self.levels[lv], self.bins(lv)
+        out = []
+        for x in range(width):
+            a, b = x * nb // width, max(x * nb // width + 1, (x + 1) * nb // width)
+            col = array('I', src[a * ROWS:(a + 1) * ROWS])
+            for j in range(a + 1, b):
+                o = j * ROWS
+                for r in range(ROWS):
+                    col[r] += src[o + r]
+            out.append(col)
+        return out
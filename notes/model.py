@@ -8,6 +8,7 @@ class Note:
     end: float      # seconds
     velocity: int
     channel: int
+    track: int = 0  # SMF track 序號（format 0 / 自行建立的音符一律 0）
 
     @property
     def dur(self) -> float:
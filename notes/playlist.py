@@ -0,0 +1,110 @@
+# notes/playlist.py
+import logging, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from config import ReductionConfig, StreamConfig
+from notes.song import Song, load_song
+
+class Playlist:
+    """
+    播放清單：背景 worker 先把下一首 parse + reduce 好。
+    - 最多保留 max_prepared 首準備好的歌（LRU 淘汰），控制記憶體
+    - take() 不阻塞：已準備好就直接回傳 Song，切歌只是換參照
+    - 載入失敗的路徑記下來：prefetch 與自動切歌（next_playable）都跳過，只有明確 take() 才重試
+    """
+    def __init__(self, paths: List[str], reduce_cfg: ReductionConfig, max_prepared: int = 2,
+                 stream_cfg: Optional[StreamConfig] = None):
+        self.paths: List[str] = list(paths)
+        self.reduce_cfg = reduce_cfg
+        self.stream_cfg = stream_cfg
+        self.max_prepared = max(1, max_prepared)
+        self.index = -1
+        self._ready: "OrderedDict[str, Song]" = OrderedDict()
+        self._jobs: Dict[str, Future] = {}
+        self._failed: set = set()
+        self._lock = threading.Lock()
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def add(self, path: str) -> int:
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def wrap(self, idx: int) -> int:
+        return idx % len(self.paths) if self.paths else -1
+
+    def _store(self, path: str, fut: Future):
+        evicted = []
+        with self._lock:
+            self._jobs.pop(path, None)
+            if fut.cancelled(): return
+            exc = fut.exception()
+            if exc is not None:
+                logging.error("prefetch failed: %s", path, exc_info=exc)
+                self._failed.add(path)
+                return
+            self._ready[path] = fut.result()
+            self._ready.move_to_end(path)
+            # 淘汰最久沒用的，但不動正在播的那首
+            cur = self.paths[self.index] if 0 <= self.index < len(self.paths) else None
+            while len(self._ready) > self.max_prepared:
+                old = next((p for p in self._ready if p != cur), None)
+                if old is None: break
+                evicted.append(self._ready.pop(old))
+        for song in evicted:
+            song.close()   # 串流歌曲：關掉 executor 與 mmap
+
+    def prefetch(self, idx: int, retry: bool = False):
+        if not self.paths: return
+        path = self.paths[self.wrap(idx)]
+        with self._lock:
+            if path in self._ready or path in self._jobs or (path in self._failed and not retry):
+                return
+            self._failed.discard(path)
+            fut = self._ex.submit(load_song, path, self.reduce_cfg, self.stream_cfg)
+            self._jobs[path] = fut
+        fut.add_done_callback(lambda f, p=path: self._store(p, f))
+
+    def take(self, idx: int) -> Optional[Song]:
+        """已準備好則回傳（並設為目前曲目），否則安排 prefetch 並回傳 None。"""
+        if not self.paths: return None
+        idx = self.wrap(idx)
+        path = self.paths[idx]
+        with self._lock:
+            song = self._ready.get(path)
+            if song is not None:
+                self._ready.move_to_end(path)
+        if song is None:
+            self.prefetch(idx, retry=True)
+            return None
+        self.index = idx
+        return song
+
+    def replace(self, path: str, song: Song) -> Optional[Song]:
+        """監看重載後換上新版本（之後切回這首拿到的才不是舊的）；回傳被換掉的 Song，沒準備過則不動、回傳 None。"""
+        with self._lock:
+            old = self._ready.get(path)
+            if old is not None:
+                self._ready[path] = song
+        return old
+
+    def failed(self, idx: int) -> bool:
+        """最近一次載入失敗（之後沒有再重試）。"""
+        path = self.paths[self.wrap(idx)]
+        with self._lock:
+            return path in self._failed
+
+    def next_playable(self, idx: int) -> Optional[int]:
+        """idx 之後第一首沒載入失敗過的（不繞回開頭）；沒有則 None。"""
+        with self._lock:
+            return next((i for i in range(idx + 1, len(self.paths)) if self.paths[i] not in self._failed), None)
+
+    def close(self):
+        self._ex.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            songs, self._ready = list(self._ready.values()), OrderedDict()
+        for song in songs:
+            song.close()
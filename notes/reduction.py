@@ -1,14 +1,21 @@
 # notes/reduction.py
+import heapq
+from dataclasses import replace
+from itertools import accumulate
 from typing import List
 from notes.model import Note
 from config import ReductionConfig
 
 class ReductionStrategy:
+    # 結果只取決於同一個 slice_ms 時間片內的音：局部變動時可以只重算受影響的時間片（notes/watch.py）
+    slice_local = False
+
     def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
         raise NotImplementedError
 
 class BasicReduction(ReductionStrategy):
     """Drop low-velocity notes and cap polyphony per time slice."""
+    slice_local = True
     def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
         filt = [n for n in notes if n.velocity >= cfg.min_velocity]
         # bucket by onset
@@ -25,6 +32,7 @@ class BasicReduction(ReductionStrategy):
 
 class MelodyBassReduction(ReductionStrategy):
     """Keep line-of-maximum (melody high), plus lowest (bass), then fill rest by velocity."""
+    slice_local = True
     def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
         filt = [n for n in notes if n.velocity >= cfg.min_velocity]
         buckets = {}
@@ -46,5 +54,169 @@ class MelodyBassReduction(ReductionStrategy):
         out.sort(key=lambda n: (n.start, n.pitch))
         return out
 
+class AdaptiveReduction(ReductionStrategy):
+    """
+    每個時間片的上限依「附近的密度」決定，而不是整首同一個 max_poly_per_slice：
+    - 各時間片的 onset 數做前綴和，density_window_ms 視窗內的密度 = 兩個前綴和相減（O(1) / 片）
+    - 密度低於 target_nps 的段落全留；高於時每片只留 count * target_nps / 局部密度 個（小數部分累積到後面的片）
+    - 片內取捨同 BasicReduction（力度、長度、音高）
+    上限看得到鄰近時間片，所以不是 slice_local（串流載入時改用 basic，見 notes/streaming.py）。
+    """
+    def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
+        filt = [n for n in notes if n.velocity >= cfg.min_velocity]
+        if not filt: return []
+        sm = cfg.slice_ms
+        buckets = {}
+        for n in filt:
+            buckets.setdefault(int((n.start * 1000) // sm), []).append(n)
+        n_slices = max(buckets) + 1
+        counts = [0] * n_slices
+        for b, arr in buckets.items():
+            counts[b] = len(arr)
+        prefix = [0, *accumulate(counts)]
+        half = max(0, int(cfg.density_window_ms // sm) // 2)
+        target = max(1e-6, cfg.target_nps)
+        out: List[Note] = []
+        carry = 0.0   # 配額的小數部分往後帶（每片只該留 0.4 個時不會變成每片 1 個）
+        for b in sorted(buckets):
+            arr = buckets[b]
+            lo, hi = max(0, b - half), min(n_slices, b + half + 1)
+            nps = (prefix[hi] - prefix[lo]) * 1000.0 / ((hi - lo) * sm)
+            if nps <= target:
+                out.extend(arr); continue
+            carry += len(arr) * target / nps
+            cap = min(len(arr), int(carry))
+            carry -= cap
+            if not cap: continue
+            arr.sort(key=lambda x: (-x.velocity, -x.dur, x.pitch))
+            out.extend(arr[:cap])
+        out.sort(key=lambda n: (n.start, n.pitch))
+        return out
+
+class TwoHandReduction(ReductionStrategy):
+    """
+    把每個時間片的音分給左右手（不交叉：低的一段給左手、高的一段給右手），兩手都搆不到的音丟掉：
+    - 一隻手同時最多 max_fingers 個音、跨度 hand_span 半音
+    - 每片的候選 = 分界點 k：左手取以第 k-1 個音為最高音的手型、右手取以第 k 個音為最低音的手型
+    - 沿時間片做動態規劃，成本 = 丟掉的音的權重（力度，最高 / 最低音另加分）+ 兩手移動的半音數 * MOVE_W；
+      狀態 = (左手位置, 右手位置)，每片只留成本最低的 BEAM 個
+    每片先只留權重最高的 2 * max_fingers + 2 個音，每片工作量有上限，整體約與音數成線性。
+    """
+    BEAM = 8
+    MOVE_W = 2.0
+    OUTER_BONUS = 64
+
+    @staticmethod
+    def _hand(ws: list, a: int, b: int, f: int):
+        """ws[a:b] 中權重最高的 f 個 -> (權重和, 手的位置, 音)。"""
+        part = ws[a:b] if b - a <= f else heapq.nlargest(f, ws[a:b], key=lambda x: x[0])
+        lo, hi = min(x[1].pitch for x in part), max(x[1].pitch for x in part)
+        return sum(x[0] for x in part), (lo + hi) // 2, [x[1] for x in part]
+
+    def _candidates(self, ws: list, span: int, f: int) -> list:
+        m = len(ws)
+        pitch = [x[1].pitch for x in ws]
+        left = [None] * (m + 1)    # left[k]：最高音為 ws[k-1] 的左手
+        s = 0
+        for j in range(m):
+            while pitch[j] - pitch[s] > span: s += 1
+            left[j + 1] = self._hand(ws, s, j + 1, f)
+        right = [None] * (m + 1)   # right[k]：最低音為 ws[k] 的右手
+        e = m
+        for i in range(m - 1, -1, -1):
+            while pitch[e - 1] - pitch[i] > span: e -= 1
+            right[i] = self._hand(ws, i, e, f)
+        out = []
+        for k in range(m + 1):
+            l, r = left[k], right[k]
+            out.append(((l[0] if l else 0) + (r[0] if r else 0), l[1] if l else None, r[1] if r else None,
+                        (l[2] if l else []) + (r[2] if r else [])))
+        return out
+
+    def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
+        filt = [n for n in notes if n.velocity >= cfg.min_velocity]
+        buckets = {}
+        for n in filt:
+            buckets.setdefault(int((n.start * 1000) // cfg.slice_ms), []).append(n)
+        span, f = max(0, cfg.hand_span), max(1, cfg.max_fingers)
+        pre_cap, move_w = 2 * f + 2, self.MOVE_W
+        # beam 內每個狀態：(成本, 左手位置, 右手位置, 回溯鏈 (上一個鏈, 這片留下的音))
+        beam = [(0.0, None, None, None)]
+        for b in sorted(buckets):
+            arr = buckets[b]
+            top, bottom = max(arr, key=lambda x: x.pitch), min(arr, key=lambda x: x.pitch)
+            ws = [(n.velocity + (self.OUTER_BONUS if n is top or n is bottom else 0), n) for n in arr]
+            total_w = sum(w for w, _ in ws)
+            if len(ws) > pre_cap:
+                ws = heapq.nlargest(pre_cap, ws, key=lambda x: x[0])
+            ws.sort(key=lambda x: x[1].pitch)
+            nxt = {}
+            for kept_w, nl, nr, kept in self._candidates(ws, span, f):
+                drop = total_w - kept_w
+                for cost, lc, rc, chain in beam:
+                    c = cost + drop
+                    if nl is not None and lc is not None: c += move_w * abs(nl - lc)
+                    if nr is not None and rc is not None: c += move_w * abs(nr - rc)
+                    key = (lc if nl is None else nl, rc if nr is None else nr)
+                    old = nxt.get(key)
+                    if old is None or c < old[0]:
+                        nxt[key] = (c, key[0], key[1], (chain, kept))
+            beam = heapq.nsmallest(self.BEAM, nxt.values(), key=lambda x: x[0])
+        out: List[Note] = []
+        chain = min(beam, key=lambda x: x[0])[3]
+        while chain is not None:
+            chain, kept = chain
+            out.extend(kept)
+        out.sort(key=lambda n: (n.start, n.pitch))
+        return out
+
+class SweepPolyReduction(ReductionStrategy):
+    """
+    限制「實際同時發聲的音數」（不是每片的 onset 數）：依 onset 順序掃描，
+    - 結束時間堆：先把 end <= 目前 onset 的音移出
+    - 已有 max_sounding 個在響時，看優先度堆（力度, 音高）最低的那個：不比新音重要就在新音開始處截短
+      （截完不到 MIN_KEEP_S 秒就整個丟掉），否則丟掉新音
+    兩個堆只在堆頂做延遲刪除，過期項目超過 k 個就整理一次，O(n log k)，k = max_sounding。
+    """
+    MIN_KEEP_S = 0.05
+
+    def apply(self, notes: List[Note], cfg: ReductionConfig) -> List[Note]:
+        filt = sorted((n for n in notes if n.velocity >= cfg.min_velocity), key=lambda n: (n.start, n.pitch))
+        cap = max(1, cfg.max_sounding)
+        ends = [n.end for n in filt]        # None = 丟掉
+        active = [False] * len(filt)
+        by_end, by_prio = [], []            # (end, i) / (velocity, pitch, i)
+        sounding = 0
+        for i, n in enumerate(filt):
+            t = n.start
+            while by_end and by_end[0][0] <= t:
+                j = heapq.heappop(by_end)[1]
+                if active[j]: active[j] = False; sounding -= 1
+            if sounding >= cap:
+                while not active[by_prio[0][2]]: heapq.heappop(by_prio)
+                v, p, j = by_prio[0]
+                if (v, p) > (n.velocity, n.pitch):
+                    ends[i] = None; continue
+                heapq.heappop(by_prio)
+                active[j] = False; sounding -= 1
+                ends[j] = t if t - filt[j].start >= self.MIN_KEEP_S else None
+            active[i] = True; sounding += 1
+            heapq.heappush(by_end, (n.end, i))
+            heapq.heappush(by_prio, (n.velocity, n.pitch, i))
+            if len(by_prio) > 2 * cap:
+                by_prio = [x for x in by_prio if active[x[2]]]; heapq.heapify(by_prio)
+            if len(by_end) > 2 * cap:
+                by_end = [x for x in by_end if active[x[1]]]; heapq.heapify(by_end)
+        return [n if e == n.end else replace(n, end=e) for n, e in zip(filt, ends) if e is not None]
+
+_STRATEGIES = {
+    "basic": BasicReduction,
+    "melody_bass": MelodyBassReduction,
+    "adaptive": AdaptiveReduction,
+    "two_hand": TwoHandReduction,
+    "sweep_poly": SweepPolyReduction,
+}
+REDUCTION_MODES = tuple(_STRATEGIES)
+
 def make_reduction(mode: str) -> ReductionStrategy:
-    return MelodyBassReduction() if mode == "melody_bass" else BasicReduction()
\ No newline at end of file
+    return _STRATEGIES.get(mode, BasicReduction)()
\ No newline at end of file
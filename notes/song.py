@@ -0,0 +1,119 @@
+# notes/song.py
+import logging, os
+from array import array
+from dataclasses import dataclass, field
+from itertools import compress
+from typing import ClassVar, Dict, Iterable, List, Optional, Tuple
+from notes.model import Note
+from notes.density import DensityPyramid
+from timeline.judge import Judge
+from config import ReductionConfig, StreamConfig
+from midi.tempo import TempoMap
+
+@dataclass
+class Song:
+    """載入並完成 reduction 的一首歌：App / 匯出 / 批次工具共用。"""
+    path: Optional[str]
+    notes_sorted: List[Note] = field(default_factory=list)
+    note_starts: List[float] = field(default_factory=list)
+    total: float = 0.0
+    tempo_map: Optional[TempoMap] = None   # 原曲 tempo map（寫回 .mid 用）
+    track_names: Dict[int, str] = field(default_factory=dict)
+    # 與 notes_sorted 平行：每個音的 track（超過 255 的併到 255），供 bytes.translate 一次算出遮罩
+    track_ids: bytes = b""
+    # track -> 該 track 音符在 notes_sorted 中的索引
+    track_index: Dict[int, array] = field(default_factory=dict)
+    # 只有一個 track 有音符（format 0）：track_ids / track_index 改以 channel 分，靜音 / 獨奏才有東西可選
+    by_channel: bool = False
+    # 載入時量到的記憶體（bytes）：parse / reduce 各一個，source 為 tracemalloc（淨增量）或 rss（絕對值），見 utils/memstats.track_load
+    load_stats: Dict[str, object] = field(default_factory=dict, repr=False)
+    # 整首密度金字塔（notes.density；載入時在背景建好，minimap 用）
+    density: Optional[DensityPyramid] = field(default=None, repr=False)
+    # 練習模式判定（timeline.judge）：同樣在背景建好，切歌時 App 只呼叫 judge.reset()
+    judge: Optional[Judge] = field(default=None, repr=False)
+
+    streaming: ClassVar[bool] = False   # notes.streaming.StreamingSong：只有播放位置附近的音在記憶體裡
+
+    def __post_init__(self):
+        if len(self.track_ids) != len(self.notes_sorted):
+            self._reindex()
+
+    def _single_track(self) -> bool:
+        ns = self.notes_sorted
+        t0 = ns[0].track if ns else 0
+        return all(n.track == t0 for n in ns)
+
+    def _reindex(self):
+        self.by_channel = self._single_track()
+        if self.by_channel:
+            self.track_ids = bytes(n.channel & 0x0F for n in self.notes_sorted)
+        else:
+            self.track_ids = bytes(min(n.track, 255) for n in self.notes_sorted)
+        idx: Dict[int, array] = {}
+        for i, t in enumerate(self.track_ids):
+            a = idx.get(t)
+            if a is None: a = idx[t] = array('I')
+            a.append(i)
+        self.track_index = dict(sorted(idx.items()))
+
+    def close(self):
+        pass
+
+    def prepare(self):
+        """建 judge 與 density（都是 O(n) 的 Python 迴圈）：在載入的背景執行緒呼叫，App.set_song 只換參照。"""
+        self.judge = Judge(self.notes_sorted, self.track_ids)
+        self.density = DensityPyramid(self.notes_sorted, self.total)
+
+    @classmethod
+    def from_notes(cls, notes: List[Note], path: Optional[str] = None,
+                   tempo_map: Optional[TempoMap] = None, track_names: Optional[Dict[int, str]] = None) -> "Song":
+        ns = sorted(notes, key=lambda n: n.start)
+        return cls(path=path, notes_sorted=ns, note_starts=[n.start for n in ns],
+                   total=max((n.end for n in ns), default=0.0), tempo_map=tempo_map,
+                   track_names=dict(track_names or {}))
+
+    @property
+    def tracks(self) -> List[int]:
+        """有音符的 track（由小到大；by_channel 時為 channel）。"""
+        return list(self.track_index)
+
+    def track_label(self, t: int) -> str:
+        if self.by_channel:
+            return f"Channel {t + 1}"
+        return self.track_names.get(t) or f"Track {t}"
+
+    @staticmethod
+    def track_lut(enabled: Iterable[int]) -> bytes:
+        """track id -> 1 / 0 的 256 bytes 對照表（bytes.translate、Judge.set_enabled 用）。"""
+        lut = bytearray(256)
+        for t in enabled:
+            lut[min(t, 255)] = 1
+        return bytes(lut)
+
+    def select_tracks(self, lut: bytes) -> Tuple[List[Note], List[float]]:
+        """只留 lut 內 track 的音（不重新 parse / reduce）：遮罩與篩選都在 C 層完成。"""
+        mask = self.track_ids.translate(lut)
+        return list(compress(self.notes_sorted, mask)), list(compress(self.note_starts, mask))
+
+def load_song(path: str, reduce_cfg: ReductionConfig, stream_cfg: Optional[StreamConfig] = None) -> Song:
+    """parse + reduce + 依 onset 排序；檔案超過 stream_cfg.threshold_mb 時改用 out-of-core 視窗載入。"""
+    if stream_cfg is not None and stream_cfg.threshold_mb > 0 \
+            and os.path.getsize(path) >= stream_cfg.threshold_mb * 1024 * 1024:
+        from notes.streaming import open_streaming_song
+        return open_streaming_song(path, reduce_cfg, stream_cfg.window_s)
+    from midi.parser import parse_midi
+    from notes.reduction import make_reduction
+    from utils.memstats import track_load
+    with track_load() as m_parse:
+        parsed = parse_midi(path)
+    with track_load() as m_reduce:
+        notes = make_reduction(reduce_cfg.mode).apply(parsed.notes, reduce_cfg)
+    song = Song.from_notes(notes, path, parsed.tempo_map, parsed.track_names)
+    song.prepare()
+    song.load_stats = {"parse": m_parse.bytes, "reduce": m_reduce.bytes, "source": m_parse.source}
+    if m_parse.bytes is not None:
+        # tracemalloc：各步驟留下的淨增量；rss：各步驟結束時整個行程的 RSS
+        logging.info("load %s: %d -> %d notes, memory parse %.1f MB / reduce %.1f MB (%s)", path,
+                     len(parsed.notes), len(notes), m_parse.bytes / 2**20, (m_reduce.bytes or 0) / 2**20,
+                     m_parse.source)
+    return song
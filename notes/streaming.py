@@ -0,0 +1,132 @@
+# notes/streaming.py
+"""
+超大 MIDI 的視窗式載入：只把播放位置前後的音解碼 + reduce 放在記憶體裡。
+- 時間軸切成固定長度的視窗（長度取 slice_ms 的整數倍，reduction 的時間片不會跨視窗）
+- 只有 slice_local 的 reduction（basic、melody_bass）逐窗 reduce 與整首 reduce 結果相同；
+  adaptive（鄰近密度）、two_hand（前後的手位）、sweep_poly（還在響的音）會看到視窗外的音，
+  open_streaming_song 對它們改用 basic 並記 warning
+- 記憶體中最多保留前一窗、目前窗、下一窗；再下一窗在背景先解
+- poll(t) 不阻塞：需要的視窗備妥時換上新的 notes_sorted / note_starts
+"""
+import logging, math, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from itertools import chain
+from typing import ClassVar, Dict, List, Optional, Set, Tuple
+from config import ReductionConfig
+from midi.smf import SmfIndex
+from notes.model import Note
+from notes.song import Song
+from timeline.judge import Judge
+
+@dataclass
+class StreamingSong(Song):
+    streaming: ClassVar[bool] = True
+    index: Optional[SmfIndex] = field(default=None, repr=False)
+    reduce_cfg: ReductionConfig = field(default_factory=ReductionConfig)
+    window_s: float = 8.0
+
+    def __post_init__(self):
+        slice_ms = max(1, self.reduce_cfg.slice_ms)
+        self._spw = max(1, int(round(self.window_s * 1000 / slice_ms)))   # 每窗幾個時間片
+        self._slice_ms = slice_ms
+        self.window_s = self._spw * slice_ms / 1000.0
+        self.n_windows = int(math.ceil(self.total / self.window_s)) + 1
+        self._win: "OrderedDict[int, List[Note]]" = OrderedDict()
+        self._jobs: Dict[int, Future] = {}
+        self._failed: Set[int] = set()
+        self._lock = threading.Lock()
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smf-window")
+        self._closed = False
+        self.resident: Tuple[int, ...] = ()
+        for k in (0, 1):   # 開頭兩窗同步解好，載入完就能播
+            if k < self.n_windows:
+                self._win[k] = self._decode(k)
+        self._assemble(tuple(self._win))
+
+    @property
+    def tracks(self) -> List[int]:
+        # 以整首為準（不是目前視窗），Ctrl+數字 對應的 track 才不會跟著視窗變
+        if self.by_channel:
+            chans = 0
+            for t in self.index.tracks: chans |= t.channels
+            return [c for c in range(16) if chans >> c & 1]
+        return [t.num for t in self.index.tracks if t.n_notes]
+
+    def _single_track(self) -> bool:
+        return sum(1 for t in self.index.tracks if t.n_notes) <= 1
+
+    def _decode(self, k: int) -> List[Note]:
+        from notes.reduction import make_reduction
+        sm, spw = self._slice_ms, self._spw
+        a, b = k * self.window_s, (k + 1) * self.window_s
+        # 與 reduction 的分桶同一個公式判定屬於哪一窗，邊界上的音不會重複或遺漏
+        notes = self.index.decode(a, b, keep=lambda s: int((s * 1000) // sm) // spw == k)
+        return make_reduction(self.reduce_cfg.mode).apply(notes, self.reduce_cfg)
+
+    def _store(self, k: int, fut: Future):
+        with self._lock:
+            self._jobs.pop(k, None)
+            if fut.cancelled(): return
+            exc = fut.exception()
+            if exc is not None:
+                self._failed.add(k)
+                logging.error("window %d decode failed: %s", k, self.path, exc_info=exc)
+                return
+            self._win[k] = fut.result()
+
+    def _request(self, k: int):
+        if not (0 <= k < self.n_windows): return
+        with self._lock:
+            if k in self._win or k in self._jobs or k in self._failed: return
+            fut = self._ex.submit(self._decode, k)
+            self._jobs[k] = fut
+        fut.add_done_callback(lambda f, k=k: self._store(k, f))
+
+    def _assemble(self, ks: Tuple[int, ...]):
+        with self._lock:
+            parts = [self._win[k] for k in ks]
+        # 各窗內已排序、窗與窗的 onset 不重疊：直接串接
+        self.notes_sorted = list(chain.from_iterable(parts))
+        self.note_starts = [n.start for n in self.notes_sorted]
+        self._reindex()
+        self.judge = Judge(self.notes_sorted, self.track_ids)   # 只含 resident 視窗的音；開頭兩窗在載入執行緒建好
+        self.resident = ks
+
+    def poll(self, t: float) -> bool:
+        """每 frame 呼叫；resident 視窗換了（notes_sorted 已更新）就回 True。"""
+        k = min(max(0, int(t // self.window_s)), self.n_windows - 1)
+        for w in (k, k + 1, k + 2, k - 1):   # k - 1 平常已在；跳轉後才需要補
+            self._request(w)
+        with self._lock:
+            if k not in self._win: return False   # 跳轉後目前窗還沒解好：先沿用舊的
+            want = tuple(w for w in (k - 1, k, k + 1) if w in self._win)
+            for w in [w for w in self._win if not (k - 1 <= w <= k + 2)]:
+                del self._win[w]
+        if want == self.resident: return False
+        self._assemble(want)
+        return True
+
+    def close(self):
+        """取消排隊中的視窗；索引（mmap + 檔案）排在進行中的解碼之後關，不阻塞呼叫端。"""
+        with self._lock:
+            if self._closed: return
+            self._closed = True
+            jobs = list(self._jobs.values())
+        for fut in jobs: fut.cancel()   # cancel 會同步呼叫 _store（要拿 _lock），不能在鎖內
+        if self.index is not None:
+            self._ex.submit(self.index.close)
+        self._ex.shutdown(wait=False)
+
+def open_streaming_song(path: str, reduce_cfg: ReductionConfig, window_s: float = 8.0) -> StreamingSong:
+    """建索引（一次串流掃描）並解好開頭兩窗。不是 slice_local 的 reduction 改用 basic（見模組說明）。"""
+    from notes.reduction import make_reduction
+    if not make_reduction(reduce_cfg.mode).slice_local:
+        logging.warning("streaming %s: reduction %r depends on notes outside its window, using 'basic' instead",
+                        path, reduce_cfg.mode)
+        reduce_cfg = replace(reduce_cfg, mode="basic")
+    idx = SmfIndex(path)
+    logging.info("streaming %s: %d tracks, %d notes, %.1fs", path, len(idx.tracks), idx.n_notes, idx.total)
+    return StreamingSong(path=path, total=idx.total, tempo_map=idx.tempo_map, track_names=dict(idx.track_names),
+                         index=idx, reduce_cfg=reduce_cfg, window_s=window_s)
@@ -0,0 +1,105 @@
+# notes/watch.py
+"""
+檔案監看（--watch / F6）：current_midi 存檔後自動換上新版本，播放位置不變。
+- 背景執行緒每 interval_s 看一次 mtime / 大小
+- 以各 track chunk 的 blake2b 摘要比對，只重新解碼內容變了的 track（midi.smf.SmfIndex(prev=...)）
+- reduction 為 slice_local 時只重算受影響的時間片，其餘沿用上一版的結果
+tpb、tempo map、track 數或整首長度改變時（所有音的秒數 / 懸空音的結尾都可能變）退回整首重解。
+"""
+import heapq, logging, os, threading
+from itertools import chain
+from typing import Dict, List, Optional
+from config import ReductionConfig
+from midi.smf import SmfIndex
+from notes.model import Note
+from notes.reduction import make_reduction
+from notes.song import Song
+
+def _onset_key(n: Note):
+    return (n.start, n.pitch)
+
+class SongWatcher:
+    def __init__(self, path: str, reduce_cfg: ReductionConfig, interval_s: float = 0.02):
+        self.path, self.reduce_cfg, self.interval_s = path, reduce_cfg, interval_s
+        self._idx: Optional[SmfIndex] = None       # 上一版索引（mmap 已關，只留各 track 的摘要與檢查點）
+        self._raw: Dict[int, List[Note]] = {}      # track -> 未 reduce 的音
+        self._reduced: List[Note] = []
+        self._sig = None
+        self._ready: Optional[Song] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.last_changed: Optional[List[int]] = None   # 上次重解的 track（None = 整首）
+        self._thread = threading.Thread(target=self._run, name="midi-watch", daemon=True)
+        self._thread.start()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _run(self):
+        try:
+            self._sig = self._stat()
+            self._rebuild()   # 建立比對基準，不發布
+        except Exception:
+            logging.exception("watch %s: initial index failed", self.path)
+        failed = None
+        while not self._stop.wait(self.interval_s):
+            try:
+                sig = self._stat()
+            except OSError:
+                continue   # 先刪後寫的編輯器：存檔途中檔案暫時不存在
+            if sig == self._sig or sig[1] == 0: continue   # 大小 0：正在覆寫
+            try:
+                song = self._rebuild()
+            except Exception as e:
+                # 多半是還沒寫完：sig 不更新，下一輪再試
+                if sig != failed: logging.info("watch %s: reload failed (%s), retrying", self.path, e)
+                failed = sig
+                continue
+            self._sig = sig
+            with self._lock:
+                self._ready = song
+
+    def _rebuild(self) -> Song:
+        prev, cfg = self._idx, self.reduce_cfg
+        idx = SmfIndex(self.path, prev=prev)
+        try:
+            if idx.truncated: raise ValueError("file is incomplete")
+            full = (prev is None or idx.tpb != prev.tpb or idx.tempo_map != prev.tempo_map
+                    or len(idx.tracks) != len(prev.tracks) or idx.total != prev.total)
+            changed = [t.num for t in idx.tracks if full or not t.reused]
+            fresh = idx.decode(0.0, idx.total + 1.0, tail_s=idx.total + 1.0, tracks=changed) if changed else []
+        finally:
+            idx.close()
+        by_track: Dict[int, List[Note]] = {t: [] for t in changed}
+        for n in fresh:
+            by_track[n.track].append(n)
+        old_raw = self._raw
+        raw = dict(by_track) if full else {**old_raw, **by_track}
+        strat = make_reduction(cfg.mode)
+        if full or not strat.slice_local:
+            # 依 track 順序串接再排序：與 parse_midi 的輸出順序相同（同分時 reduction 的取捨才一致）
+            notes = sorted(chain.from_iterable(raw[t] for t in sorted(raw)), key=_onset_key)
+            reduced = strat.apply(notes, cfg)
+        else:
+            sm = cfg.slice_ms
+            hit = {int((n.start * 1000) // sm) for t in changed for n in chain(old_raw.get(t, ()), by_track[t])}
+            keep = [n for n in self._reduced if int((n.start * 1000) // sm) not in hit]
+            part = sorted((n for t in sorted(raw) for n in raw[t] if int((n.start * 1000) // sm) in hit),
+                          key=_onset_key)
+            reduced = list(heapq.merge(keep, strat.apply(part, cfg), key=_onset_key))
+        self._idx, self._raw, self._reduced = idx, raw, reduced
+        self.last_changed = None if full else changed
+        song = Song.from_notes(reduced, self.path, idx.tempo_map, idx.track_names)
+        song.prepare()
+        return song
+
+    def poll(self) -> Optional[Song]:
+        """每 frame 呼叫：有新版本就取走（只回傳一次）。"""
+        if self._ready is None: return None
+        with self._lock:
+            song, self._ready = self._ready, None
+        return song
+
+    def close(self):
+        self._stop.set()
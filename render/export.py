@@ -0,0 +1,104 @@
+# render/export.py
+"""
+離線匯出掉落音符畫面（不開視窗）：
+- 依固定 fps 把時間軸切成 frame，分成多個 chunk 交給 process pool
+- 每個 worker 各自持有一個 headless Renderer
+- raw：RGB24 逐 frame 串接（可直接 pipe 給 ffmpeg）；png：影像序列
+"""
+import os, sys, math, shutil, tempfile, logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import pygame
+from config import RenderConfig
+from notes.song import Song
+from render.renderer import Renderer
+from utils.asynclog import pool_context
+
+LOOKBACK = 8.0  # 與 Renderer.draw_notes 相同的回看秒數
+
+@dataclass
+class ExportJob:
+    out_path: str              # raw：檔案路徑或 "-"（stdout）；png：輸出資料夾
+    fmt: str = "raw"           # "raw" | "png"
+    fps: int = 60
+    start: float = 0.0
+    end: Optional[float] = None
+    workers: int = 0           # 0 = os.cpu_count()
+    chunk_frames: int = 120
+
+_tobytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+
+_w_renderer: Optional[Renderer] = None
+_w_song: Optional[Song] = None
+
+def _worker_init(render_cfg: RenderConfig, song: Song):
+    global _w_renderer, _w_song
+    _w_renderer = Renderer(render_cfg, headless=True)
+    _w_song = song
+
+def _sounding(song: Song, t: float) -> set[int]:
+    lo = bisect_left(song.note_starts, t - LOOKBACK)
+    hi = bisect_right(song.note_starts, t)
+    return {n.pitch for n in song.notes_sorted[lo:hi] if n.end > t}
+
+def render_frame(r: Renderer, song: Song, t: float):
+    r.begin_frame()
+    r.draw_notes(song.notes_sorted, song.note_starts, t)
+    r.draw_keyboard(highlight=_sounding(song, t))
+
+def _render_chunk(args) -> Optional[str]:
+    idx, f0, f1, job, tmp_dir = args
+    r, song = _w_renderer, _w_song
+    if job.fmt == "png":
+        for f in range(f0, f1):
+            render_frame(r, song, job.start + f / job.fps)
+            pygame.image.save(r.screen, os.path.join(job.out_path, f"frame_{f:06d}.png"))
+        return None
+    part = os.path.join(tmp_dir, f"part-{idx:05d}.rgb")
+    with open(part, "wb") as fh:
+        for f in range(f0, f1):
+            render_frame(r, song, job.start + f / job.fps)
+            fh.write(_tobytes(r.screen, "RGB"))
+    return part
+
+def export_song(song: Song, render_cfg: RenderConfig, job: ExportJob) -> int:
+    """回傳輸出的 frame 數。frames 依序寫出（raw 依 chunk 順序串接）。"""
+    end = song.total if job.end is None else job.end
+    n_frames = max(0, int(math.ceil((end - job.start) * job.fps)))
+    if n_frames == 0:
+        return 0
+    step = max(1, job.chunk_frames)
+    workers = job.workers or os.cpu_count() or 1
+
+    tmp_dir = None
+    if job.fmt == "png":
+        os.makedirs(job.out_path, exist_ok=True)
+    else:
+        base = os.getcwd() if job.out_path == "-" else os.path.dirname(os.path.abspath(job.out_path))
+        tmp_dir = tempfile.mkdtemp(prefix="pidx-export-", dir=base)
+
+    chunks = [(i, f0, min(f0 + step, n_frames), job, tmp_dir) for i, f0 in enumerate(range(0, n_frames, step))]
+    logging.info("export: %d frames @%dfps, %dx%d, %d chunks, %d workers",
+                 n_frames, job.fps, render_cfg.window_w, render_cfg.window_h, len(chunks), workers)
+    out = None
+    try:
+        if job.fmt != "png":
+            out = sys.stdout.buffer if job.out_path == "-" else open(job.out_path, "wb")
+        # worker 只畫音符：judge / density 不必 pickle 過去
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=_worker_init,
+                                 initargs=(render_cfg, replace(song, judge=None, density=None))) as ex:
+            # map 依提交順序回傳，raw 可邊算邊依序串接
+            for part in ex.map(_render_chunk, chunks):
+                if part is None:
+                    continue
+                with open(part, "rb") as fh:
+                    shutil.copyfileobj(fh, out, 1 << 20)
+                os.remove(part)
+    finally:
+        if out is not None and out is not sys.stdout.buffer:
+            out.close()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return n_frames
@@ -0,0 +1,80 @@
+# render/keyboard.py
+"""
+鍵盤幾何：白鍵 / 黑鍵的水平位置，Renderer、KeymapOverlay、KeymapEditor 共用。
+- 每個 pitch 的 x0 / x1 存成以 pitch 為索引的陣列
+- 每個像素欄一格的 pitch 表（白鍵、黑鍵各一張），點擊判定 O(1)；黑鍵優先
+- keyboard_geometry() 依 (first, last, width, left) 記憶，同樣的版面只算一次
+"""
+from array import array
+from functools import lru_cache
+from math import ceil, floor
+from typing import List, Optional, Tuple
+
+WHITE_SET = {0, 2, 4, 5, 7, 9, 11}
+BLACK_RIGHT_OF = {0, 2, 5, 7, 9}   # C D F G A 右側有黑鍵
+BLACK_OFFSET, BLACK_WIDTH = 0.7, 0.6   # 相對白鍵寬
+
+def is_black(p: int) -> bool:
+    return (p % 12) not in WHITE_SET
+
+class KeyboardGeometry:
+    """first..last 的鍵盤鋪在 [left, left + width) 上（浮點座標，不含鍵間縫隙）。建好後視為唯讀。"""
+    def __init__(self, first: int, last: int, width: float, left: float = 0.0):
+        self.first, self.last = first, last
+        self.width, self.left = float(width), float(left)
+        whites = [p for p in range(first, last + 1) if (p % 12) in WHITE_SET]
+        self.total_white = len(whites) or 1
+        self.white_w = self.width / self.total_white
+
+        self.x0 = [0.0] * 128
+        self.x1 = [0.0] * 128
+        self.present = bytearray(128)     # 1 = 這個 pitch 在鍵盤上有鍵
+        self.white_keys: List[Tuple[int, float, float]] = []   # (pitch, x0, x1)
+        self.black_keys: List[Tuple[int, float, float]] = []
+        for i, p in enumerate(whites):
+            a = self.left + i * self.white_w
+            self._put(p, a, a + self.white_w, self.white_keys)
+        # 黑鍵放在左側白鍵的右緣，右側也要有白鍵
+        for i, p in enumerate(whites[:-1]):
+            if (p % 12) in BLACK_RIGHT_OF:
+                a = self.left + (i + BLACK_OFFSET) * self.white_w
+                self._put(p + 1, a, a + self.white_w * BLACK_WIDTH, self.black_keys)
+
+        # 像素欄 -> pitch（-1 = 沒有）
+        self.n_cols = int(floor(self.width)) + 1   # 右緣含在內（與 x0 <= x <= x1 的判定一致）
+        self.col_white = array('h', [-1]) * self.n_cols
+        self.col_black = array('h', [-1]) * self.n_cols
+        for tbl, keys in ((self.col_white, self.white_keys), (self.col_black, self.black_keys)):
+            for p, a, b in keys:
+                c0 = max(0, int(ceil(a - self.left)))
+                c1 = min(self.n_cols - 1, int(floor(b - self.left)))
+                for c in range(c0, c1 + 1):
+                    if tbl is self.col_black or tbl[c] < 0:   # 白鍵交界處歸左側鍵
+                        tbl[c] = p
+
+    def _put(self, p: int, a: float, b: float, keys: list):
+        self.x0[p], self.x1[p] = a, b
+        self.present[p] = 1
+        keys.append((p, a, b))
+
+    def has_key(self, p: int) -> bool:
+        return 0 <= p < 128 and self.present[p] == 1
+
+    def center_x(self, p: int) -> float:
+        return (self.x0[p] + self.x1[p]) / 2
+
+    def pitch_at(self, x: float, black_zone: bool = True) -> Optional[int]:
+        """x 座標下的 pitch；black_zone=True 表示 y 落在黑鍵高度內（黑鍵優先）。"""
+        c = x - self.left
+        if c < 0: return None
+        c = int(c)
+        if c >= self.n_cols: return None
+        if black_zone:
+            p = self.col_black[c]
+            if p >= 0: return p
+        p = self.col_white[c]
+        return p if p >= 0 else None
+
+@lru_cache(maxsize=32)
+def keyboard_geometry(first: int, last: int, width: float, left: float = 0.0) -> KeyboardGeometry:
+    return KeyboardGeometry(first, last, width, left)
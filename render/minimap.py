@@ -0,0 +1,73 @@
+# render/minimap.py
+import math, pygame
+from typing import Dict, Optional
+from notes.density import DensityPyramid
+
+# 密度 0..255 -> 顏色（暗底到橘黃），三個通道各一張 bytes.translate 對照表
+_LUT_R = bytes(min(255, 18 + i) for i in range(256))
+_LUT_G = bytes(min(255, 18 + i * 200 // 255) for i in range(256))
+_LUT_B = bytes(min(255, 22 + i * 98 // 255) for i in range(256))
+
+class Minimap:
+    """
+    整首歌的密度縮圖（時間 × 音高）+ 播放位置：
+    - 底圖由 DensityPyramid 選一層算出，每個 (pyramid, 寬度) 只畫一次，之後每 frame 只 blit + 畫播放線
+    - time_at(x)：點擊位置 -> 秒數（App.seek 用）
+    """
+    def __init__(self, rect: pygame.Rect):
+        self.rect = pygame.Rect(rect)
+        self.font = pygame.font.SysFont("consolas", 12)
+        self._cache: Dict[int, pygame.Surface] = {}   # 寬度 -> 底圖
+        self._owner: Optional[DensityPyramid] = None
+        self._label = ("", None)   # (文字, 已 render 的 Surface)：一秒才變一次
+
+    def set_rect(self, rect: pygame.Rect):
+        self.rect = pygame.Rect(rect)
+
+    def _base(self, pyr: DensityPyramid) -> pygame.Surface:
+        if pyr is not self._owner:
+            self._cache.clear(); self._owner = pyr
+        w, h = self.rect.size
+        surf = self._cache.get(w)
+        if surf is not None and surf.get_height() == h:
+            return surf
+        cols = pyr.columns(w)
+        peak = max((max(c) for c in cols), default=0)
+        scale = 255.0 / math.log1p(peak) if peak else 0.0
+        # 只取有音的音高帶，以 (rows, w) 的灰階算出強度，再用 translate 上色；高音在上
+        lo, hi = pyr.row_lo, pyr.row_hi
+        rows = hi - lo + 1
+        gray = bytearray(w * rows)
+        log1p = math.log1p
+        for x, col in enumerate(cols):
+            for r in range(lo, hi + 1):
+                c = col[r]
+                if c: gray[(hi - r) * w + x] = int(log1p(c) * scale)
+        g = bytes(gray)
+        rgb = bytearray(len(g) * 3)
+        rgb[0::3], rgb[1::3], rgb[2::3] = g.translate(_LUT_R), g.translate(_LUT_G), g.translate(_LUT_B)
+        small = pygame.image.frombuffer(bytes(rgb), (w, rows), "RGB")
+        surf = pygame.transform.scale(small, (w, h)).convert() if pygame.display.get_surface() \
+            else pygame.transform.scale(small, (w, h))
+        self._cache[w] = surf
+        return surf
+
+    def time_at(self, x: int, total: float) -> float:
+        r = self.rect
+        return max(0.0, min(1.0, (x - r.x) / max(1, r.w))) * total
+
+    def draw(self, screen: pygame.Surface, pyr: Optional[DensityPyramid], t: float, total: float):
+        r = self.rect
+        if pyr is not None:
+            screen.blit(self._base(pyr), r.topleft)
+        else:
+            pygame.draw.rect(screen, (18, 18, 22), r)
+        pygame.draw.line(screen, (60, 60, 66), (r.x, r.bottom), (r.right, r.bottom), 1)
+        if total <= 0: return
+        x = r.x + int(min(1.0, max(0.0, t / total)) * (r.w - 1))
+        pygame.draw.line(screen, (120, 200, 255), (x, r.y), (x, r.bottom - 1), 2)
+        label = f"{int(t // 60)}:{int(t % 60):02d} / {int(total // 60)}:{int(total % 60):02d}"
+        if label != self._label[0]:
+            self._label = (label, self.font.render(label, True, (200, 200, 210)))
+        txt = self._label[1]
+        screen.blit(txt, (r.right - txt.get_width() - 6, r.y + 2))
@@ -3,23 +3,33 @@ import os, pygame, logging
 from bisect import bisect_left, bisect_right
 from notes.model import Note
 from config import RenderConfig
+from render.keyboard import WHITE_SET, is_black, keyboard_geometry
+from render.minimap import Minimap
 
 STATUS_H = 36
 BTN_PAD_X = 12
 BTN_GAP = 10
-WHITE_SET = {0, 2, 4, 5, 7, 9, 11}
 
 class Renderer:
-    def __init__(self, cfg: RenderConfig):
-        pygame.init()
+    def __init__(self, cfg: RenderConfig, headless: bool = False):
+        self.headless = headless
+        if headless:
+            # 離屏繪製（匯出用）：不開視窗，畫在普通 Surface 上
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        # 只初始化需要的模組（pygame.init 會連 mixer/joystick 一起開，啟動慢）
+        pygame.display.init()
+        pygame.font.init()
         self.cfg = cfg
-        self.screen = pygame.display.set_mode((cfg.window_w, cfg.window_h))
-        pygame.display.set_caption("PI-DX")
-        try:
-            icon_path = os.path.join(os.path.dirname(__file__), "..", "static", "img", "icon", "icon.png")
-            pygame.display.set_icon(pygame.image.load(icon_path))
-        except Exception as e:
-            print("[WARN] set_icon failed:", e)
+        if headless:
+            self.screen = pygame.Surface((cfg.window_w, cfg.window_h))
+        else:
+            self.screen = pygame.display.set_mode((cfg.window_w, cfg.window_h))
+            pygame.display.set_caption("PI-DX")
+            try:
+                icon_path = os.path.join(os.path.dirname(__file__), "..", "static", "img", "icon", "icon.png")
+                pygame.display.set_icon(pygame.image.load(icon_path))
+            except Exception as e:
+                print("[WARN] set_icon failed:", e)
         self.font = pygame.font.SysFont("consolas", 18)
         self.font_small = pygame.font.SysFont("consolas", 14)
         self.clock = pygame.time.Clock()
@@ -34,41 +44,27 @@ class Renderer:
         self.last_midi = 108
         self.total_white = 1
         self.white_w = float(self.cfg.window_w)
-        self.white_left_edges = []
-        self.white_index_by_pitch = {}
+        self.geom = None           # render.keyboard.KeyboardGeometry
         self.xw_by_pitch = {}
+        self._kb_surf = None       # 鍵盤快取（只重畫變動的鍵）
+        self._kb_valid = False
+        # 整首密度縮圖：狀態列下方一條（minimap_h = 0 不畫）
+        self.minimap = Minimap(pygame.Rect(0, STATUS_H + 1, cfg.window_w, cfg.minimap_h))
 
         self.set_key_range(self.cfg.key_range)
 
     def _rebuild_layout(self):
         try:
-            whites = [p for p in range(self.first_midi, self.last_midi + 1) if (p % 12) in WHITE_SET]
-            self.total_white = len(whites) or 1
-            self.white_w = float(self.cfg.window_w) / float(self.total_white)
-
-            self.white_left_edges = []
-            x = 0.0
-            for _ in whites:
-                self.white_left_edges.append(x); x += self.white_w
-
-            self.white_index_by_pitch = {}
-            idx = 0
-            for p in range(self.first_midi, self.last_midi + 1):
-                if (p % 12) in WHITE_SET:
-                    idx += 1
-                self.white_index_by_pitch[p] = idx
-
+            g = self.geom = keyboard_geometry(self.first_midi, self.last_midi, float(self.cfg.window_w))
+            self.total_white, self.white_w = g.total_white, g.white_w
             self.xw_by_pitch = {}
             for p in range(self.first_midi, self.last_midi + 1):
-                idx = self.white_index_by_pitch[p]
-                base_x = max(0, idx - 1) * self.white_w
-                is_black = (p % 12) not in WHITE_SET
-                if is_black:
-                    x = base_x + self.white_w * 0.7; w = self.white_w * 0.6
-                else:
-                    x = base_x; w = self.white_w - 1
-                self.xw_by_pitch[p] = (int(x), int(w), is_black)
+                if not g.present[p]: continue
+                black = is_black(p)
+                w = g.x1[p] - g.x0[p] if black else g.white_w - 1
+                self.xw_by_pitch[p] = (int(g.x0[p]), int(w), black)
 
+            self._kb_valid = False
             logging.debug("Keyboard layout rebuilt: range=[%d,%d], total_white=%d, white_w=%.3f",
                           self.first_midi, self.last_midi, self.total_white, self.white_w)
         except Exception:
@@ -95,7 +91,8 @@ class Renderer:
         self._ensure_layout_fresh()
 
     def end_frame(self):
-        pygame.display.flip()
+        if not self.headless:
+            pygame.display.flip()
 
     def draw_status_bar(self, right_info_text: str = "", song_title: str = ""):
         now = pygame.time.get_ticks()
@@ -106,7 +103,7 @@ class Renderer:
         pygame.draw.rect(self.screen, (24, 24, 28), (0, 0, self.cfg.window_w, STATUS_H))
         pygame.draw.line(self.screen, (60, 60, 66), (0, STATUS_H), (self.cfg.window_w, STATUS_H), 1)
 
-        buttons = ["LOAD MIDI", "KEYMAP", "PLAY/PAUSE", "AUTO SOUND", "SPEED", "KEY RANGE", "QUIT"]
+        buttons = ["LOAD MIDI", "KEYMAP", "PLAY/PAUSE", "AUTO SOUND", "PRACTICE", "SPEED", "KEY RANGE", "QUIT"]
         x = 10; self.button_rects.clear()
         for label in buttons:
             surf = self.font_small.render(label, True, (220, 220, 230))
@@ -146,33 +143,80 @@ class Renderer:
                     x_draw += tw + self.marquee_gap
                 self.screen.set_clip(clip_prev)
 
+    def draw_minimap(self, density, time_s: float, total: float):
+        if self.cfg.minimap_h <= 0: return
+        if self.minimap.rect.w != self.cfg.window_w or self.minimap.rect.h != self.cfg.minimap_h:
+            self.minimap.set_rect(pygame.Rect(0, STATUS_H + 1, self.cfg.window_w, self.cfg.minimap_h))
+        self.minimap.draw(self.screen, density, time_s, total)
+
     # ------- piano -------
-    def draw_keyboard(self, highlight: set[int] | None = None):
-        highlight = highlight or set()
+    def _key_rect(self, p: int):
+        """鍵盤快取 Surface 內的 (x, y, w, h)；不存在的鍵回傳 None。"""
+        g = self.geom
+        if g is None or not g.has_key(p): return None
+        ph = self.cfg.piano_h
+        if is_black(p):
+            return (g.x0[p], 0, g.x1[p] - g.x0[p], ph * 0.6)
+        return (g.x0[p], 0, g.white_w - 1, ph)
+
+    def _draw_key(self, p: int, lit: bool):
+        rect = self._key_rect(p)
+        if rect is None: return
+        if (p % 12) in WHITE_SET:
+            fill = (255, 240, 170) if lit else (230, 230, 230)
+        else:
+            fill = (255, 200, 120) if lit else (18, 18, 20)
+        pygame.draw.rect(self._kb_surf, fill, rect)
+        pygame.draw.rect(self._kb_surf, (60, 60, 66), rect, 1)
+
+    def _redraw_key(self, p: int, lit):
+        self._draw_key(p, lit[p])
+        if (p % 12) in WHITE_SET:
+            # 白鍵重畫會蓋到相鄰黑鍵，補畫回去
+            for q in (p - 1, p + 1):
+                if (q % 12) not in WHITE_SET and self.first_midi <= q <= self.last_midi:
+                    self._draw_key(q, lit[q])
+
+    def _ensure_kb_surf(self) -> bool:
+        size = (self.cfg.window_w, self.cfg.piano_h)
+        if self._kb_surf is None or self._kb_surf.get_size() != size:
+            self._kb_surf = pygame.Surface(size)
+            self._kb_valid = False
+        return self._kb_valid
+
+    def draw_keyboard(self, highlight: set[int] | None = None, keystate=None):
+        """
+        keystate（input.keystate.KeyState）：只重畫上次以來有變的鍵。
+        highlight：舊介面，整副鍵盤重畫（匯出等場合）。
+        """
         w, h, ph = self.cfg.window_w, self.cfg.window_h, self.cfg.piano_h
-        pygame.draw.rect(self.screen, (28, 28, 32), (0, h - ph, w, ph))
-
-        x = 0.0
-        whites = [p for p in range(self.first_midi, self.last_midi + 1) if (p % 12) in WHITE_SET]
-        for p in whites:
-            fill = (230, 230, 230) if p not in highlight else (255, 240, 170)
-            pygame.draw.rect(self.screen, fill, (x, h - ph, self.white_w - 1, ph))
-            pygame.draw.rect(self.screen, (60, 60, 66), (x, h - ph, self.white_w - 1, ph), 1)
-            x += self.white_w
-
-        idx_white = 0
-        for p in range(self.first_midi, self.last_midi + 1):
-            pc = p % 12
-            if pc in WHITE_SET:
-                if pc in {0, 2, 5, 7, 9} and idx_white + 1 < len(self.white_left_edges):
-                    left = self.white_left_edges[idx_white]
-                    bw = self.white_w * 0.6; bh = ph * 0.6
-                    bx = left + self.white_w * 0.7; by = h - ph
-                    fill = (18, 18, 20) if (p + 1) not in highlight else (255, 200, 120)
-                    pygame.draw.rect(self.screen, fill, (bx, by, bw, bh))
-                    pygame.draw.rect(self.screen, (60, 60, 66), (bx, by, bw, bh), 1)
-                idx_white += 1
+        if keystate is not None:
+            lit = keystate.lit
+        else:
+            lit = bytearray(128)
+            for p in (highlight or ()):
+                if 0 <= p < 128: lit[p] = 1
+
+        if keystate is None or not self._ensure_kb_surf():
+            self._ensure_kb_surf()
+            self._kb_surf.fill((28, 28, 32))
+            for p in range(self.first_midi, self.last_midi + 1):
+                if (p % 12) in WHITE_SET:
+                    self._draw_key(p, lit[p])
+            for p in range(self.first_midi, self.last_midi + 1):
+                if (p % 12) not in WHITE_SET:
+                    self._draw_key(p, lit[p])
+            self._kb_valid = keystate is not None
+        else:
+            dk = keystate.dirty_keys
+            for i in range(keystate.n_dirty):
+                p = dk[i]
+                if self.first_midi <= p <= self.last_midi:
+                    self._redraw_key(p, lit)
+        if keystate is not None:
+            keystate.clear_dirty()
 
+        self.screen.blit(self._kb_surf, (0, h - ph))
         hit_y = h - ph - 6
         pygame.draw.line(self.screen, (90, 90, 90), (0, hit_y), (w, hit_y), 2)
 
@@ -183,7 +227,9 @@ class Renderer:
             logging.warning("pitch_to_xw: pitch=%r 超出範圍 [%d, %d]，將進行 clamp",
                             pitch, self.first_midi, self.last_midi)
             p = min(max(pitch, self.first_midi), self.last_midi)
-            return self.xw_by_pitch[p]
+            # 記住 clamp 結果：同一個超出範圍的 pitch 之後不再每 frame 走例外 + logging
+            xw = self.xw_by_pitch[pitch] = self.xw_by_pitch[p]
+            return xw
 
     # ------- notes -------
     def draw_notes(self, notes_sorted: list[Note], note_starts: list[float], time_s: float):
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os, sys
+
+# 不開視窗 / 音效裝置；從 repo 根目錄 import（input.*、app…）
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,19 @@
+"""utils.asynclog.RateLimitFilter：同一呼叫位置的 debug / info 限流，WARNING 以上一律放行。"""
+import logging
+from utils.asynclog import RateLimitFilter
+
+def _record(level, created=100.0):
+    r = logging.LogRecord("render", level, "render.py", 42, "msg", None, None)
+    r.created = created
+    return r
+
+def test_info_limited_per_site():
+    f = RateLimitFilter(burst=3, window=5.0)
+    assert [f.filter(_record(logging.INFO)) for _ in range(5)] == [True] * 3 + [False] * 2
+    r = _record(logging.INFO, created=106.0)   # 下一個視窗：放行並附上被壓下的筆數
+    assert f.filter(r) and "suppressed 2" in r.msg
+
+def test_errors_never_dropped():
+    f = RateLimitFilter(burst=1, window=5.0)
+    assert all(f.filter(_record(lvl)) for lvl in (logging.WARNING, logging.ERROR, logging.CRITICAL) for _ in range(10))
+    assert not f.summary()
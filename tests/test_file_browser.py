@@ -0,0 +1,17 @@
+"""ui.file_browser.DirLister：目錄 mtime 沒變時，原地覆寫的檔案大小 / mtime 仍要更新。"""
+import os
+from ui.file_browser import DirLister
+
+def test_revalidate_restats_files_in_unchanged_dir(tmp_path):
+    p = tmp_path / "a.mid"
+    p.write_bytes(b"x" * 10)
+    lister = DirLister()
+    lister._load(str(tmp_path))
+    assert lister.peek(str(tmp_path))[0][0].size == 10
+    mt = os.stat(tmp_path).st_mtime_ns
+    with open(p, "r+b") as f:   # 原地覆寫：目錄本身的 mtime 不變
+        f.write(b"y" * 20)
+    os.utime(tmp_path, ns=(mt, mt))
+    lister._load(str(tmp_path))
+    e = lister.peek(str(tmp_path))[0][0]
+    assert (e.size, e.mtime_ns) == (20, os.stat(p).st_mtime_ns)
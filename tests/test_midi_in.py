@@ -0,0 +1,138 @@
+# tests/test_midi_in.py
+"""FakeMidiInput -> MidiInputThread -> pygame 事件佇列 -> InputPump / App（KeyState、MIDI thru）。"""
+import time
+import pygame
+import pytest
+from config import AppConfig, InputConfig
+from input.keystate import MIDI_IN
+from input.live import InputPump
+from input.midi_in import MIDI_NOTE_EVENT, FakeMidiInput, MidiInputThread
+
+CLOCK_MS = 1000   # 假裝置時鐘在執行緒建立時的讀數
+
+@pytest.fixture(autouse=True)
+def _pygame():
+    pygame.display.init()
+    pygame.event.clear()
+    yield
+    pygame.event.clear()
+
+class _Collect:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, e, ts):
+        self.events.append((e.pitch, e.on, e.velocity, ts))
+
+def _start(dev: FakeMidiInput) -> MidiInputThread:
+    return MidiInputThread(dev, clock=lambda: CLOCK_MS).start()
+
+def _wait_for(cond, timeout: float = 2.0, step=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if step: step()
+        if cond(): return True
+        time.sleep(0.002)
+    return False
+
+def test_timestamps_converted_to_ticks():
+    dev, got = FakeMidiInput(), _Collect()
+    pump = InputPump(lambda e: e.type == MIDI_NOTE_EVENT, got)
+    th = _start(dev)
+    try:
+        dev.feed(0x90, 60, 100, timestamp=CLOCK_MS + 250)
+        dev.feed(0x80, 60, 0, timestamp=CLOCK_MS + 400)
+        assert _wait_for(lambda: len(got.events) == 2, step=pump.poll)
+    finally:
+        th.close()
+    base = th._offset + CLOCK_MS   # 裝置時鐘 CLOCK_MS 對應的 get_ticks
+    assert got.events == [(60, True, 100, base + 250), (60, False, 0, base + 400)]
+    assert not pump.drain()   # 演奏事件不進 pending
+
+def test_note_off_forms_and_non_note_messages():
+    dev, got = FakeMidiInput(), _Collect()
+    pump = InputPump(lambda e: e.type == MIDI_NOTE_EVENT, got)
+    th = _start(dev)
+    try:
+        dev.feed(0x91, 64, 90, timestamp=CLOCK_MS)      # channel 2 note on
+        dev.feed(0xB0, 64, 127, timestamp=CLOCK_MS)     # CC：忽略
+        dev.feed(0x91, 64, 0, timestamp=CLOCK_MS + 10)  # velocity 0 note on = note off
+        dev.feed(0x8F, 65, 40, timestamp=CLOCK_MS + 20) # note off（release velocity 照傳）
+        assert _wait_for(lambda: len(got.events) == 3, step=pump.poll)
+        time.sleep(0.02); pump.poll()
+    finally:
+        th.close()
+    assert [(p, on, v) for p, on, v, _ in got.events] == [(64, True, 90), (64, False, 0), (65, False, 40)]
+
+def test_close_stops_thread_and_device():
+    dev = FakeMidiInput()
+    th = _start(dev)
+    assert th._thread.is_alive()
+    th.close()
+    assert not th._thread.is_alive()
+    assert dev.closed
+    dev.feed(0x90, 60, 100, timestamp=CLOCK_MS)   # 關掉後不再 post
+    time.sleep(0.02)
+    assert not [e for e in pygame.event.get() if e.type == MIDI_NOTE_EVENT]
+
+class StubSynth:
+    def __init__(self):
+        self.calls = []
+        self._tok = 0
+
+    def note_on(self, pitch, vel):
+        self._tok += 1
+        self.calls.append(("on", pitch, vel, self._tok))
+        return self._tok
+
+    def note_off_token(self, tok):
+        self.calls.append(("off_tok", tok))
+
+    def note_off(self, pitch):
+        self.calls.append(("off", pitch))
+
+    def all_notes_off(self):
+        self.calls.append(("all_off",))
+
+    def __getattr__(self, name):   # 其餘音源介面（open / close / set_*）在這裡不重要
+        return lambda *a, **k: None
+
+@pytest.fixture
+def app():
+    from app import App
+    a = App(AppConfig(input=InputConfig(midi_in="none", midi_thru=True)), notes=[], headless=True)
+    a.synth = StubSynth()
+    yield a
+    a.playlist.close()
+
+def test_app_keystate_and_thru(app):
+    dev = FakeMidiInput()
+    th = _start(dev)
+    try:
+        dev.feed(0x90, 60, 100, timestamp=CLOCK_MS)
+        dev.feed(0x90, 60, 80, timestamp=CLOCK_MS + 5)   # 同一鍵疊兩次
+        assert _wait_for(lambda: app.keys.count(60, MIDI_IN) == 2, step=app.input.poll)
+        ons = [c for c in app.synth.calls if c[0] == "on"]
+        assert [(p, v) for _, p, v, _ in ons] == [(60, 100), (60, 80)]
+        dev.feed(0x90, 60, 0, timestamp=CLOCK_MS + 10)
+        dev.feed(0x80, 60, 0, timestamp=CLOCK_MS + 15)
+        assert _wait_for(lambda: app.keys.count(60, MIDI_IN) == 0, step=app.input.poll)
+    finally:
+        th.close()
+    # 依按下順序關掉各自的 token
+    assert [c for c in app.synth.calls if c[0] == "off_tok"] == [("off_tok", ons[0][3]), ("off_tok", ons[1][3])]
+    base = th._offset + CLOCK_MS
+    rec = app.recorder
+    assert list(rec.kind) == [1, 1, 0, 0]
+    assert list(rec.t_ms) == [base, base + 5, base + 10, base + 15]
+
+def test_app_without_thru_does_not_sound(app):
+    app.cfg.input.midi_thru = False
+    dev = FakeMidiInput()
+    th = _start(dev)
+    try:
+        dev.feed(0x90, 72, 100, timestamp=CLOCK_MS)
+        assert _wait_for(lambda: app.keys.count(72, MIDI_IN) == 1, step=app.input.poll)
+    finally:
+        th.close()
+    assert not [c for c in app.synth.calls if c[0] == "on"]
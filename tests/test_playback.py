@@ -0,0 +1,67 @@
+"""App._advance_playback 的自動發聲排程：sweep_poly 輸出照 60 fps 播，token 不應超過 POLYPHONY_LIMIT。"""
+import pygame
+import pytest
+from app import App, FRAME_MS, POLYPHONY_LIMIT
+from bench.corpus import CorpusSpec, make_notes
+from config import AppConfig, InputConfig, ReductionConfig
+from notes.model import Note
+from notes.reduction import make_reduction
+from notes.song import Song
+
+class CountingSynth:
+    def __init__(self):
+        self.live = set()
+        self.peak = self.ons = 0
+        self._tok = 0
+
+    def note_on(self, pitch, vel):
+        self._tok += 1
+        self.ons += 1
+        self.live.add(self._tok)
+        self.peak = max(self.peak, len(self.live))
+        return self._tok
+
+    def note_off_token(self, tok):
+        self.live.discard(tok)
+
+    def all_notes_off(self):
+        self.live.clear()
+
+    def __getattr__(self, name):
+        return lambda *a, **k: None
+
+@pytest.fixture
+def app():
+    pygame.display.init()
+    a = App(AppConfig(input=InputConfig(midi_in="none")), notes=[], headless=True)
+    a.synth = CountingSynth()
+    yield a
+    a.playlist.close()
+
+def _play(app, notes, lead_s=0.0):
+    song = Song.from_notes(notes)
+    song.prepare()
+    app.set_song(song)
+    app.audio_lead = lead_s
+    app.auto_sound = True
+    app.is_playing = True
+    while app._next_snd_idx < len(app.notes_sorted) or app._active_heap:
+        app._advance_playback(FRAME_MS / 1000.0)
+
+@pytest.mark.parametrize("lead_s", [0.0, 0.037])
+def test_sweep_poly_output_never_drops(app, lead_s):
+    cfg = ReductionConfig(mode="sweep_poly", max_sounding=POLYPHONY_LIMIT)
+    notes = make_reduction(cfg.mode).apply(make_notes(CorpusSpec("poly", 6_000, 60)), cfg)
+    _play(app, notes, lead_s)
+    synth = app.synth
+    assert synth.ons == len(notes)   # 每個音都拿到 token（沒有因為滿了被丟掉）
+    assert synth.peak <= POLYPHONY_LIMIT
+    assert not synth.live and app._active_tokens == 0
+
+def test_cut_note_released_before_next_onset(app):
+    # 同一 frame 內：前一批音在 t 結束、下一批從 t 開始，總數超過上限的一倍
+    a = [Note(pitch=40 + i, start=0.1, end=0.105, velocity=80, channel=0) for i in range(POLYPHONY_LIMIT)]
+    b = [Note(pitch=70 + i, start=0.105, end=0.5, velocity=80, channel=0) for i in range(POLYPHONY_LIMIT)]
+    _play(app, a + b)
+    assert app.synth.ons == 2 * POLYPHONY_LIMIT
+    assert app.synth.peak == POLYPHONY_LIMIT
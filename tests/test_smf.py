@@ -0,0 +1,40 @@
+"""midi.smf.SmfIndex：建索引失敗時檔案與 mmap 都要關掉（檔案瀏覽器與監看都會碰到壞檔 / 寫到一半的檔）。"""
+import builtins, struct
+import pytest
+import midi.smf
+from midi.smf import SmfIndex
+from midi.writer import encode_notes_midi
+from notes.model import Note
+
+@pytest.fixture
+def opened(monkeypatch):
+    files = []
+    def spy(*a, **k):
+        f = builtins.open(*a, **k); files.append(f); return f
+    monkeypatch.setattr(midi.smf, "open", spy, raising=False)
+    return files
+
+def _header(division=480, ntrks=1):
+    return b"MThd" + struct.pack(">IHHH", 6, 0, ntrks, division)
+
+@pytest.mark.parametrize("data", [
+    b"",                                          # mmap 不能映射 0 bytes
+    b"RIFF" + bytes(20),                          # 不是 SMF
+    b"MThd\x00\x00",                              # header 不完整（struct.error）
+    _header(division=0xE728),                     # SMPTE
+    _header() + b"MTrk" + struct.pack(">I", 4) + b"\x00\x30\x40\x00",   # running status 沒有前一個 status
+], ids=["empty", "not-smf", "short-header", "smpte", "bad-track"])
+def test_failed_index_closes_file(tmp_path, opened, data):
+    path = tmp_path / "bad.mid"
+    path.write_bytes(data)
+    with pytest.raises(Exception):
+        SmfIndex(str(path))
+    assert opened and all(f.closed for f in opened)
+
+def test_close_after_success(tmp_path, opened):
+    path = tmp_path / "ok.mid"
+    path.write_bytes(encode_notes_midi([Note(60, 0.0, 0.5, 90, 0)]))
+    idx = SmfIndex(str(path))
+    assert idx.n_notes == 1 and not idx.truncated
+    idx.close()
+    assert idx.mm.closed and all(f.closed for f in opened)
@@ -0,0 +1,21 @@
+"""utils.startup：報告輸出之後才到的背景 mark 要補印。"""
+import pytest
+from utils import startup
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(startup, "_marks", [])
+    monkeypatch.setattr(startup, "_emitted", False)
+    monkeypatch.setattr(startup, "echo", True)
+
+def test_late_mark_is_printed(capsys):
+    startup.mark("first frame")
+    startup.emit()
+    assert "first frame" in capsys.readouterr().out
+    startup.mark("midi out ready (bg)")
+    out = capsys.readouterr().out
+    assert "(late)" in out and "midi out ready (bg)" in out
+
+def test_marks_before_emit_are_silent(capsys):
+    startup.mark("renderer ready")
+    assert capsys.readouterr().out == ""
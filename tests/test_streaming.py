@@ -0,0 +1,58 @@
+"""notes.streaming：逐窗 reduce 接起來要與整首 reduce 相同；做不到的 reduction 改用 basic。"""
+import pytest
+from bench.corpus import CorpusSpec, make_tempo_map, make_notes
+from config import ReductionConfig
+from midi.parser import parse_midi
+from midi.writer import write_notes_midi
+from notes.reduction import make_reduction
+from notes.streaming import open_streaming_song
+
+pytest.importorskip("mido")
+
+@pytest.fixture(scope="module")
+def dense(tmp_path_factory):
+    spec = CorpusSpec("dense", 4_000, 48, tempo_changes=10)
+    notes = make_notes(spec)
+    path = str(tmp_path_factory.mktemp("corpus") / "dense.mid")
+    write_notes_midi(path, notes, make_tempo_map(spec, max(n.end for n in notes)))
+    return path
+
+def _streamed(path, cfg, window_s=2.0):
+    song = open_streaming_song(path, cfg, window_s)
+    try:
+        return song, [n for k in range(song.n_windows) for n in song._decode(k)]
+    finally:
+        song.close()
+
+def _key(notes):
+    return sorted((round(n.start, 9), n.pitch, round(n.end, 9), n.velocity, n.track) for n in notes)
+
+def _max_sounding(notes):
+    ev = sorted([(n.start, 1) for n in notes] + [(n.end, -1) for n in notes])   # 同一時間先放開再按下
+    cur = peak = 0
+    for _, d in ev:
+        cur += d; peak = max(peak, cur)
+    return peak
+
+def test_slice_local_matches_full_reduce(dense):
+    cfg = ReductionConfig(mode="basic", max_poly_per_slice=6)
+    song, streamed = _streamed(dense, cfg)
+    full = make_reduction(cfg.mode).apply(parse_midi(dense).notes, cfg)
+    assert _key(streamed) == _key(full)
+
+@pytest.mark.parametrize("mode", ["adaptive", "two_hand", "sweep_poly"])
+def test_non_slice_local_modes_stream_as_basic(dense, mode):
+    cfg = ReductionConfig(mode=mode)
+    song, streamed = _streamed(dense, cfg)
+    assert song.reduce_cfg.mode == "basic"
+    assert _key(streamed) == _key(make_reduction("basic").apply(parse_midi(dense).notes, ReductionConfig()))
+
+def test_sweep_poly_falls_back_instead_of_breaking_the_cap(dense):
+    cfg = ReductionConfig(mode="sweep_poly", max_sounding=8)
+    full = make_reduction(cfg.mode).apply(parse_midi(dense).notes, cfg)
+    assert _max_sounding(full) <= 8
+    song, streamed = _streamed(dense, cfg)
+    # 逐窗 sweep 看不到前一窗還在響的音（會超過上限）：串流改用 basic，與整首 basic 相同
+    assert song.reduce_cfg.mode == "basic"
+    basic = ReductionConfig(mode="basic", max_sounding=8)
+    assert _key(streamed) == _key(make_reduction("basic").apply(parse_midi(dense).notes, basic))
@@ -0,0 +1,76 @@
+"""分軌靜音 / 獨奏：judge 只換遮罩不重建；只有一個 track 有音符時改以 channel 分。監看重載換掉清單裡的版本。"""
+import pygame
+import pytest
+from app import App
+from config import AppConfig, InputConfig
+from midi.writer import write_notes_midi
+from notes.model import Note
+from notes.song import Song
+
+def _song(notes):
+    song = Song.from_notes(notes)
+    song.prepare()
+    return song
+
+@pytest.fixture
+def app():
+    pygame.display.init()
+    a = App(AppConfig(input=InputConfig(midi_in="none")), notes=[], headless=True)
+    yield a
+    a.playlist.close()
+
+def test_single_track_splits_by_channel():
+    song = _song([Note(60, 0.0, 0.5, 90, channel=0), Note(64, 0.0, 0.5, 90, channel=9),
+                  Note(67, 1.0, 1.5, 90, channel=0)])
+    assert song.by_channel and song.tracks == [0, 9]
+    assert song.track_label(9) == "Channel 10"
+    notes, _ = song.select_tracks(song.track_lut([0]))
+    assert [n.pitch for n in notes] == [60, 67]
+
+def test_multi_track_keeps_track_ids():
+    song = _song([Note(60, 0.0, 0.5, 90, channel=0, track=1), Note(64, 0.0, 0.5, 90, channel=0, track=2)])
+    assert not song.by_channel and song.tracks == [1, 2]
+
+def test_mute_masks_judge_without_rebuilding(app):
+    app.set_song(_song([Note(60, 1.0, 1.5, 90, channel=0), Note(48, 1.0, 1.5, 90, channel=1),
+                        Note(62, 2.0, 2.5, 90, channel=0), Note(50, 2.0, 2.5, 90, channel=1)]))
+    judge = app.judge
+    app._toggle_track(2, solo=False)   # 靜音 channel 1（左手）
+    assert app.judge is judge
+    assert [n.pitch for n in app.notes_sorted] == [60, 62]
+    assert judge.press(48, 1.0) is None   # 靜音的音不判定
+    assert judge.press(60, 1.0) == "perfect"
+    judge.sweep(3.0)
+    assert (judge.perfect, judge.miss, judge.extra) == (1, 1, 1)   # 只有 62 記 miss
+    app._toggle_track(0, solo=False)
+    assert app.judge is judge and len(app.notes_sorted) == 4
+
+def test_reload_replaces_playlist_entry(app, tmp_path):
+    path = str(tmp_path / "song.mid")
+    write_notes_midi(path, [Note(60, 0.0, 0.5, 90, 0)])
+    app.playlist.add(path)
+    app.playlist.prefetch(0)
+    app.playlist._ex.submit(lambda: None).result()   # 等背景載入完成
+    app.switch_to(0)
+    new = _song([Note(62, 0.0, 0.5, 90, 0)]); new.path = path
+    app._reload_song(new)
+    app.switch_to(0)
+    assert app.song is new and [n.pitch for n in app.notes_sorted] == [62]
+
+def test_switching_back_clears_mute_mask(app):
+    a = _song([Note(60, 1.0, 1.5, 90, channel=0), Note(48, 1.0, 1.5, 90, channel=1)])
+    b = _song([Note(72, 1.0, 1.5, 90, channel=0)])
+    app.set_song(a)
+    app._toggle_track(2, solo=False)   # 靜音 channel 1
+    app.set_song(b)
+    app.set_song(a)   # Playlist.take 回傳的是同一個物件
+    assert not app.muted and len(app.notes_sorted) == 2
+    assert app.judge.press(48, 1.0) == "perfect"
+    app.judge.sweep(3.0)
+    assert (app.judge.miss, app.judge.extra) == (1, 0)   # 只有沒按的 60
+
+def test_set_song_prepares_unprepared_song(app):
+    song = Song.from_notes([Note(60, 1.0, 1.5, 90, channel=0)])
+    app.set_song(song)
+    assert song.judge is app.judge and song.density is not None
+    assert app.judge.press(60, 1.0) == "perfect"
@@ -0,0 +1,55 @@
+"""midi.writer：寫出再用 parse_midi 讀回，每個 (track, pitch) 的音在一個 tick 內對得上。"""
+import random
+from collections import defaultdict
+import pytest
+from midi.parser import parse_midi
+from midi.tempo import TempoMap
+from midi.writer import write_notes_midi
+from notes.model import Note
+
+pytest.importorskip("mido")
+
+TPB = 480
+
+def _notes(seed=7, voices=12, per_voice=200):
+    """每個聲部一個 (track, channel)，聲部內音不重疊（writer 的前提）。"""
+    rng = random.Random(seed)
+    out = []
+    for v in range(voices):
+        t = rng.uniform(0.0, 0.3)
+        for _ in range(per_voice):
+            dur = rng.choice((0.0, rng.uniform(0.01, 0.6)))
+            out.append(Note(pitch=rng.randint(21, 108), start=t, end=t + dur, velocity=rng.randint(1, 127),
+                            channel=v % 16, track=v % 4))
+            t += dur + rng.uniform(0.0, 0.08)
+    return out
+
+def _by_pitch(notes, tmap):
+    out = defaultdict(list)
+    on, off = tmap.secs_to_ticks([n.start for n in notes]), tmap.secs_to_ticks([n.end for n in notes])
+    for n, a, b in zip(notes, on, off):
+        out[(n.track, n.channel, n.pitch)].append((a, b, n.velocity))
+    return {k: sorted(v) for k, v in out.items()}
+
+def _assert_round_trip(notes, tmap, path, names=None):
+    write_notes_midi(str(path), notes, tmap, track_names=names)
+    parsed = parse_midi(str(path))
+    assert parsed.tempo_map == tmap
+    assert parsed.track_names == (names or {})
+    want, got = _by_pitch(notes, tmap), _by_pitch(parsed.notes, tmap)
+    assert want.keys() == got.keys()
+    for k in want:
+        assert len(want[k]) == len(got[k]), k
+        for (a0, b0, v0), (a1, b1, v1) in zip(want[k], got[k]):
+            assert abs(a0 - a1) <= 1 and abs(b0 - b1) <= 1 and v0 == v1, k
+
+def test_round_trip_with_tempo_changes(tmp_path):
+    notes = _notes()
+    rng = random.Random(3)
+    tmap = TempoMap(TPB, [(i * 1_000 + rng.randint(0, 999), rng.randint(250_000, 1_000_000)) for i in range(1, 60)])
+    _assert_round_trip(notes, tmap, tmp_path / "rt.mid", names={0: "Piano", 2: "Strings"})
+
+def test_zero_length_note_sharing_onset_and_pitch(tmp_path):
+    notes = [Note(60, 1.0, 1.0, 50, 0), Note(60, 1.0, 2.0, 90, 0),   # 零長度 + 同 onset 的一般音
+             Note(62, 1.0, 1.0, 40, 0), Note(62, 1.0, 1.0, 41, 0)]   # 兩個零長度
+    _assert_round_trip(notes, TempoMap(TPB, [(480, 400_000)]), tmp_path / "zero.mid")
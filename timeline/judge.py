@@ -0,0 +1,106 @@
+# timeline/judge.py
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+from notes.model import Note
+
+PERFECT_S = 0.050   # |誤差| <= 50ms
+GOOD_S = 0.120      # |誤差| <= 120ms，超過即 miss
+
+class Judge:
+    """
+    練習模式判定：載入時為每個 pitch 建好已排序的 onset 陣列，
+    每次按鍵 = 該 pitch 陣列上的二分搜尋 + 指標前進，不掃 notes_sorted。
+    沒被按到的音由 sweep() 依全域 onset 順序補記 miss。
+    分軌靜音 / 獨奏只換遮罩（set_enabled），不重建陣列。
+    """
+    def __init__(self, notes_sorted: List[Note], groups: bytes = b""):
+        """groups：與 notes_sorted 平行的分組 id（Song.track_ids），set_enabled 以它選要判定的音。"""
+        self.onsets = [array('d') for _ in range(128)]
+        self._g_pitch = bytearray()   # notes_sorted 順序 -> pitch
+        self._g_local = array('l')    # notes_sorted 順序 -> 在該 pitch 陣列中的位置
+        self._g_start = array('d')
+        self._groups = [bytearray() for _ in range(128)]   # 與 onsets 平行的分組 id
+        for i, n in enumerate(notes_sorted):
+            if not (0 <= n.pitch < 128): continue
+            ons = self.onsets[n.pitch]
+            self._groups[n.pitch].append(groups[i] if groups else 0)
+            self._g_pitch.append(n.pitch)
+            self._g_local.append(len(ons))
+            self._g_start.append(n.start)
+            ons.append(n.start)
+        self.done = [bytearray(len(o)) for o in self.onsets]  # 已判定（命中或 miss）
+        self._skip: Optional[List[bytes]] = None   # 各 pitch：1 = 不判定（reset 時當作已判定）
+        self.ptr = array('l', [0] * 128)
+        self._g_ptr = 0
+        self.perfect = self.good = self.miss = self.extra = 0
+        self.last_grade: Optional[str] = None
+
+    def set_enabled(self, lut: Optional[bytes]):
+        """
+        lut：256 bytes 的對照表，分組 id -> 1 判定 / 0 不判定（例如靜音的 track）；None = 全部判定。
+        下一次 reset() 起生效。每個 pitch 一次 bytes.translate，不跑逐音的 Python 迴圈。
+        """
+        if lut is None:
+            self._skip = None; return
+        off = bytes(0 if v else 1 for v in lut)
+        self._skip = [g.translate(off) for g in self._groups]
+
+    def reset(self, t: float = 0.0):
+        """從時間 t 重新計分（切換練習模式、跳轉或換遮罩時）。"""
+        skip = self._skip
+        for p in range(128):
+            d = self.done[p]
+            d[:] = skip[p] if skip is not None else bytes(len(d))
+            self.ptr[p] = bisect_left(self.onsets[p], t - GOOD_S)
+        self._g_ptr = bisect_left(self._g_start, t - GOOD_S)
+        self.perfect = self.good = self.miss = self.extra = 0
+        self.last_grade = None
+
+    def press(self, pitch: int, t: float) -> Optional[str]:
+        """回傳 'perfect' / 'good'；視窗內沒有可判定的音則記為多按並回傳 None。"""
+        if not (0 <= pitch < 128):
+            return None
+        ons, done = self.onsets[pitch], self.done[pitch]
+        i, n = self.ptr[pitch], len(ons)
+        lo = t - GOOD_S
+        if i < n and ons[i] < lo:
+            i = bisect_left(ons, lo, i, n)   # 過期未按的音交給 sweep 記 miss
+        while i < n and done[i]:
+            i += 1
+        self.ptr[pitch] = i
+        if i >= n or ons[i] > t + GOOD_S:
+            self.extra += 1
+            return None
+        done[i] = 1
+        if abs(ons[i] - t) <= PERFECT_S:
+            self.perfect += 1; grade = "perfect"
+        else:
+            self.good += 1; grade = "good"
+        while i < n and done[i]:
+            i += 1
+        self.ptr[pitch] = i
+        self.last_grade = grade
+        return grade
+
+    def sweep(self, t: float):
+        """把 onset 早於 t - GOOD_S 且沒被按到的音記為 miss。"""
+        lim = t - GOOD_S
+        g, n = self._g_ptr, len(self._g_start)
+        while g < n and self._g_start[g] < lim:
+            p = self._g_pitch[g]; k = self._g_local[g]
+            if not self.done[p][k]:
+                self.done[p][k] = 1
+                self.miss += 1
+                self.last_grade = "miss"
+            g += 1
+        self._g_ptr = g
+
+    @property
+    def judged(self) -> int:
+        return self.perfect + self.good + self.miss
+
+    @property
+    def accuracy(self) -> float:
+        j = self.judged
+        return (self.perfect + 0.5 * self.good) / j if j else 1.0
@@ -0,0 +1,99 @@
+# ui/calibration.py
+import pygame, statistics
+from typing import List, Optional, Tuple
+from audio.latency import CLICK_PITCH
+
+class LatencyCalibration:
+    """
+    音源延遲校正（F7）：每 interval_ms 由音源發一個 click，使用者跟著「聽到的」聲音按空白鍵或滑鼠。
+    偏移 = 按下時間 - click 送出時間 的中位數（前 warmup 拍不計、離最近 click 超過半拍的不算）。
+    Enter 套用並存檔、R 重來、Esc 取消；結果放在 result_ms 由 App 取用。
+    """
+    def __init__(self, screen_size: Tuple[int, int], synth, device: str, current_ms: float = 0.0,
+                 clicks: int = 16, interval_ms: int = 600, warmup: int = 4):
+        self.w, self.h = screen_size
+        self.synth, self.device, self.current_ms = synth, device, current_ms
+        self.clicks, self.interval_ms, self.warmup = clicks, interval_ms, warmup
+
+        self.active = True
+        self.finished = False
+        self.cancelled = False
+        self.result_ms: Optional[float] = None
+
+        self.font = pygame.font.SysFont("consolas", 16)
+        self.font_big = pygame.font.SysFont("consolas", 28, bold=True)
+        self.panel = pygame.Rect((self.w - 560) // 2, (self.h - 220) // 2, 560, 220)
+        self._restart()
+
+    def _restart(self):
+        self._sent: List[int] = []    # click 實際送出時的 get_ticks
+        self._taps: List[int] = []
+        self._next = pygame.time.get_ticks() + 1000   # 1 秒後開始
+        self._tok = None; self._off_at = 0
+
+    # ---- 估計 ----
+    @property
+    def offsets(self) -> List[int]:
+        out, half, sent = [], self.interval_ms // 2, self._sent
+        for tap in self._taps:
+            near = min(sent, key=lambda s: abs(tap - s), default=None)
+            if near is None or abs(tap - near) > half or sent.index(near) < self.warmup: continue
+            out.append(tap - near)
+        return out
+
+    @property
+    def estimate_ms(self) -> Optional[float]:
+        offs = self.offsets
+        return float(statistics.median(offs)) if len(offs) >= 4 else None
+
+    @property
+    def done(self) -> bool:
+        return len(self._sent) >= self.clicks and pygame.time.get_ticks() > self._sent[-1] + self.interval_ms // 2
+
+    # ---- 事件 ----
+    def handle_event(self, e: pygame.event.Event):
+        if not self.active: return
+        if e.type == pygame.KEYDOWN:
+            if e.key == pygame.K_ESCAPE:
+                self.cancelled = True; self.active = False
+            elif e.key in (pygame.K_RETURN, pygame.K_KP_ENTER) and self.done and self.estimate_ms is not None:
+                self.result_ms = self.estimate_ms; self.finished = True; self.active = False
+            elif e.key == pygame.K_r:
+                self._restart()
+            elif e.key == pygame.K_SPACE:
+                self._taps.append(e.t_ms)
+        elif e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
+            self._taps.append(e.t_ms)
+
+    def update(self, dt: float):
+        now = pygame.time.get_ticks()
+        if self._tok is not None and now >= self._off_at:
+            self.synth.note_off_token(self._tok); self._tok = None
+        if len(self._sent) < self.clicks and now >= self._next:
+            self._tok = self.synth.note_on(CLICK_PITCH, 110)
+            self._sent.append(pygame.time.get_ticks())
+            self._next += self.interval_ms; self._off_at = now + 80
+
+    def close(self):
+        if self._tok is not None:
+            self.synth.note_off_token(self._tok); self._tok = None
+
+    # ---- 繪製 ----
+    def draw(self, surface: pygame.Surface):
+        p = self.panel
+        pygame.draw.rect(surface, (30, 32, 36), p, border_radius=8)
+        pygame.draw.rect(surface, (85, 88, 96), p, 1, border_radius=8)
+        x, y = p.x + 20, p.y + 16
+        est = self.estimate_ms
+        lines = [
+            f"Latency calibration — {self.device}",
+            "Tap SPACE (or click) on each click you HEAR",
+            f"Clicks {len(self._sent)}/{self.clicks}   taps counted {len(self.offsets)}   "
+            f"current {self.current_ms:+.0f} ms",
+        ]
+        for i, text in enumerate(lines):
+            surface.blit(self.font.render(text, True, (230, 230, 235)), (x, y + i * 24))
+        big = f"{est:+.0f} ms" if est is not None else "—"
+        surface.blit(self.font_big.render(big, True, (255, 184, 107)), (x, y + 88))
+        hint = "Enter: apply  R: retry  Esc: cancel" if self.done else "R: retry  Esc: cancel"
+        surface.blit(self.font.render(hint, True, (160, 160, 170)), (x, p.bottom - 32))
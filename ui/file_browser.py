@@ -0,0 +1,340 @@
+# ui/file_browser.py
+"""
+pygame 內建的檔案瀏覽器（取代每次開關一個 tkinter.Tk 的系統對話框）：
+- DirLister：背景執行緒列目錄，依目錄 mtime 快取；再次進入時先顯示快取、背景重驗
+  （目錄 mtime 沒變時仍逐一重新 stat 檔案：原地覆寫檔案不會改目錄 mtime）
+- MetaCache：MIDI 的長度 / 音符數，存在各目錄的 .pidx-meta.json（以檔案大小 + mtime 判斷是否過期）；
+  只替畫面上看得到的列計算，上千個檔案的資料夾也不會一次全部掃
+- FileBrowser：虛擬化清單（只畫可見列），方向鍵 / 滾輪 / 打字篩選，Enter 選取、Backspace 上一層、Esc 取消
+"""
+import json, os, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+import pygame
+
+SIDECAR = ".pidx-meta.json"
+ROW_H = 24
+DOUBLE_CLICK_MS = 400
+
+class Entry(NamedTuple):
+    name: str
+    is_dir: bool
+    size: int
+    mtime_ns: int
+
+def _scan(path: str) -> List[Entry]:
+    out: List[Entry] = []
+    with os.scandir(path) as it:
+        for de in it:
+            if de.name.startswith("."): continue
+            try:
+                st = de.stat()
+                out.append(Entry(de.name, de.is_dir(), st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+    out.sort(key=lambda e: (not e.is_dir, e.name.casefold()))
+    return out
+
+def _restat(path: str, entries: List[Entry]) -> Optional[List[Entry]]:
+    """目錄沒增減時，檔案的大小 / mtime 仍可能變（原地覆寫）；有變回傳新清單，否則 None。"""
+    out, changed = [], False
+    for e in entries:
+        if not e.is_dir:
+            try:
+                st = os.stat(os.path.join(path, e.name))
+            except OSError:
+                return _scan(path)   # 途中被刪掉：整個重列
+            if st.st_size != e.size or st.st_mtime_ns != e.mtime_ns:
+                e, changed = e._replace(size=st.st_size, mtime_ns=st.st_mtime_ns), True
+        out.append(e)
+    return out if changed else None
+
+class DirLister:
+    def __init__(self):
+        self._cache: Dict[str, Tuple[int, List[Entry]]] = {}   # 目錄 -> (mtime_ns, entries)
+        self._errors: Dict[str, str] = {}
+        self._busy: Set[str] = set()
+        self._lock = threading.Lock()
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dirlist")
+
+    def request(self, path: str):
+        """背景重驗 path：目錄 mtime 沒變就沿用快取。"""
+        with self._lock:
+            if path in self._busy: return
+            self._busy.add(path)
+        self._ex.submit(self._load, path)
+
+    def _load(self, path: str):
+        try:
+            mt = os.stat(path).st_mtime_ns
+            hit = self._cache.get(path)
+            entries = _scan(path) if hit is None or hit[0] != mt else _restat(path, hit[1])
+            if entries is not None:
+                with self._lock:
+                    self._cache[path] = (mt, entries); self._errors.pop(path, None)
+        except OSError as e:
+            with self._lock:
+                self._errors[path] = e.strerror or str(e)
+        finally:
+            with self._lock:
+                self._busy.discard(path)
+
+    def peek(self, path: str) -> Tuple[Optional[List[Entry]], Optional[str]]:
+        with self._lock:
+            hit = self._cache.get(path)
+            return (hit[1] if hit else None), self._errors.get(path)
+
+class MetaCache:
+    def __init__(self):
+        self._dirs: Dict[str, Dict[str, list]] = {}   # 目錄 -> {檔名: [size, mtime_ns, 秒數, 音符數]}
+        self._dirty: Set[str] = set()
+        self._want: List[Tuple[str, Entry]] = []
+        self._cv = threading.Condition()
+        threading.Thread(target=self._run, name="midi-meta", daemon=True).start()
+
+    def get(self, d: str, e: Entry) -> Optional[Tuple[float, int]]:
+        m = self._dirs.get(d, {}).get(e.name)
+        if m is not None and m[0] == e.size and m[1] == e.mtime_ns:
+            return m[2], m[3]
+        return None
+
+    def want(self, items: List[Tuple[str, Entry]]):
+        """換成這一批（畫面上可見、還沒有資料的列）；舊的請求作廢。"""
+        with self._cv:
+            self._want = items
+            self._cv.notify()
+
+    def _load_dir(self, d: str):
+        if d in self._dirs: return
+        data: Dict[str, list] = {}
+        try:
+            with open(os.path.join(d, SIDECAR), encoding="utf-8") as f:
+                data = {k: v for k, v in json.load(f).items() if isinstance(v, list) and len(v) == 4}
+        except (OSError, ValueError):
+            pass
+        self._dirs[d] = data
+
+    def _flush(self):
+        for d in list(self._dirty):
+            self._dirty.discard(d)
+            try:
+                tmp = os.path.join(d, SIDECAR + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._dirs[d], f, ensure_ascii=False)
+                os.replace(tmp, os.path.join(d, SIDECAR))
+            except OSError:
+                pass   # 唯讀目錄：只留在記憶體
+
+    def _run(self):
+        from midi.smf import SmfIndex
+        while True:
+            with self._cv:
+                while not self._want:
+                    if self._dirty:
+                        break
+                    self._cv.wait()
+                item = self._want.pop(0) if self._want else None
+            if item is None:
+                self._flush(); continue
+            d, e = item
+            self._load_dir(d)
+            if self.get(d, e) is not None: continue
+            try:
+                idx = SmfIndex(os.path.join(d, e.name))
+                try:
+                    meta = [e.size, e.mtime_ns, round(idx.total, 3), idx.n_notes]
+                finally:
+                    idx.close()
+            except Exception:
+                meta = [e.size, e.mtime_ns, -1.0, -1]   # 讀不了的檔案也記下來，不要每次重試
+            self._dirs[d][e.name] = meta
+            self._dirty.add(d)
+
+_LISTER: Optional[DirLister] = None
+_META: Optional[MetaCache] = None
+
+def _shared() -> Tuple[DirLister, MetaCache]:
+    """整個程式共用一份（關掉瀏覽器後快取仍在，下次開啟立即顯示）。"""
+    global _LISTER, _META
+    if _LISTER is None:
+        _LISTER, _META = DirLister(), MetaCache()
+    return _LISTER, _META
+
+def _fmt_dur(s: float) -> str:
+    return "--:--" if s < 0 else f"{int(s // 60)}:{int(s % 60):02d}"
+
+class FileBrowser:
+    def __init__(self, screen_size: Tuple[int, int], title: str, start_dir: str,
+                 exts: Sequence[str] = (".mid", ".midi"), save: bool = False, default_name: str = ""):
+        self.w, self.h = screen_size
+        self.title, self.exts, self.save = title, tuple(e.lower() for e in exts), save
+        self.lister, self.meta = _shared()
+
+        self.active = True
+        self.finished = False
+        self.cancelled = False
+        self.result_path: Optional[str] = None
+
+        self.filter = ""
+        self.name = default_name          # 存檔模式的檔名欄
+        self._confirm: Optional[str] = None   # 覆寫確認中的路徑
+        self.sel = 0
+        self.top = 0
+        self._entries: Optional[List[Entry]] = None
+        self._view: List[Entry] = []
+        self._view_key = None
+        self._error: Optional[str] = None
+        self._last_click = (-1, 0)
+
+        self.panel = pygame.Rect(int(self.w * 0.08), int(self.h * 0.08), int(self.w * 0.84), int(self.h * 0.84))
+        self.list_rect = pygame.Rect(self.panel.x + 12, self.panel.y + 84,
+                                     self.panel.w - 24, self.panel.h - 84 - (56 if save else 32))
+        self.rows = max(1, self.list_rect.h // ROW_H)
+        self.font = pygame.font.SysFont("consolas", 16)
+        self.font_small = pygame.font.SysFont("consolas", 14)
+        self._glyphs: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self.cwd = ""
+        self.navigate(start_dir if os.path.isdir(start_dir) else os.getcwd())
+
+    # ---- 目錄 ----
+    def navigate(self, path: str):
+        self.cwd = os.path.abspath(path)
+        self.filter, self.sel, self.top = "", 0, 0
+        self._entries, self._view_key, self._confirm = None, None, None
+        self.lister.request(self.cwd)
+
+    def _visible_ok(self, e: Entry) -> bool:
+        return e.is_dir or e.name.lower().endswith(self.exts)
+
+    def _refresh_view(self):
+        entries, self._error = self.lister.peek(self.cwd)
+        if self._view_key is not None and entries is self._entries and self.filter == self._view_key: return
+        self._view_key, self._entries = self.filter, entries
+        f = self.filter.casefold()
+        self._view = [e for e in (entries or ()) if self._visible_ok(e) and f in e.name.casefold()]
+        self.sel = min(self.sel, max(0, len(self._view) - 1))
+        self._scroll_to_sel()
+
+    def _scroll_to_sel(self):
+        if self.sel < self.top: self.top = self.sel
+        elif self.sel >= self.top + self.rows: self.top = self.sel - self.rows + 1
+        self.top = max(0, min(self.top, max(0, len(self._view) - self.rows)))
+
+    # ---- 選取 ----
+    def _choose(self):
+        e = self._view[self.sel] if self._view else None
+        if e is not None and e.is_dir and not (self.save and self.name.strip()):
+            self.navigate(os.path.join(self.cwd, e.name)); return
+        if self.save:
+            name = self.name.strip()
+            if not name: return
+            if not name.lower().endswith(self.exts): name += self.exts[0]
+            path = os.path.join(self.cwd, name)
+            if os.path.exists(path) and self._confirm != path:
+                self._confirm = path; return   # 再按一次 Enter 才覆寫
+            self._done(path)
+        elif e is not None:
+            self._done(os.path.join(self.cwd, e.name))
+
+    def _done(self, path: str):
+        self.result_path, self.finished, self.active = path, True, False
+
+    # ---- 事件 ----
+    def handle_event(self, e: pygame.event.Event):
+        if not self.active: return
+        if e.type == pygame.KEYDOWN:
+            k = e.key
+            if k == pygame.K_ESCAPE:
+                self.cancelled, self.active = True, False
+            elif k in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                self._choose()
+            elif k == pygame.K_BACKSPACE:
+                text = self.name if self.save else self.filter
+                if text:
+                    text = text[:-1]
+                    if self.save: self.name, self._confirm = text, None
+                    else: self.filter = text
+                else:
+                    self.navigate(os.path.dirname(self.cwd))
+            elif k in (pygame.K_UP, pygame.K_DOWN, pygame.K_PAGEUP, pygame.K_PAGEDOWN, pygame.K_HOME, pygame.K_END):
+                step = {pygame.K_UP: -1, pygame.K_DOWN: 1, pygame.K_PAGEUP: -self.rows, pygame.K_PAGEDOWN: self.rows,
+                        pygame.K_HOME: -len(self._view), pygame.K_END: len(self._view)}[k]
+                self.sel = max(0, min(len(self._view) - 1, self.sel + step))
+                if self.save and self._view and not self._view[self.sel].is_dir:
+                    self.name, self._confirm = self._view[self.sel].name, None
+                self._scroll_to_sel()
+        elif e.type == pygame.TEXTINPUT:
+            if self.save: self.name, self._confirm = self.name + e.text, None
+            else: self.filter += e.text
+        elif e.type == pygame.MOUSEWHEEL:
+            self.top = max(0, min(self.top - e.y * 3, max(0, len(self._view) - self.rows)))
+        elif e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
+            if not self.panel.collidepoint(e.pos):
+                self.cancelled, self.active = True, False; return
+            if self.list_rect.collidepoint(e.pos):
+                i = self.top + (e.pos[1] - self.list_rect.y) // ROW_H
+                if i < len(self._view):
+                    now = pygame.time.get_ticks()
+                    double = self._last_click[0] == i and now - self._last_click[1] <= DOUBLE_CLICK_MS
+                    self.sel, self._last_click = i, (i, now)
+                    if self.save and not self._view[i].is_dir:
+                        self.name, self._confirm = self._view[i].name, None
+                    if double: self._choose()
+
+    def update(self, dt: float):
+        self._refresh_view()
+        want = [(self.cwd, e) for e in self._view[self.top:self.top + self.rows]
+                if not e.is_dir and self.meta.get(self.cwd, e) is None]
+        if want: self.meta.want(want)
+
+    def close(self):
+        self.meta.want([])
+
+    # ---- 繪製 ----
+    def _glyph(self, text: str, color, small: bool = False) -> pygame.Surface:
+        key = (text, color, small)
+        g = self._glyphs.get(key)
+        if g is None:
+            g = self._glyphs[key] = (self.font_small if small else self.font).render(text, True, color)
+            if len(self._glyphs) > 512: self._glyphs.popitem(last=False)
+        else:
+            self._glyphs.move_to_end(key)
+        return g
+
+    def draw(self, surface: pygame.Surface):
+        p, lr = self.panel, self.list_rect
+        pygame.draw.rect(surface, (30, 32, 36), p, border_radius=8)
+        pygame.draw.rect(surface, (85, 88, 96), p, 1, border_radius=8)
+        surface.blit(self._glyph(self.title, (230, 230, 235)), (p.x + 12, p.y + 10))
+        surface.blit(self._glyph(self.cwd, (160, 200, 255), True), (p.x + 12, p.y + 36))
+        hint = f"filter: {self.filter}_" if not self.save else "type a file name below; Enter to save"
+        surface.blit(self._glyph(hint, (160, 160, 170), True), (p.x + 12, p.y + 58))
+
+        clip = surface.get_clip(); surface.set_clip(lr)
+        view, meta, d = self._view, self.meta, self.cwd
+        right = lr.right - 8
+        for row, i in enumerate(range(self.top, min(len(view), self.top + self.rows))):
+            e, y = view[i], lr.y + row * ROW_H
+            if i == self.sel:
+                pygame.draw.rect(surface, (60, 70, 96), (lr.x, y, lr.w, ROW_H))
+            label = e.name + ("/" if e.is_dir else "")
+            surface.blit(self._glyph(label, (255, 220, 168) if e.is_dir else (230, 230, 235)), (lr.x + 8, y + 3))
+            if not e.is_dir:
+                m = meta.get(d, e)
+                info = "…" if m is None else ("unreadable" if m[1] < 0 else f"{m[1]:>9,d} notes  {_fmt_dur(m[0]):>6s}")
+                g = self._glyph(info, (150, 150, 160), True)
+                surface.blit(g, (right - g.get_width(), y + 5))
+        surface.set_clip(clip)
+
+        if len(view) > self.rows:   # 捲軸
+            h = max(16, lr.h * self.rows // len(view))
+            y = lr.y + (lr.h - h) * self.top // max(1, len(view) - self.rows)
+            pygame.draw.rect(surface, (85, 88, 96), (lr.right - 4, y, 4, h))
+        status = self._error or ("Loading…" if self._entries is None else f"{len(view)} items")
+        if self.save:
+            field = pygame.Rect(p.x + 12, p.bottom - 50, p.w - 24, 24)
+            pygame.draw.rect(surface, (46, 48, 54), field, border_radius=4)
+            surface.blit(self._glyph(self.name + "_", (230, 230, 235)), (field.x + 6, field.y + 3))
+            if self._confirm: status = "File exists — press Enter again to overwrite"
+        surface.blit(self._glyph(status, (160, 160, 170), True), (p.x + 12, p.bottom - 22))
@@ -1,8 +1,7 @@
 # ui/keymap_overlay.py
 import pygame
 from typing import Dict, Optional, Tuple
-
-WHITE_SET = {0, 2, 4, 5, 7, 9, 11}
+from render.keyboard import keyboard_geometry
 
 class KeymapOverlay:
     """Keymap 編輯器：新增 Save KM / Load KM 按鈕，透過旗標通知 App。"""
@@ -45,35 +44,32 @@ class KeymapOverlay:
         self.btn_done      = pygame.Rect(self.panel_x + self.panel_w - 200, self.panel_y + 20, 80, 30)
         self.btn_cancel    = pygame.Rect(self.panel_x + self.panel_w - 110, self.panel_y + 20, 80, 30)
 
-        self.white_keys: list[tuple[int, float, float]] = []
-        self.black_keys: list[tuple[int, float, float]] = []
         self._layout_keys()
 
         self.font       = pygame.font.SysFont("consolas", 16)
         self.font_small = pygame.font.SysFont("consolas", 14)
         self.font_bold  = pygame.font.SysFont("consolas", 16, bold=True)
 
+        # 繪製快取
+        self._static: Optional[pygame.Surface] = None
+        self._dynamic: Optional[pygame.Surface] = None
+        self._dyn_rect = pygame.Rect(self.panel_x + 1, self.panel_y + 52,
+                                     self.panel_w - 2, self.piano_y1 + 4 - (self.panel_y + 52))
+        self._dyn_sel: Tuple[Optional[int], bool] = (None, False)
+        self._dyn_km: Dict[int, int] = {}
+        self._glyphs: Dict[int, pygame.Surface] = {}   # keycode -> 已 render 的標籤
+
     # ---- 幾何 ----
     def _layout_keys(self):
-        total_white = sum(1 for p in range(self.first_midi, self.last_midi + 1) if (p % 12) in WHITE_SET)
-        white_w = self.piano_w / max(1, total_white)
-        x = self.piano_x0
-        for p in range(self.first_midi, self.last_midi + 1):
-            if (p % 12) in WHITE_SET:
-                self.white_keys.append((p, x, x + white_w))
-                x += white_w
-        idx_white = 0
-        for p in range(self.first_midi, self.last_midi + 1):
-            pc = p % 12
-            if pc in WHITE_SET:
-                if pc in {0, 2, 5, 7, 9} and idx_white + 1 < len(self.white_keys):
-                    left_x0 = self.white_keys[idx_white][1]
-                    right_x0 = self.white_keys[idx_white + 1][1]
-                    ww = right_x0 - left_x0
-                    bx = left_x0 + ww * 0.7
-                    bw = ww * 0.6
-                    self.black_keys.append((p + 1, bx, bx + bw))
-                idx_white += 1
+        self.geom = keyboard_geometry(self.first_midi, self.last_midi, float(self.piano_w), float(self.piano_x0))
+        self.white_keys = self.geom.white_keys
+        self.black_keys = self.geom.black_keys
+        # pitch -> 標籤中心點（黑鍵在上方、白鍵在下緣）
+        self._anchors: list = [None] * 128
+        for p, x0, x1 in self.white_keys:
+            self._anchors[p] = ((x0 + x1) / 2, self.piano_y1 - 16)
+        for p, x0, x1 in self.black_keys:
+            self._anchors[p] = ((x0 + x1) / 2, self.piano_y0 - 10)
 
     # ---- 事件 ----
     def handle_event(self, e: pygame.event.Event):
@@ -97,14 +93,10 @@ class KeymapOverlay:
                 self.cancelled = True; self.active = False; return
 
             # 點擊琴鍵
-            if self.piano_y0 <= my <= self.piano_y0 + self.black_h:
-                for p, x0, x1 in self.black_keys:
-                    if x0 <= mx <= x1:
-                        self.selected_pitch = p; self.waiting_key = True; return
             if self.piano_y0 <= my <= self.piano_y1:
-                for p, x0, x1 in self.white_keys:
-                    if x0 <= mx <= x1:
-                        self.selected_pitch = p; self.waiting_key = True; return
+                p = self.geom.pitch_at(mx, my <= self.piano_y0 + self.black_h)
+                if p is not None:
+                    self.selected_pitch = p; self.waiting_key = True; return
 
         if e.type == pygame.KEYDOWN and self.waiting_key and self.selected_pitch is not None:
             self.kc_to_pitch[e.key] = self.selected_pitch
@@ -114,56 +106,77 @@ class KeymapOverlay:
     def update(self, dt: float): pass
 
     # ---- 繪製 ----
-    def draw(self, surface: pygame.Surface):
-        mask = pygame.Surface((self.w, self.h), pygame.SRCALPHA)
-        mask.fill((0, 0, 0, 140))
-        surface.blit(mask, (0, 0))
-
-        pygame.draw.rect(surface, (30, 32, 36),
+    # 靜態層（遮罩 + 面板 + 按鈕）只畫一次；動態層（提示 + 鍵盤 + 綁定標籤）在狀態改變時才重畫
+    def _build_static(self):
+        st = pygame.Surface((self.w, self.h), pygame.SRCALPHA)
+        st.fill((0, 0, 0, 140))
+        pygame.draw.rect(st, (30, 32, 36),
                          (self.panel_x, self.panel_y, self.panel_w, self.panel_h), border_radius=10)
-        pygame.draw.rect(surface, (80, 80, 90),
+        pygame.draw.rect(st, (80, 80, 90),
                          (self.panel_x, self.panel_y, self.panel_w, self.panel_h), 1, border_radius=10)
-
-        # 按鈕
-        self._draw_button(surface, self.btn_save, "Save KM")
-        self._draw_button(surface, self.btn_load, "Load KM")
-        self._draw_button(surface, self.btn_clear_sel, "Clear Selected")
-        self._draw_button(surface, self.btn_clear_all, "Clear All")
-        self._draw_button(surface, self.btn_done, "Done")
-        self._draw_button(surface, self.btn_cancel, "Cancel")
+        self._draw_button(st, self.btn_save, "Save KM")
+        self._draw_button(st, self.btn_load, "Load KM")
+        self._draw_button(st, self.btn_clear_sel, "Clear Selected")
+        self._draw_button(st, self.btn_clear_all, "Clear All")
+        self._draw_button(st, self.btn_done, "Done")
+        self._draw_button(st, self.btn_cancel, "Cancel")
+        self._static = st
+
+    def _glyph(self, kc: int) -> pygame.Surface:
+        g = self._glyphs.get(kc)
+        if g is None:
+            g = self._glyphs[kc] = self.font_bold.render(pygame.key.name(kc), True, (231, 76, 60))
+        return g
+
+    def _dyn_dirty(self) -> bool:
+        return (self._dynamic is None or self._dyn_sel != (self.selected_pitch, self.waiting_key)
+                or self._dyn_km != self.kc_to_pitch)
+
+    def _build_dynamic(self):
+        r = self._dyn_rect
+        if self._dynamic is None:
+            self._dynamic = pygame.Surface(r.size)
+        surf, ox, oy = self._dynamic, r.x, r.y
+        surf.fill((30, 32, 36))
 
         tip = "Click a piano key, then press a computer key to bind"
         if self.waiting_key and self.selected_pitch is not None:
             tip = f"Selected pitch {self.selected_pitch} — press a computer key…"
         txt = self.font.render(tip, True, (230, 230, 235))
-        surface.blit(txt, (self.panel_x + 16, self.panel_y + 58))
+        surf.blit(txt, (self.panel_x + 16 - ox, self.panel_y + 58 - oy))
 
         # 鍵盤
+        y0 = self.piano_y0 - oy
         for p, x0, x1 in self.white_keys:
             fill = (230, 230, 230) if self.selected_pitch != p else (255, 220, 168)
-            pygame.draw.rect(surface, fill, (x0, self.piano_y0, x1 - x0 - 1, self.white_h))
-            pygame.draw.rect(surface, (50, 50, 56), (x0, self.piano_y0, x1 - x0 - 1, self.white_h), 1)
+            pygame.draw.rect(surf, fill, (x0 - ox, y0, x1 - x0 - 1, self.white_h))
+            pygame.draw.rect(surf, (50, 50, 56), (x0 - ox, y0, x1 - x0 - 1, self.white_h), 1)
         for p, x0, x1 in self.black_keys:
             fill = (18, 18, 20) if self.selected_pitch != p else (255, 184, 107)
-            pygame.draw.rect(surface, fill, (x0, self.piano_y0, x1 - x0, self.black_h))
-            pygame.draw.rect(surface, (60, 60, 66), (x0, self.piano_y0, x1 - x0, self.black_h), 1)
+            pygame.draw.rect(surf, fill, (x0 - ox, y0, x1 - x0, self.black_h))
+            pygame.draw.rect(surf, (60, 60, 66), (x0 - ox, y0, x1 - x0, self.black_h), 1)
 
         # 綁定標籤
         for kc, pitch in self.kc_to_pitch.items():
-            name = pygame.key.name(kc)
             cx, cy = self._label_anchor(pitch)
             if cx is not None:
-                text = self.font_bold.render(name, True, (231, 76, 60))
-                surface.blit(text, (cx - text.get_width()/2, cy - text.get_height()/2))
+                text = self._glyph(kc)
+                surf.blit(text, (cx - ox - text.get_width()/2, cy - oy - text.get_height()/2))
+
+        self._dyn_sel = (self.selected_pitch, self.waiting_key)
+        self._dyn_km = dict(self.kc_to_pitch)
+
+    def draw(self, surface: pygame.Surface):
+        if self._static is None:
+            self._build_static()
+        if self._dyn_dirty():
+            self._build_dynamic()
+        surface.blit(self._static, (0, 0))
+        surface.blit(self._dynamic, self._dyn_rect.topleft)
 
     def _label_anchor(self, pitch: int) -> Tuple[Optional[float], Optional[float]]:
-        for p, x0, x1 in self.black_keys:
-            if p == pitch:
-                return (x0 + x1) / 2, self.piano_y0 - 10
-        for p, x0, x1 in self.white_keys:
-            if p == pitch:
-                return (x0 + x1) / 2, self.piano_y1 - 16
-        return None, None
+        a = self._anchors[pitch] if 0 <= pitch < 128 else None
+        return a if a is not None else (None, None)
 
     def _clear_selected(self):
         if self.selected_pitch is None: return
@@ -0,0 +1,103 @@
+# utils/asynclog.py
+"""
+非同步 logging：
+- 呼叫端（render 執行緒）只把 LogRecord 丟進有上限的佇列，不碰磁碟；佇列滿了就丟棄並計數，永不阻塞
+- 背景 QueueListener 執行緒負責寫 console / 檔案
+- RateLimitFilter 依呼叫位置（檔案 + 行號）限流 WARNING 以下的訊息（熱路徑的 debug / info），
+  被壓下的筆數會在下一筆放行時與結束時彙總；WARNING / ERROR / logging.exception 一律放行
+"""
+import atexit, logging, multiprocessing, queue, threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+class RateLimitFilter(logging.Filter):
+    """每個呼叫位置在 window 秒內最多放行 burst 筆；levelno >= max_level 的不限流。"""
+    def __init__(self, burst: int = 5, window: float = 5.0, max_level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_level = max_level
+        self._sites: Dict[tuple, list] = {}   # (pathname, lineno) -> [window_start, passed, suppressed, total_suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.max_level:
+            return True   # 錯誤路徑重複出錯也要看得到
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            st = self._sites.get(key)
+            if st is None:
+                self._sites[key] = [now, 1, 0, 0]
+                return True
+            if now - st[0] >= self.window:
+                suppressed = st[2]
+                st[0], st[1], st[2] = now, 1, 0
+                if suppressed:
+                    record.msg = f"{record.msg} [suppressed {suppressed} similar messages]"
+                return True
+            if st[1] < self.burst:
+                st[1] += 1
+                return True
+            st[2] += 1
+            st[3] += 1
+            return False
+
+    def summary(self) -> List[str]:
+        with self._lock:
+            return [f"{path}:{line} suppressed {st[3]} messages"
+                    for (path, line), st in self._sites.items() if st[3]]
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+_qhandler: Optional[_NonBlockingQueueHandler] = None
+_limiter: Optional[RateLimitFilter] = None
+
+def setup_async_logging(handlers: List[logging.Handler], level: int = logging.DEBUG,
+                        max_queue: int = 10000, burst: int = 5, window: float = 5.0):
+    """把 root logger 換成 QueueHandler；handlers 在背景執行緒輸出。"""
+    global _listener, _qhandler, _limiter
+    if _listener is not None:
+        return
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue)
+    _limiter = RateLimitFilter(burst=burst, window=window)
+    _qhandler = _NonBlockingQueueHandler(q)
+    _qhandler.addFilter(_limiter)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_qhandler)
+    _listener = QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_async_logging)
+
+def shutdown_async_logging():
+    """輸出限流 / 丟棄彙總後停止背景執行緒（會把佇列剩下的寫完）。"""
+    global _listener
+    if _listener is None:
+        return
+    lines = _limiter.summary() if _limiter else []
+    if _qhandler is not None and _qhandler.dropped:
+        lines.append(f"log queue full: dropped {_qhandler.dropped} records")
+    for line in lines:
+        # 直接交給 handlers（限流 filter 不該再擋彙總）
+        _listener.queue.put(logging.LogRecord("logging", logging.INFO, __file__, 0, line, None, None))
+    _listener.stop()
+    _listener = None
+
+def pool_context():
+    """
+    ProcessPoolExecutor 用的 multiprocessing context：一律 spawn。
+    fork 會在 QueueListener（及其他背景執行緒）可能正拿著 handler / 佇列鎖時複製行程，子行程一用就卡死；
+    spawn 的子行程從頭 import，不繼承任何鎖（Windows / macOS 本來就是 spawn）。
+    """
+    return multiprocessing.get_context("spawn")
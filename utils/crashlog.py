@@ -1,5 +1,6 @@
 # utils/crashlog.py
 import os, sys, faulthandler, datetime, traceback, threading
+from utils.flightrec import FLIGHT, start_watchdog
 
 _fault_file = None
 
@@ -27,6 +28,7 @@ def setup_crashlog():
                 out.write("UNCAUGHT EXCEPTION\n")
                 out.write("=" * 60 + "\n")
                 traceback.print_exception(exc_type, exc, tb, file=out)
+                FLIGHT.dump(out)
         finally:
             sys.__excepthook__(exc_type, exc, tb)
     sys.excepthook = _hook
@@ -49,6 +51,7 @@ def setup_crashlog():
                         traceback.print_exception(type(exc), exc, exc.__traceback__, file=out)
                     else:
                         out.write(str(msg))
+                    FLIGHT.dump(out)
             finally:
                 loop.default_exception_handler(context)
         loop.set_exception_handler(_async_handler)
@@ -60,3 +63,16 @@ def log_exception(title: str, exc: BaseException):
         out.write(f"[{title}] {type(exc).__name__}: {exc}\n")
         out.write("Traceback:\n")
         out.write("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+        FLIGHT.dump(out)
+
+def _dump_freeze(stalled: float):
+    with open(_new_log_path("freeze"), "w", encoding="utf-8") as out:
+        out.write(f"MAIN LOOP STALLED for {stalled:.1f}s\n")
+        out.write("=" * 60 + "\n")
+        out.flush()
+        faulthandler.dump_traceback(out, all_threads=True)
+        FLIGHT.dump(out)
+
+def start_freeze_watchdog(timeout: float = 5.0):
+    """主迴圈超過 timeout 秒沒有 flightrec.heartbeat() 就寫 freeze-*.txt（所有執行緒堆疊 + 飛行記錄）。"""
+    return start_watchdog(_dump_freeze, timeout=timeout)
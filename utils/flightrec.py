@@ -0,0 +1,91 @@
+# utils/flightrec.py
+"""
+飛行記錄器：固定大小的環狀緩衝，記錄最近的結構化事件（載入、切歌、note on/off、frame 時間、模式切換…），
+當機 / 卡住時由 utils.crashlog 寫進 crash 檔，用來還原當時在做什麼。
+
+記錄路徑不加鎖：序號取自 itertools.count（CPython 下 next() 為原子操作），
+各執行緒寫不同格子。寫入時先把該格序號設成 -1、欄位寫完再填序號；snapshot() 複製欄位前後各讀一次序號，
+不一致（讀的途中被覆寫）就丟掉那一列。只有兩個執行緒同時寫同一格（序號相差整整 size）時還可能混到。
+"""
+import itertools, time, threading
+from typing import List, Optional, TextIO
+
+class FlightRecorder:
+    def __init__(self, size: int = 4096):
+        n = 1
+        while n < size: n <<= 1
+        self.size = n
+        self._mask = n - 1
+        self._seq = itertools.count()
+        self._n = [-1] * n
+        self._t = [0.0] * n
+        self._kind: List[str] = [""] * n
+        self._a: list = [None] * n
+        self._b: list = [None] * n
+        self.enabled = True
+
+    def record(self, kind: str, a=None, b=None):
+        if not self.enabled: return
+        s = next(self._seq)
+        i = s & self._mask
+        self._n[i] = -1  # 寫入中
+        self._t[i] = time.perf_counter()
+        self._kind[i] = kind
+        self._a[i] = a
+        self._b[i] = b
+        self._n[i] = s   # 最後寫序號：dump 時序號對得上才算完整
+
+    def snapshot(self) -> list[tuple[int, float, str, object, object]]:
+        rows = []
+        n = self._n
+        for i in range(self.size):
+            s = n[i]
+            if s < 0: continue
+            row = (s, self._t[i], self._kind[i], self._a[i], self._b[i])
+            if n[i] == s:   # 複製途中沒被改寫
+                rows.append(row)
+        rows.sort()
+        return rows
+
+    def dump(self, out: TextIO, title: str = "FLIGHT RECORDER"):
+        rows = self.snapshot()
+        out.write(f"\n{title} (last {len(rows)} events, newest last)\n")
+        out.write("=" * 60 + "\n")
+        if not rows: return
+        t_last = rows[-1][1]
+        for s, t, kind, a, b in rows:
+            extra = "" if b is None else f" {b!r}"
+            out.write(f"#{s:<8d} {t - t_last:+10.4f}s  {kind:<12s} {a!r}{extra}\n")
+
+FLIGHT = FlightRecorder()
+record = FLIGHT.record
+
+# ---- 卡住偵測：主迴圈每 frame 呼叫 heartbeat()，太久沒心跳就 dump ----
+_last_beat: Optional[float] = None   # None = 未啟用（例如開著檔案對話框時）
+
+def heartbeat():
+    global _last_beat
+    _last_beat = time.perf_counter()
+
+def pause_watchdog():
+    """預期會阻塞主執行緒的操作（檔案對話框等）前呼叫；下一次 heartbeat() 自動恢復。"""
+    global _last_beat
+    _last_beat = None
+
+def start_watchdog(on_freeze, timeout: float = 5.0, poll: float = 1.0) -> threading.Thread:
+    """on_freeze(stalled_seconds) 在每次卡住時呼叫一次（恢復心跳後可再次觸發）。"""
+    def _run():
+        fired = False
+        while True:
+            time.sleep(poll)
+            beat = _last_beat
+            stalled = 0.0 if beat is None else time.perf_counter() - beat
+            if stalled >= timeout and not fired:
+                fired = True
+                try: on_freeze(stalled)
+                except Exception: pass
+            elif stalled < timeout:
+                fired = False
+    th = threading.Thread(target=_run, name="freeze-watchdog", daemon=True)
+    th.start()
+    return th
@@ -0,0 +1,210 @@
+# utils/memstats.py
+"""
+記憶體量測：
+- app_report(app)：各子系統的估計位元組數（不需要 tracemalloc，隨時可以呼叫）
+- SnapshotDiff：F11 第一次記下 tracemalloc 快照，第二次與它比較並寫到 logs/memdiff-*.txt
+- track_load()：載入各階段的記憶體（tracemalloc 追蹤中為淨增量；否則為結束時整個行程的 RSS）
+大型串列以抽樣估計（前 SAMPLE 個元素的平均大小 × 長度）；多個串列共用的物件只算一次。
+"""
+import datetime, os, sys, tracemalloc
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+SAMPLE = 256
+TRACE_FRAMES = 8
+TOP_N = 40
+
+_ATOMS = (int, float, str, bytes, bytearray, array, bool, type(None))
+
+def deep_size(obj, seen: Optional[set] = None) -> int:
+    """obj 與它參照到的容器 / 物件（不重複計算；模組、類別、函式不算）。"""
+    seen = set() if seen is None else seen
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, type(sys), type(deep_size))): continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, _ATOMS): continue
+        if isinstance(o, dict):
+            stack.extend(o.keys()); stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None: stack.append(d)
+            for k in getattr(type(o), "__slots__", ()):
+                v = getattr(o, k, None)
+                if v is not None: stack.append(v)
+    return total
+
+def items_size(seq, seen: set) -> int:
+    """seq 的元素（不含容器本身）：前 SAMPLE 個實測，其餘按平均外推。"""
+    n = len(seq)
+    if n == 0: return 0
+    k = min(n, SAMPLE)
+    head = sum(deep_size(seq[i], seen) for i in range(k))
+    return head + int(head / k * (n - k))
+
+def surface_bytes(surf) -> int:
+    return surf.get_pitch() * surf.get_height() if surf is not None else 0
+
+def _lists(seen: set, *seqs) -> int:
+    """容器本身（同一個串列只算一次）。"""
+    total = 0
+    for s in seqs:
+        if s is None or id(s) in seen: continue
+        seen.add(id(s)); total += sys.getsizeof(s)
+    return total
+
+def _song_size(song, seen: set) -> int:
+    if song is None: return 0
+    total = _lists(seen, song.notes_sorted, song.note_starts)
+    total += items_size(song.notes_sorted, seen)
+    total += deep_size(song.track_ids, seen) + deep_size(song.track_index, seen)
+    if song.density is not None:
+        total += deep_size(song.density.levels, seen)
+    if song.judge is not None:
+        total += deep_size(song.judge, seen)
+    return total
+
+def app_report(app) -> Dict[str, int]:
+    """子系統 -> 估計位元組數。在主執行緒呼叫（讀的是 render 迴圈的狀態）。"""
+    seen: set = set()
+    song = app.song
+    out: Dict[str, int] = {}
+    out["notes.lists"] = _lists(seen, app.notes, app.notes_sorted, app.note_starts)
+    # Note 物件在 song 與（mute / solo 篩過的）App 串列間共用：以 song 為準
+    out["notes.objects"] = items_size(song.notes_sorted if song is not None else app.notes_sorted, seen)
+    out["judge"] = deep_size(app.judge, seen)   # 目前這首的 judge 記在這裡，預備好的歌的記在 playlist.prepared
+    if song is not None:
+        out["song.lists+tracks"] = _song_size(song, seen)
+        win = getattr(song, "_win", None)
+        if win is not None:
+            out["stream.windows"] = sum(_lists(seen, w) + items_size(w, seen) for w in list(win.values()))
+    watcher = getattr(app, "watcher", None)
+    if watcher is not None:
+        raw = dict(watcher._raw)
+        out["watch.raw+reduced"] = sum(_lists(seen, r) + items_size(r, seen) for r in raw.values()) \
+            + _lists(seen, watcher._reduced) + items_size(watcher._reduced, seen)
+    out["playlist.prepared"] = sum(_song_size(s, seen) for s in list(app.playlist._ready.values()))
+    r = app.renderer
+    surfs = [r.screen, r._kb_surf]
+    for ov in (app.overlay, getattr(app, "calibration", None)):
+        if ov is not None:
+            surfs += [v for v in vars(ov).values() if v.__class__.__name__ == "Surface"]
+    out["renderer.surfaces"] = sum(surface_bytes(s) for s in surfs)
+    out["renderer.tables"] = deep_size(r.xw_by_pitch, seen) + deep_size(r.geom, seen) \
+        + deep_size(r.button_rects, seen)
+    synth = app.synth
+    out["synth.maps"] = deep_size(synth._token_map, seen) + deep_size(synth._active_stack_by_pitch, seen)
+    out["recorder"] = deep_size(app.recorder, seen)
+    return out
+
+def format_report(report: Dict[str, int], song=None) -> str:
+    lines = [f"{k:<22s} {v / 1024:>12,.1f} KB" for k, v in report.items()]
+    lines.append(f"{'total':<22s} {sum(report.values()) / 1024:>12,.1f} KB")
+    stats = getattr(song, "load_stats", None)
+    if stats:
+        lines.append("load memory: " + ", ".join(f"{k} {v / 1024:,.1f} KB" for k, v in stats.items()
+                                                 if isinstance(v, (int, float))) + f" ({stats.get('source')})")
+    return "\n".join(lines)
+
+# ---- 載入時的記憶體 ----
+def _rss() -> Optional[int]:
+    """目前（不是最高）的 RSS；取不到時 None。ru_maxrss 是整個行程的高水位，第一首大檔之後就不會再變，不能用。"""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] \
+                + [(k, ctypes.c_size_t) for k in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                  "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                  "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        c = _Counters(); c.cb = ctypes.sizeof(c)
+        try:
+            ok = ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                          ctypes.byref(c), c.cb)
+        except (AttributeError, OSError):
+            return None
+        return c.WorkingSetSize if ok else None
+    return None   # macOS 等：沒有不靠 psutil 的目前 RSS
+
+class LoadMem:
+    __slots__ = ("bytes", "source")
+
+    def __init__(self):
+        self.bytes: Optional[int] = None
+        self.source = "none"
+
+@contextmanager
+def track_load():
+    """
+    with track_load() as m: ...；結束後 m.bytes（量不到時為 None）：
+    - tracemalloc 追蹤中（--mem_trace / F11）：區塊內 traced 記憶體的淨增量，即這一步留下來的量
+      （同時有別的執行緒在配置時會一併算進去）。不呼叫 reset_peak()：全域峰值屬於 F11 的比較，
+      在 prefetch 執行緒裡重設會與其他載入、F11 互相干擾
+    - 否則：區塊結束時整個行程的 RSS（絕對值，不是增量）
+    """
+    m = LoadMem()
+    if tracemalloc.is_tracing():
+        base = tracemalloc.get_traced_memory()[0]
+        try:
+            yield m
+        finally:
+            m.bytes, m.source = max(0, tracemalloc.get_traced_memory()[0] - base), "tracemalloc"
+    else:
+        try:
+            yield m
+        finally:
+            rss = _rss()
+            if rss is not None:
+                m.bytes, m.source = rss, "rss"
+
+# ---- tracemalloc 快照比較 ----
+class SnapshotDiff:
+    def __init__(self):
+        self._base: Optional[tracemalloc.Snapshot] = None
+        self._started = False   # 是不是我們開的（比較完就關掉，避免拖慢平常的播放）
+
+    @property
+    def armed(self) -> bool:
+        return self._base is not None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def toggle(self, header: str = "") -> Optional[str]:
+        """第一次：開始追蹤並記下基準，回傳 None；第二次：寫出差異，回傳檔案路徑。"""
+        if self._base is None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES); self._started = True
+            self._base = self._take()
+            return None
+        snap, base, self._base = self._take(), self._base, None
+        stats = snap.compare_to(base, "lineno")
+        cur, peak = tracemalloc.get_traced_memory()
+        if self._started:
+            tracemalloc.stop(); self._started = False
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        from utils.crashlog import log_dir
+        path = os.path.join(log_dir(), f"memdiff-{stamp}.txt")
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("MEMORY SNAPSHOT DIFF\n" + "=" * 60 + "\n")
+            if header: out.write(header + "\n" + "-" * 60 + "\n")
+            out.write(f"traced now {cur / 1024:,.1f} KB, peak {peak / 1024:,.1f} KB\n")
+            out.write(f"total diff {sum(s.size_diff for s in stats) / 1024:+,.1f} KB\n\n")
+            for s in stats[:TOP_N]:   # compare_to 已依 |size_diff| 由大到小排序
+                out.write(f"{s}\n")
+        return path
@@ -0,0 +1,36 @@
+# utils/startup.py
+"""啟動計時：main.py 最先 import，各階段 mark()，第一個 frame 畫完後輸出報告。
+背景初始化（裝置等）可能在報告之後才 mark：那些逐筆補印，不會漏掉。"""
+import time, logging
+
+echo = False   # --startup_report：同時印到 stdout
+_T0 = time.perf_counter()
+_marks: list[tuple[str, float]] = []
+_emitted = False
+
+def mark(label: str):
+    t = time.perf_counter()
+    _marks.append((label, t))
+    if _emitted:
+        _out(f"startup timing (late): {label:<28s} @{(t - _T0) * 1000.0:8.1f}")
+
+def elapsed_ms() -> float:
+    return (time.perf_counter() - _T0) * 1000.0
+
+def report() -> str:
+    lines = ["startup timing (ms):"]
+    prev = _T0
+    for label, t in _marks:
+        lines.append(f"  {label:<28s} +{(t - prev) * 1000.0:8.1f}  @{(t - _T0) * 1000.0:8.1f}")
+        prev = t
+    return "\n".join(lines)
+
+def _out(text: str):
+    logging.info(text)
+    if echo:
+        print(text)
+
+def emit():
+    global _emitted
+    _emitted = True
+    _out(report())
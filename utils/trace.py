@@ -0,0 +1,245 @@
+# utils/trace.py
+"""
+輸入 / frame 記錄與重播（--trace OUT / --replay IN）：重現使用者回報的「某首歌中間會卡」。
+- TraceWriter：記下每個 frame 的 dt、InputPump 收到的每個 pygame 事件（含時間戳）、換歌（路徑 + 指紋）
+  與 audio_lead 變動；檔頭是命令列參數與整份 AppConfig
+- TraceReplay：App 不讀真的輸入，改由 step() 依記錄送事件、回傳當時的 dt；pygame.time.get_ticks 換成
+  記錄中的時間，判定 / 校正 / 跑馬燈看到的時間都與當時相同。可全速或照原速（realtime）重播，
+  結束後 report() 列出每個 frame 的實際處理時間（百分位與最慢的幾個 frame），修改前後可以直接比較。
+
+檔案格式（little-endian）：MAGIC、u32 長度 + JSON 檔頭，之後是一串記錄：
+  b"F" u32 ticks, f32 dt           一個 frame（之前的 E 記錄都屬於這個 frame）
+  b"E" u32 ticks, u16 type, u16 n  事件，後接 n bytes 的 JSON 屬性（只留數字 / 字串 / 數字 tuple）
+  b"S" u16 n                       換歌，後接 n bytes 的 JSON {path, size, digest}
+  b"L" f32 audio_lead              音源延遲補償改變
+一個 frame 9 bytes，10 分鐘 60 fps 約 320 KB。檔尾不完整（當機時）照樣讀到最後一個完整記錄。
+"""
+import datetime, hashlib, json, logging, os, struct, sys, time
+from dataclasses import asdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import pygame
+
+MAGIC = b"PIDXTRC1"
+FP_CHUNK = 1 << 20    # 指紋只讀頭尾各 1 MB（大檔也不用整個讀）
+TOP_N = 10
+SONG_WAIT_S = 30.0
+
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+_F32 = struct.Struct("<f")
+_FRAME = struct.Struct("<If")
+_EVENT = struct.Struct("<IHH")
+
+def file_fingerprint(path: str) -> Dict[str, object]:
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(FP_CHUNK))
+        if st.st_size > 2 * FP_CHUNK:
+            f.seek(-FP_CHUNK, os.SEEK_END)
+        h.update(f.read(FP_CHUNK))
+    return {"path": path, "size": st.st_size, "digest": h.hexdigest()}
+
+def config_dict(cfg) -> dict:
+    # 走一次 JSON：tuple 變 list，與從檔頭讀回來的比較時才一致
+    return json.loads(json.dumps(asdict(cfg), default=str))
+
+def strip_args(argv: Sequence[str], *flags: str) -> List[str]:
+    """去掉 argv 中的 flags（"--x V" 與 "--x=V" 兩種寫法）。"""
+    out, skip = [], False
+    for a in argv:
+        if skip: skip = False; continue
+        if a in flags: skip = True; continue
+        if any(a.startswith(f + "=") for f in flags): continue
+        out.append(a)
+    return out
+
+def _pack_attrs(e: pygame.event.Event) -> bytes:
+    d = {k: v for k, v in e.dict.items()
+         if isinstance(v, (int, float, str)) or (isinstance(v, tuple) and all(isinstance(x, (int, float)) for x in v))}
+    return json.dumps(d, separators=(",", ":"), ensure_ascii=False).encode("utf-8") if d else b""
+
+class TraceWriter:
+    def __init__(self, path: str, argv: Sequence[str], cfg):
+        self.path = path
+        self._f = open(path, "wb", buffering=1 << 16)
+        header = {
+            "version": 1,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "argv": list(argv),
+            "config": config_dict(cfg),
+            "python": sys.version.split()[0],
+            "pygame": pygame.version.ver,
+        }
+        raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self._f.write(MAGIC + _U32.pack(len(raw)) + raw)
+        self._lead: Optional[float] = None
+        self.frames = 0
+
+    def event(self, e: pygame.event.Event, ts: int):
+        """InputPump.tap：收到的每個事件（含演奏鍵）。"""
+        attrs = _pack_attrs(e)
+        self._f.write(b"E" + _EVENT.pack(ts & 0xFFFFFFFF, e.type & 0xFFFF, len(attrs)) + attrs)
+
+    def frame(self, dt: float, audio_lead: float = 0.0):
+        if audio_lead != self._lead:
+            self._lead = audio_lead
+            self._f.write(b"L" + _F32.pack(audio_lead))
+        self._f.write(b"F" + _FRAME.pack(pygame.time.get_ticks() & 0xFFFFFFFF, dt))
+        self.frames += 1
+
+    def song(self, path: str):
+        try:
+            fp = file_fingerprint(path)
+        except OSError as e:
+            fp = {"path": path, "error": str(e)}
+        raw = json.dumps(fp, ensure_ascii=False).encode("utf-8")
+        self._f.write(b"S" + _U16.pack(len(raw)) + raw)
+
+    def close(self):
+        if self._f.closed: return
+        self._f.close()
+        logging.info("trace: %d frames -> %s", self.frames, self.path)
+
+def read_trace(path: str) -> Tuple[dict, Iterator[tuple]]:
+    """回傳 (檔頭, 記錄 iterator)；記錄為 ("F", ticks, dt) / ("E", ticks, type, attrs) / ("S", fp) / ("L", lead)。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: not a PI-DX trace")
+    p = len(MAGIC)
+    (n,) = _U32.unpack_from(data, p); p += 4
+    header = json.loads(data[p:p + n].decode("utf-8")); p += n
+
+    def records():
+        i, end = p, len(data)
+        while i < end:
+            tag = data[i:i + 1]; i += 1
+            try:
+                if tag == b"F":
+                    ticks, dt = _FRAME.unpack_from(data, i); i += _FRAME.size
+                    yield ("F", ticks, dt)
+                elif tag == b"E":
+                    ticks, typ, k = _EVENT.unpack_from(data, i); i += _EVENT.size
+                    if i + k > end: return
+                    attrs = json.loads(data[i:i + k].decode("utf-8")) if k else {}; i += k
+                    yield ("E", ticks, typ, {a: tuple(v) if isinstance(v, list) else v for a, v in attrs.items()})
+                elif tag == b"S":
+                    (k,) = _U16.unpack_from(data, i); i += 2
+                    if i + k > end: return
+                    yield ("S", json.loads(data[i:i + k].decode("utf-8"))); i += k
+                elif tag == b"L":
+                    (lead,) = _F32.unpack_from(data, i); i += 4
+                    yield ("L", lead)
+                else:
+                    logging.warning("trace %s: unknown record %r at %d, stopping", path, tag, i - 1); return
+            except (struct.error, ValueError):
+                return   # 檔尾不完整
+    return header, records()
+
+def _flat(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict): out.update(_flat(v, f"{prefix}{k}."))
+        else: out[prefix + k] = v
+    return out
+
+def _pct(sorted_vals: List[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))] if sorted_vals else 0.0
+
+class TraceReplay:
+    def __init__(self, path: str, realtime: bool = False):
+        self.path, self.realtime = path, realtime
+        self.header, self._records = read_trace(path)
+        self.now_ms = 0
+        self._real_ticks = None
+        self._wall0: Optional[float] = None
+        self._tick0 = 0
+        self._t_frame: Optional[float] = None   # 這個 frame 開始處理的時間
+        self._slept = 0.0
+        self.costs: List[float] = []            # 各 frame 的實際處理時間（秒，不含 realtime 的等待）
+        self.rec_dt: List[float] = []           # 記錄中的 dt
+        self.ticks: List[int] = []
+        self.mismatches = 0
+
+    def check_config(self, cfg) -> List[str]:
+        """與檔頭的 config 比較，回傳不同的欄位（程式預設值改過時會出現）。"""
+        old, new = _flat(self.header.get("config", {})), _flat(config_dict(cfg))
+        diff = [k for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k)]
+        for k in diff:
+            logging.warning("replay: config %s differs from the trace (%r -> %r)", k, old.get(k), new.get(k))
+        return diff
+
+    def start(self):
+        """把 pygame.time.get_ticks 換成記錄中的時間（close() 還原）。"""
+        if self._real_ticks is None:
+            self._real_ticks = pygame.time.get_ticks
+            pygame.time.get_ticks = lambda: self.now_ms
+
+    def close(self):
+        if self._real_ticks is not None:
+            pygame.time.get_ticks, self._real_ticks = self._real_ticks, None
+
+    def _wait(self, ticks: int):
+        self.now_ms = ticks
+        if not self.realtime: return
+        if self._wall0 is None:
+            self._wall0, self._tick0 = time.perf_counter(), ticks
+        d = self._wall0 + (ticks - self._tick0) / 1000.0 - time.perf_counter()
+        if d > 0:
+            time.sleep(d); self._slept += d
+
+    def _sync_song(self, app, fp: dict):
+        path = fp.get("path")
+        # 記錄時這個 frame 已換上這首：背景載入還沒好就等它（等待不算進 frame 時間）
+        t = time.perf_counter()
+        while app.current_midi != path and app._pending_idx is not None and time.perf_counter() - t < SONG_WAIT_S:
+            time.sleep(0.005); app._poll_playlist()
+        self._slept += time.perf_counter() - t
+        try:
+            cur = file_fingerprint(path)
+        except (OSError, TypeError) as e:
+            logging.warning("replay: song %s unavailable (%s)", path, e); self.mismatches += 1; return
+        if cur["size"] != fp.get("size") or cur["digest"] != fp.get("digest"):
+            logging.warning("replay: song %s differs from the traced file", path); self.mismatches += 1
+
+    def step(self, app) -> Optional[float]:
+        """App.run 每 frame 呼叫：送出這個 frame 的事件，回傳當時的 dt；記錄用完回傳 None。"""
+        now = time.perf_counter()
+        if self._t_frame is not None:
+            self.costs.append(now - self._t_frame - self._slept)
+        self._t_frame, self._slept = now, 0.0
+        for rec in self._records:
+            tag = rec[0]
+            if tag == "F":
+                self._wait(rec[1])
+                self.ticks.append(rec[1]); self.rec_dt.append(rec[2])
+                return rec[2]
+            if tag == "E":
+                self._wait(rec[1])
+                app.input.feed(pygame.event.Event(rec[2], rec[3]))
+            elif tag == "S":
+                self._sync_song(app, rec[1])
+            elif tag == "L":
+                app.audio_lead = rec[1]
+        self.close()
+        return None
+
+    def report(self) -> str:
+        n = len(self.costs)
+        if n == 0: return "replay: no frames"
+        cs, ds = sorted(self.costs), sorted(self.rec_dt[:n])
+        ms = lambda v: f"{v * 1000:7.2f}"
+        lines = [f"replay {self.path}: {n} frames, {sum(self.costs):.2f}s processing"
+                 + (f", {self.mismatches} song mismatch(es)" if self.mismatches else ""),
+                 f"{'':14s} {'mean':>7s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'max':>7s}  (ms)",
+                 f"{'frame cost':14s} {ms(sum(cs) / n)} {ms(_pct(cs, .5))} {ms(_pct(cs, .95))} "
+                 f"{ms(_pct(cs, .99))} {ms(cs[-1])}",
+                 f"{'traced dt':14s} {ms(sum(ds) / n)} {ms(_pct(ds, .5))} {ms(_pct(ds, .95))} "
+                 f"{ms(_pct(ds, .99))} {ms(ds[-1])}",
+                 f"slowest {min(TOP_N, n)} frames (frame, trace time, cost, traced dt):"]
+        t0 = self.ticks[0] if self.ticks else 0
+        for i in sorted(range(n), key=self.costs.__getitem__, reverse=True)[:TOP_N]:
+            lines.append(f"  #{i:<7d} {(self.ticks[i] - t0) / 1000:9.3f}s {ms(self.costs[i])} ms "
+                         f"{ms(self.rec_dt[i])} ms")
+        return "\n".join(lines)